@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Throughput benchmarks of the database generation.
+
+Times the spheroidal mapping, quadrature setup, derivative matrix, model
+evaluation and create_db end-to-end on prem_ani meshes for a range of
+periods, and records points per second, MB/s written and the peak memory.
+The results are saved as JSON, a previous result file can be given to
+compare against.
+
+    python benchmarks/run.py -p 100 50 25 --compare results/old.json
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import argparse
+from collections import OrderedDict
+from datetime import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+
+from isig import __version__  # NOQA
+from isig.basis_polynomials import lagrange_basis_derivative_matrix  # NOQA
+from isig.create_db import create_db, map_chunk  # NOQA
+from isig.gll import (  # NOQA
+    gauss_lobatto_legendre_quadruature_points_weights_fast as get_gll,
+    gauss_lobatto_jacobi_golub_welsch)
+# tracemalloc is None where it is not available
+from isig.instrumentation import Instrumentation, tracemalloc  # NOQA
+from isig.map_spheroid import map_spheroid  # NOQA
+from isig.mesh import create_mesh  # NOQA
+from isig.model_evaluation import RadialLookupTable  # NOQA
+from isig.quadrature import get_quadrature  # NOQA
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    __file__)), 'results')
+
+
+def measure(func, repeat=3):
+    """
+    Run func repeatedly and measure it. The wall time is measured without
+    memory tracing, the peak memory in one additional traced run if
+    tracemalloc is available.
+
+    :returns: tuple of the minimum wall time, the peak of the memory
+        allocated by func (None without tracemalloc) and the return value of
+        the last run
+    """
+    times = []
+    for _ in range(repeat):
+        t = timeit.default_timer()
+        value = func()
+        times.append(timeit.default_timer() - t)
+
+    if tracemalloc is None:  # pragma: no cover
+        return min(times), None, value
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak, value
+
+
+def _result(name, wall_time, peak, **kwargs):
+    result = OrderedDict([('name', name), ('wall_time', wall_time),
+                          ('peak_memory', peak)])
+    result.update(kwargs)
+    return result
+
+
+def bench_quadrature(npols, repeat=3):
+    results = []
+    for npol in npols:
+        for name, func in [
+                ('get_gll', lambda: get_gll(npol)),
+                ('golub_welsch', lambda: gauss_lobatto_jacobi_golub_welsch(
+                    npol)),
+                ('get_quadrature', lambda: get_quadrature('gll', npol)),
+                ('lagrange_basis_derivative_matrix',
+                 lambda: lagrange_basis_derivative_matrix(get_gll(npol)[0]))]:
+            t, peak, _ = measure(func, repeat)
+            results.append(_result(name, t, peak, npol=npol))
+    return results
+
+
+def bench_mesh(mod, points, connectivity, npol, repeat=3, **params):
+    """
+    Benchmarks on one mesh: mapping, model evaluation and create_db.
+    """
+    gll = get_quadrature('gll', npol)[0]
+    nelem = connectivity.shape[0]
+    npoints = nelem * npol ** 2
+    nodes = points[connectivity]
+    params['npol'] = npol
+    results = []
+
+    t, peak, _ = measure(lambda: map_spheroid(gll, nodes), repeat)
+    results.append(_result('map_spheroid', t, peak, nelem=nelem,
+                           npoints=npoints, points_per_second=npoints / t,
+                           **params))
+
+    gll_x, gll_y, _, _, mp = map_chunk(gll, nodes, mod)
+    r = np.sqrt(gll_x ** 2 + gll_y ** 2).ravel()
+    mp = mp.repeat(npol ** 2)
+
+    t, peak, table = measure(
+        lambda: RadialLookupTable(mod, ('MU',))(r, mp), repeat)
+    results.append(_result('model_evaluation', t, peak, nelem=nelem,
+                           npoints=npoints, points_per_second=npoints / t,
+                           **params))
+
+    for unique_points in [False, True]:
+        tmpdir = tempfile.mkdtemp(prefix='isig_bench_')
+        try:
+            fname = os.path.join(tmpdir, 'bench.nc')
+            reports = []
+
+            def run():
+                instr = Instrumentation()
+                info = create_db(fname, mod, points, connectivity, npol,
+                                 unique_points=unique_points,
+                                 instrumentation=instr)
+                reports.append(instr.to_dict())
+                return info
+
+            t, peak, info = measure(run, repeat)
+            nbytes = reports[-1]['total_bytes_written']
+            results.append(_result(
+                'create_db_unique' if unique_points else 'create_db', t,
+                peak, nelem=nelem, npoints=info['npoints'],
+                points_per_second=npoints / t,
+                mb_per_second=nbytes / 1024. ** 2 / t,
+                bytes_written=nbytes,
+                stages=OrderedDict(
+                    (k, v['wall_time'])
+                    for k, v in reports[-1]['stages'].items()),
+                **params))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return results
+
+
+def run_benchmarks(periods=(100., 50., 25.), max_depth=100., npol=5,
+                   repeat=3):
+    """
+    Run all benchmarks.
+
+    :returns: dictionary with the environment and a list of results
+    """
+    from pymesher.models_1D import model
+    mod = model.built_in('prem_ani')
+
+    results = bench_quadrature(sorted(set([npol, 10, 50, 200])), repeat)
+    for period in periods:
+        points, connectivity = create_mesh(mod, period, max_depth=max_depth)
+        results += bench_mesh(mod, points, connectivity, npol, repeat,
+                              period=period, max_depth=max_depth)
+
+    return OrderedDict([
+        ('version', __version__),
+        ('datetime', str(datetime.now())),
+        ('host', socket.gethostname()),
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('results', results)])
+
+
+def _key(result):
+    return tuple((k, result.get(k)) for k in
+                 ['name', 'npol', 'period', 'max_depth'])
+
+
+def get_comparison(new, old):
+    """
+    Table of the wall time ratios between two result files, ratios above 1
+    are slower.
+    """
+    old_results = dict((_key(r), r) for r in old['results'])
+    lines = ['%-36s %8s %8s %12s %12s %7s' % (
+        'benchmark', 'npol', 'period', 'old [s]', 'new [s]', 'ratio')]
+    for r in new['results']:
+        o = old_results.get(_key(r))
+        if o is None:
+            continue
+        lines.append('%-36s %8s %8s %12.6f %12.6f %7.2f' % (
+            r['name'], r.get('npol', ''), r.get('period', ''),
+            o['wall_time'], r['wall_time'], r['wall_time'] / o['wall_time']))
+    return '\n'.join(lines)
+
+
+def get_results_summary(results):
+    lines = ['%-36s %8s %8s %10s %12s %14s %10s %12s' % (
+        'benchmark', 'npol', 'period', 'elements', 'time [s]', 'points/s',
+        'MB/s', 'peak [MB]')]
+    for r in results['results']:
+        lines.append('%-36s %8s %8s %10s %12.6f %14s %10s %12s' % (
+            r['name'], r.get('npol', ''), r.get('period', ''),
+            r.get('nelem', ''), r['wall_time'],
+            '%.4g' % r['points_per_second'] if 'points_per_second' in r
+            else '',
+            '%.1f' % r['mb_per_second'] if 'mb_per_second' in r else '',
+            '%.3f' % (r['peak_memory'] / 1024. ** 2)
+            if r['peak_memory'] is not None else ''))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Throughput benchmarks of the isig database generation.')
+    parser.add_argument('-p', '--periods', type=float, nargs='+',
+                        default=[100., 50., 25.],
+                        help='Periods of the benchmark meshes.')
+    parser.add_argument('-d', '--max_depth', type=float, default=100.,
+                        help='Maximum source depth of the meshes in km.')
+    parser.add_argument('-n', '--npol', type=int, default=5,
+                        help='Polynomial order + 1.')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of runs per benchmark, the fastest is '
+                             'recorded.')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Result file, defaults to '
+                             'results/<version>_<date>.json.')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Previous result file to compare with.')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.periods, args.max_depth, args.npol,
+                             args.repeat)
+
+    output = args.output
+    if output is None:
+        if not os.path.isdir(DEFAULT_RESULTS_DIR):
+            os.makedirs(DEFAULT_RESULTS_DIR)
+        output = os.path.join(DEFAULT_RESULTS_DIR, '%s_%s.json' % (
+            results['version'], datetime.now().strftime('%Y%m%dT%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(get_results_summary(results))
+    print('results written to %s' % (output,))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(get_comparison(results, json.load(f)))
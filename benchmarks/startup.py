@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Startup time of the command line tools.
+
+Runs each command repeatedly in a fresh interpreter and reports the median
+wall time and the heavy dependencies imported during startup. Fails if a
+command exceeds the maximum time or imports a heavy dependency.
+
+    python benchmarks/startup.py -n 20 --max_time 0.5
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+# dependencies that should only be imported by the stages that need them
+HEAVY_MODULES = ['pymesher', 'sympy', 'h5netcdf', 'h5py', 'matplotlib']
+
+COMMANDS = [
+    ['-m', 'isig', '-h'],
+    ['-m', 'isig.sweep', '-h'],
+    ['-m', 'isig.ingest', '-h'],
+    # argument validation failure
+    ['-m', 'isig', '-m', 'model.bm', '-d', '-10']]
+
+# imports the command line modules and lists the heavy modules loaded
+IMPORT_CHECK = '''
+import sys
+import isig.pipeline, isig.sweep, isig.ingest
+print(' '.join(m for m in %r if m in sys.modules))
+''' % (HEAVY_MODULES,)
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def time_command(args, n=10):
+    """
+    Wall times of n runs of python with the given arguments in seconds.
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(n):
+            t = timeit.default_timer()
+            subprocess.call([sys.executable] + args, cwd=ROOT,
+                            stdout=devnull, stderr=subprocess.STDOUT)
+            times.append(timeit.default_timer() - t)
+    return np.array(times)
+
+
+def get_heavy_imports():
+    """
+    Heavy dependencies imported by the command line modules.
+    """
+    out = subprocess.check_output([sys.executable, '-c', IMPORT_CHECK],
+                                  cwd=ROOT)
+    return out.decode().split()
+
+
+def run_startup_benchmark(n=10):
+    """
+    :returns: dictionary with the median, minimum and maximum wall time per
+        command and the heavy dependencies imported at startup
+    """
+    # baseline: a bare interpreter
+    results = {'commands': {}}
+    for args in [['-c', 'pass']] + COMMANDS:
+        times = time_command(args, n)
+        results['commands'][' '.join(args)] = {
+            'median': float(np.median(times)), 'min': float(times.min()),
+            'max': float(times.max())}
+    results['heavy_imports'] = get_heavy_imports()
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Measure the startup time of the isig command line '
+                    'tools.')
+    parser.add_argument('-n', type=int, default=10,
+                        help='Number of runs per command.')
+    parser.add_argument('--max_time', type=float, default=None,
+                        help='Fail if the median time of a command exceeds '
+                             'this many seconds.')
+    args = parser.parse_args()
+
+    results = run_startup_benchmark(args.n)
+
+    failed = False
+    for command, t in results['commands'].items():
+        print('%-45s median %7.3f s  min %7.3f s  max %7.3f s' % (
+            'python ' + command, t['median'], t['min'], t['max']))
+        if args.max_time is not None and t['median'] > args.max_time:
+            failed = True
+
+    print('heavy imports at startup: %s' % (
+        ', '.join(results['heavy_imports']) or 'none',))
+    failed |= bool(results['heavy_imports'])
+
+    sys.exit(1 if failed else 0)
@@ -8,23 +8,21 @@ Generate a Instaseis input for Sismosphere
 :license:
 '''
 import argparse
-import numpy as np
-from pymesher.models_1D import model
-from pymesher.skeleton import Skeleton
 import sys
 
-from .create_db import create_db
+from .pipeline import (fix_negative_arguments, add_database_arguments,
+                       get_database_kwargs, get_mesh_cache,
+                       validate_parameters, generate_database, get_summary,
+                       generate_plan)
+from .plan import get_plan_summary
+from .instrumentation import Instrumentation, get_report_filename
 
 
 DEFAULT_FILE_NAME = 'isig_<modelname>_<period>s_<depth>km'
 
 if __name__ == "__main__":
 
-    # handle negative digits in the arguments which could be misinterpreted as
-    # options otherwise. See http://stackoverflow.com/a/21446783
-    for i, arg in enumerate(sys.argv):
-        if (arg[0] == '-') and arg[1].isdigit():
-            sys.argv[i] = ' ' + arg
+    fix_negative_arguments(sys.argv)
 
     parser = argparse.ArgumentParser(
         prog="python -m isig",
@@ -40,11 +38,6 @@ if __name__ == "__main__":
         '-p', '--period', type=float, default=50.,
         help='Shortest period to resolve.')
 
-    parser.add_argument('-dt', type=float, default=1., help='Sample rate.')
-
-    parser.add_argument('-npts', type=int, default=3600,
-                        help='Number of time samples.')
-
     parser.add_argument(
         '-d', '--max_depth', type=float, default=100.,
         help='Maximum source depth in km.')
@@ -58,16 +51,28 @@ if __name__ == "__main__":
         help='Maximum epicentral distance in degrees.')
 
     parser.add_argument(
-        '-e', '--elements_per_wavelength', type=float, default=2.,
-        help='Number of Elements per Wavelength.')
+        '-o', '--output_filename', type=str, default=DEFAULT_FILE_NAME,
+        help='Filename for the database will be <output_filename>.nc.')
+
+    add_database_arguments(parser)
 
     parser.add_argument(
-        '-n', '--npol', type=int, default=5,
-        help='Polynomial order used for interpolation + 1.')
+        '--plan', dest='plan', action='store_true', default=False,
+        help='Only create the skeleton mesh and print estimates of the '
+             'database size, memory and run time, no file is written.')
 
     parser.add_argument(
-        '-o', '--output_filename', type=str, default=DEFAULT_FILE_NAME,
-        help='Filename for the database will be <output_filename>.nc.')
+        '--report', dest='report', action='store_true', default=False,
+        help='Write a JSON report with stage timings, peak memory and bytes '
+             'written per variable to <output_filename>.json.')
+
+    parser.add_argument(
+        '--report_memory', dest='report_memory', action='store_true',
+        default=False,
+        help='Write the report of --report with the peak memory allocated '
+             'within each stage (peak_traced), traced with tracemalloc at '
+             'some overhead. Without it, the report only has the increase of '
+             'the process peak memory per stage (rss_increase).')
 
     parser.add_argument(
         '--plot', dest='plot', action='store_true', default=False,
@@ -76,75 +81,65 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # input to SI and consistency checks
-    max_depth = 1e3 * args.max_depth
-    if args.min_dist < 0:
-        raise ValueError('min_dist < 0')
-    if args.max_dist < 0:
-        raise ValueError('max_dist < 0')
-    if args.max_depth < 0:
-        raise ValueError('depth < 0')
-
-    mod = model.read(args.model_file)
-
-    discontinuities = mod.discontinuities
-    hmax = mod.get_edgelengths(
-        dominant_period=args.period,
-        elements_per_wavelength=args.elements_per_wavelength)
-
-    # adapt discontinuities and hmax for min_radius
-    idx = discontinuities > 1. - max_depth / mod.scale
-    ndisc = idx.sum() + 2
-
-    discontinuities_new = np.zeros(ndisc)
-    discontinuities_new[1] = 1. - max_depth / mod.scale
-    discontinuities_new[-ndisc+2:] = discontinuities[idx]
-    discontinuities = discontinuities_new
-
-    hmax_new = np.ones(ndisc-1)
-    hmax_new[-ndisc+2:] = hmax[-ndisc+2:]
-    hmax = hmax_new
-
-    sk = Skeleton.create_spherical_nonconforming_mesh(
-        discontinuities, hmax, 2,
-        refinement_factor=2,
-        max_colat=args.max_dist,
-        min_colat=args.min_dist,
-        full_sphere=False)
-
-    m = sk.get_unstructured_mesh()
+    validate_parameters(args.max_depth, args.min_dist, args.max_dist)
+
+    # heavy dependencies are only imported once the arguments are valid
+    from pymesher.models_1D import model
+
+    instrumentation = Instrumentation(
+        enabled=args.report or args.report_memory,
+        trace_memory=args.report_memory)
+    instrumentation.metadata['arguments'] = vars(args)
+
+    with instrumentation.stage('model_read'):
+        mod = model.read(args.model_file)
+
+    if args.plan:
+        plan = generate_plan(
+            mod, args.model_file, period=args.period,
+            max_depth=args.max_depth, min_dist=args.min_dist,
+            max_dist=args.max_dist,
+            elements_per_wavelength=args.elements_per_wavelength,
+            cache=get_mesh_cache(args, read_only=True),
+            **get_database_kwargs(args))
+        print(get_plan_summary(plan))
+        sys.exit(0)
 
     if args.output_filename == DEFAULT_FILE_NAME:
         filename = 'isig_%s_%gs_%dkm.nc' % (mod.name, args.period,
                                             args.max_depth)
     else:
-        filename = args.output_meshname + '.nc'
+        filename = args.output_filename + '.nc'
+
+    db_info = generate_database(
+        mod, args.model_file, filename, period=args.period,
+        max_depth=args.max_depth, min_dist=args.min_dist,
+        max_dist=args.max_dist,
+        elements_per_wavelength=args.elements_per_wavelength,
+        cache=get_mesh_cache(args), instrumentation=instrumentation,
+        **get_database_kwargs(args))
+
+    instrumentation.close()
+    if instrumentation.enabled:
+        instrumentation.write_json(get_report_filename(filename))
 
-    gll_x, gll_y = create_db(filename, mod, m.points, m.connectivity,
-                             npol=args.npol, dt=args.dt, npts=args.npts)
     # print mesh info
-    info = [
-        '=' * 78,
-        'SUMMARY OF MESH PROPERTIES:',
-        '',
-        '  model name                 | %9s' % (mod.name,),
-        '  period                     | %9.2f s' % (args.period,),
-        '  elements per wavelength    | %9.2f' %
-        (args.elements_per_wavelength,),
-        '',
-        '  time step dt               | %9.4f s' % (args.dt,),
-        '  number of time samples     | %9d' % (args.npts,),
-        '  number of elements         | %9d' % (m.nelem,),
-        '  number of points           | %9d' % (gll_x.size,),
-        '  estimated storage (uncomp) | %9.4f GB' % (
-            gll_x.size * args.npts * 5 * 4. / 1024. ** 3,),
-        '=' * 78]
-
-    info_str = '\n'.join(info)
-    print(info_str)
+    print(get_summary(db_info))
 
     if args.plot:
+        import numpy as np
         import matplotlib.pyplot as plt
-        m.plot(show=False)
+        from matplotlib.collections import PolyCollection
+        import h5netcdf
+        with h5netcdf.File(filename, 'r') as f:
+            gll_x = f['Mesh/mesh_S'][:] / mod.scale
+            gll_y = f['Mesh/mesh_Z'][:] / mod.scale
+            fem_mesh = f['Mesh/fem_mesh'][:]
+        ax = plt.gca()
+        ax.add_collection(PolyCollection(
+            np.stack([gll_x[fem_mesh], gll_y[fem_mesh]], axis=-1),
+            facecolor='none'))
+        ax.set_aspect('equal')
         plt.scatter(gll_x, gll_y, color='r')
         plt.show()
 
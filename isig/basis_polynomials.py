@@ -8,7 +8,99 @@ Routines to compute interpolating polynomial bases and there derivatives.
     None
 """
 import numpy as np
-import sympy as sp
+
+
+def barycentric_weights(points):
+    """
+    compute the weights of the barycentric Lagrange interpolation
+    w_j = 1 / prod_(m != j) (x_j - x_m)
+    :param points: interpolation points
+    :type points: list of floats
+    :returns: numpy array containing the weights
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    diff = points[:, np.newaxis] - points[np.newaxis, :]
+    np.fill_diagonal(diff, 1.)
+    return 1. / diff.prod(axis=1)
+
+
+def lagrange_basis_derivative_matrix(points):
+    """
+    compute derivatives of Lagrange basis polynomials
+    D(i,j) = d/dx l_j (x_i)
+    :param points: interpolation points
+    :type points: list of floats
+    :returns: nupy array containing derivatives evaluated at the interpolation
+        points
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    w = barycentric_weights(points)
+
+    diff = points[:, np.newaxis] - points[np.newaxis, :]
+    np.fill_diagonal(diff, 1.)
+
+    derivative_matrix = w[np.newaxis, :] / w[:, np.newaxis] / diff
+    np.fill_diagonal(derivative_matrix, 0.)
+    # the derivatives of all basis polynomials sum to zero
+    np.fill_diagonal(derivative_matrix, -derivative_matrix.sum(axis=1))
+
+    return derivative_matrix
+
+
+def lagrange_basis(points, x, derivative=False):
+    """
+    evaluate the Lagrange basis polynomials and optionally their derivatives
+    at arbitrary points using the barycentric formula
+    :param points: interpolation points
+    :type points: list of floats
+    :param x: evaluation points
+    :type x: float or numpy array of floats
+    :param derivative: also compute the derivatives d/dx l_j (x)
+    :type derivative: bool
+    :returns: numpy array of shape x.shape + (n,) containing l_j(x) and, if
+        derivative is True, a second array of the same shape containing the
+        derivatives
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n = len(points)
+    w = barycentric_weights(points)
+
+    diff = x.reshape((-1, 1)) - points[np.newaxis, :]
+    exact = diff == 0.
+    on_node = exact.any(axis=1)
+    diff[exact] = 1.
+
+    tmp = w[np.newaxis, :] / diff
+    basis = tmp / tmp.sum(axis=1)[:, np.newaxis]
+    basis[on_node] = exact[on_node]
+
+    if not derivative:
+        return basis.reshape(x.shape + (n,))
+
+    inv_diff = 1. / diff
+    inv_diff[exact] = 0.
+    dbasis = basis * (inv_diff.sum(axis=1)[:, np.newaxis] - inv_diff)
+    dbasis[on_node] = lagrange_basis_derivative_matrix(points)[
+        exact[on_node].argmax(axis=1)]
+
+    return basis.reshape(x.shape + (n,)), dbasis.reshape(x.shape + (n,))
+
+
+def legendre_vandermonde(points):
+    """
+    evaluate the Legendre polynomials up to degree n - 1 at n points
+    V(i,k) = P_k(x_i), transforming modal coefficients to nodal values
+    :param points: interpolation points
+    :type points: list of floats
+    :returns: numpy array of shape (n, n)
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    return np.polynomial.legendre.legvander(points, len(points) - 1)
 
 
 def lagrange_basis_polynomials(points):
@@ -19,6 +111,7 @@ def lagrange_basis_polynomials(points):
     :returns: list of sympy expressions containing the Lagrange basis
         polynomials
     """
+    import sympy as sp
 
     n = len(points)
     x = sp.symbols('x')
@@ -35,15 +128,17 @@ def lagrange_basis_polynomials(points):
     return polynomials
 
 
-def lagrange_basis_derivative_matrix(points):
+def lagrange_basis_derivative_matrix_sympy(points):
     """
-    compute derivatives of Lagrange basis polynomials
+    compute derivatives of Lagrange basis polynomials symbolically, slow
+    reference implementation of lagrange_basis_derivative_matrix
     D(i,j) = d/dx l_j (x_i)
     :param points: interpolation points
     :type points: list of floats
     :returns: nupy array containing derivatives evaluated at the interpolation
         points
     """
+    import sympy as sp
 
     n = len(points)
     x = sp.symbols('x')
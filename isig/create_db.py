@@ -11,15 +11,21 @@ A new python script.
 import getpass
 from datetime import datetime
 import numpy as np
-import h5netcdf
 import socket
 import sys
 import os
 
-from .gll import gauss_lobatto_legendre_quadruature_points_weights_fast as \
-    get_gll
-from .basis_polynomials import lagrange_basis_derivative_matrix
-from .map_spheroid import map_spheroid
+from .quadrature import get_quadrature
+from .map_spheroid import map_spheroid, jacobian_spheroid
+from .model_evaluation import RadialLookupTable, PARAMETER_VARIABLES
+from .instrumentation import Instrumentation
+from .parallel import get_window, ordered_map
+from .modal import MODAL_ORDER_VARIABLE
+from .quantization import (QUANTIZATIONS, SCALE_VARIABLE, OFFSET_VARIABLE,
+                           resolve_storage)
+from .global_numbering import hash_points, get_global_numbering_from_keys
+from .reorder import get_element_order
+from .spatial_index import SpatialIndex
 
 
 # group: Mesh {
@@ -39,7 +45,7 @@ from .map_spheroid import map_spheroid
 #         double G1(npol, npol) ;                    : not needed
 #         double G2(npol, npol) ;                    : OK
 #         double gll(npol) ;                         : OK
-#         double glj(npol) ;                         : not needed
+#         double glj(npol) ;                         : OK
 #         float mesh_S(gllpoints_all) ;              : OK
 #         float mesh_Z(gllpoints_all) ;              : OK
 #         float mesh_vp(gllpoints_all) ;             : not needed
@@ -55,19 +61,360 @@ from .map_spheroid import map_spheroid
 #       }
 
 
+# default memory budget for the mesh generation in bytes
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+
+# approximate number of bytes held in memory per GLL point while processing a
+# chunk of elements: coordinates, radius, colatitude, element midpoint and
+# model parameters in double precision plus single precision copies
+BYTES_PER_POINT = 96
+
+
+# minimum size of a MergedSnapshots chunk in bytes, smaller elements are
+# grouped into one chunk to limit the chunk index overhead
+DEFAULT_SNAPSHOT_CHUNK_BYTES = 256 * 1024
+
+# compression filters not covered by the netCDF4 standard
+NON_NETCDF_FILTERS = ['lzf', 'szip']
+
+# Jacobian determinant and inverse Jacobian of the mapping from (xi, eta) to
+# (S, Z) per GLL point, in the order returned by jacobian_spheroid, with the
+# power of the planet radius to convert from non-dimensional units
+JACOBIAN_VARIABLES = [('mesh_jacobian', 2), ('mesh_dxi_dS', -1),
+                      ('mesh_dxi_dZ', -1), ('mesh_deta_dS', -1),
+                      ('mesh_deta_dZ', -1)]
+
+
+def get_snapshot_chunks(npol, npts, nvars=5, chunk_elements=None,
+                        chunk_snapshots=None,
+                        target_bytes=DEFAULT_SNAPSHOT_CHUNK_BYTES):
+    """
+    Chunk shape of the MergedSnapshots variable.
+
+    Instaseis reads all variables and all snapshots of one element at once,
+    so by default a chunk contains a single complete element. Only if an
+    element is smaller than target_bytes, several elements are grouped.
+
+    :param npol: number of GLL points per dimension
+    :type npol: integer
+    :param npts: number of snapshots
+    :type npts: integer
+    :param nvars: number of variables
+    :type nvars: integer
+    :param chunk_elements: number of elements per chunk, None for automatic
+    :type chunk_elements: integer
+    :param chunk_snapshots: number of snapshots per chunk, None for all
+    :type chunk_snapshots: integer
+    :param target_bytes: minimum size of a chunk in bytes used for the
+        automatic number of elements
+    :type target_bytes: integer
+
+    :returns: tuple (elements, nvars, jpol, ipol, snapshots)
+    """
+    if not chunk_snapshots:
+        chunk_snapshots = npts
+    chunk_snapshots = min(chunk_snapshots, npts)
+
+    if not chunk_elements:
+        element_bytes = nvars * npol ** 2 * chunk_snapshots * 4
+        chunk_elements = max(int(target_bytes // element_bytes), 1)
+
+    return (int(chunk_elements), nvars, npol, npol, int(chunk_snapshots))
+
+
+def get_read_amplification(chunks, shape):
+    """
+    Ratio of bytes read from disk to bytes requested when reading all
+    variables and snapshots of a single element, not accounting for
+    compression.
+
+    :param chunks: chunk shape of MergedSnapshots, None if contiguous
+    :type chunks: tuple of integers
+    :param shape: shape of MergedSnapshots
+    :type shape: tuple of integers
+    """
+    if chunks is None:
+        return 1.
+    nchunk = np.prod([-(-n // c) for n, c in zip(shape[1:], chunks[1:])])
+    return float(nchunk * np.prod(chunks)) / np.prod(shape[1:])
+
+
+def get_chunk_size(npol, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Number of elements that can be processed at once within the memory
+    budget.
+
+    :param npol: number of GLL points per dimension
+    :type npol: integer
+    :param memory_budget: memory budget in bytes
+    :type memory_budget: integer
+
+    :returns: number of elements per chunk, at least 1
+    """
+    return max(int(memory_budget // (BYTES_PER_POINT * npol ** 2)), 1)
+
+
+def element_chunks(nelem, chunk_size):
+    """
+    Generator for the (start, stop) ranges of element chunks.
+    """
+    for start in np.arange(0, nelem, chunk_size):
+        yield int(start), int(min(start + chunk_size, nelem))
+
+
+def map_chunk(gll, nodes, model):
+    """
+    Map GLL points and midpoints of a chunk of elements, the layer of the
+    elements in the model is determined from the midpoint radius.
+    """
+    gll_x, gll_y = map_spheroid(gll, nodes, block_size=None)
+    mp_x, mp_y = map_spheroid(np.zeros(1), nodes, block_size=None)
+    mp_x = mp_x.ravel()
+    mp_y = mp_y.ravel()
+    mp = np.sqrt(mp_x ** 2 + mp_y ** 2)
+    return gll_x, gll_y, mp_x, mp_y, mp
+
+
+def get_unique_numbering(model, points, connectivity, npol, tolerance=1e-8,
+                         chunk_size=None, nthreads=1):
+    """
+    Global numbering of the GLL points merging coincident points within the
+    same layer of the model, see global_numbering.get_global_numbering. The
+    points are hashed in chunks of elements.
+
+    :param model: pymesher 1D model
+    :param points: mesh points, shape (npoints, 2)
+    :type points: numpy array
+    :param connectivity: mesh connectivity, shape (nelem, 4)
+    :type connectivity: numpy array
+    :param npol: number of GLL points per dimension
+    :type npol: integer
+    :param tolerance: non-dimensional distance below which GLL points are
+        merged
+    :type tolerance: float
+    :param chunk_size: number of elements per chunk
+    :type chunk_size: integer
+    :param nthreads: number of threads hashing the chunks
+    :type nthreads: integer
+
+    :returns: tuple of sem_mesh, shape (nelem, npol, npol), and the indices
+        of the first occurrence of each unique point in the flattened
+        sem_mesh
+    """
+    gll = get_quadrature('gll', npol)[0]
+    nelem = connectivity.shape[0]
+    if chunk_size is None:
+        chunk_size = get_chunk_size(npol)
+
+    def hash_chunk(chunk):
+        start, stop = chunk
+        gll_x, gll_y, _, _, mp = map_chunk(
+            gll, points[connectivity[start:stop]], model)
+        layer = np.searchsorted(model.discontinuities, mp)
+        return hash_points(gll_x, gll_y, tolerance,
+                           layer=layer[:, np.newaxis, np.newaxis])
+
+    keys = list(ordered_map(hash_chunk, element_chunks(nelem, chunk_size),
+                            nthreads))
+    keys = [np.concatenate(k) for k in zip(*keys)]
+    sem, unique_index = get_global_numbering_from_keys(keys)
+    del keys
+
+    return sem.astype(np.int32).reshape((nelem, npol, npol)), unique_index
+
+
 def create_db(fname, model, points, connectivity, npol=5, dt=0.1,
-              npts=1000):
+              npts=1000, unique_points=False, tolerance=1e-8,
+              memory_budget=DEFAULT_MEMORY_BUDGET, chunks='auto',
+              compression=None, compression_opts=None, shuffle=False,
+              model_parameters=('MU',), element_order=None,
+              spatial_index=False, jacobian=False, quantization=None,
+              max_error=None, modal_tolerance=None, nthreads=1,
+              instrumentation=None):
+    """
+    Create an instaseis database with the mesh and an empty merged snapshots
+    variable.
+
+    The mesh is mapped, the model evaluated and the mesh group written in
+    chunks of elements, such that the memory used for this is bounded by
+    memory_budget. With unique_points, the global numbering additionally
+    needs a few integers per GLL point.
+
+    :param fname: filename of the database
+    :type fname: string
+    :param model: pymesher 1D model
+    :param points: mesh points, shape (npoints, 2)
+    :type points: numpy array
+    :param connectivity: mesh connectivity, shape (nelem, 4)
+    :type connectivity: numpy array
+    :param npol: number of GLL points per dimension (polynomial order + 1)
+    :type npol: integer
+    :param dt: sampling interval of the snapshots
+    :type dt: float
+    :param npts: number of snapshots
+    :type npts: integer
+    :param unique_points: merge coincident GLL points of neighbouring elements
+        and store them only once. Points on both sides of a discontinuity of
+        the model are kept separately.
+    :type unique_points: bool
+    :param tolerance: non-dimensional distance below which GLL points are
+        merged
+    :type tolerance: float
+    :param memory_budget: memory used for processing a chunk of elements in
+        bytes
+    :type memory_budget: integer
+    :param chunks: chunk shape of MergedSnapshots, 'auto' for chunks of
+        complete elements (see get_snapshot_chunks) or None for contiguous
+        storage without filters
+    :type chunks: tuple of integers or string
+    :param compression: compression filter for MergedSnapshots, one of
+        'gzip', 'lzf', 'szip' or None. lzf and szip are not part of the
+        netCDF4 standard and need to be supported by the reader.
+    :type compression: string
+    :param compression_opts: parameter of the compression filter, e.g. the
+        gzip level
+    :param shuffle: apply the HDF5 shuffle filter before compression
+    :type shuffle: bool
+    :param model_parameters: model parameters written to the mesh group, see
+        model_evaluation.PARAMETER_VARIABLES. The model is only evaluated
+        once for each unique radius and layer.
+    :type model_parameters: list of strings
+    :param element_order: reorder the elements along a space filling curve
+        over their midpoints, 'hilbert' or 'morton', None to keep the order
+        of the connectivity. Elements close in space are then close in the
+        database, all element and point arrays follow the new order.
+    :type element_order: string
+    :param spatial_index: store a spatial index for locating the elements
+        containing given points in the mesh group, see
+        spatial_index.SpatialIndex
+    :type spatial_index: bool
+    :param jacobian: store the Jacobian determinant and the inverse Jacobian
+        of the mapping at each GLL point in the mesh group, see
+        JACOBIAN_VARIABLES. Requires unique_points=False, as the Jacobian
+        differs between the elements sharing a point.
+    :type jacobian: bool
+    :param quantization: store MergedSnapshots lossy as 'int8', 'float16'
+        or 'int16' with a scale and offset per element and variable, see
+        quantization.quantize. The data is encoded by ingest.ingest_snapshots
+        and decoded on read by quantization.get_snapshots.
+    :type quantization: string
+    :param max_error: bound of the error relative to the maximum absolute
+        value of each variable in each element, including the modal
+        truncation. Selects the smallest quantization within the bound if
+        quantization is None, float32 if none is accurate enough, see
+        quantization.resolve_storage.
+    :type max_error: float
+    :param modal_tolerance: store MergedSnapshots as Legendre coefficients
+        per element instead of nodal values, dropping the high degree modes
+        up to this error relative to the amplitude of each variable in the
+        element, see modal.get_modal_order. The degrees kept per element
+        are written to modal_order by ingest.ingest_snapshots, readers
+        reconstruct the nodal values with quantization.get_snapshots. None
+        for nodal storage. The dropped modes are stored as zeros, so this
+        requires a compression filter.
+    :type modal_tolerance: float
+    :param nthreads: number of threads mapping the elements and preparing
+        the model evaluation. The elements are split into shards that are
+        processed concurrently, while the model lookup table and the
+        writes are updated in the order of the elements, so the database is
+        identical to the serial one. The memory budget is shared by the
+        shards in flight.
+    :type nthreads: integer
+    :param instrumentation: collects stage timings, peak memory and the
+        bytes written per variable
+    :type instrumentation: instrumentation.Instrumentation
+
+    :returns: dictionary with the number of elements and points, the
+        MergedSnapshots chunk shape, the number of model evaluations, the
+        element permutation (None if not reordered), such that element i in
+        the database is element_order[i] in the connectivity, and the
+        quantization with the error bound of the values read. Earlier
+        versions returned the non-dimensional GLL point coordinates gll_x,
+        gll_y, shape (nelem, npol, npol), which are the variables Mesh/mesh_S
+        and Mesh/mesh_Z indexed with Mesh/sem_mesh and divided by the
+        planet radius, see README.
+    """
+    quantization, error_bound = resolve_storage(
+        quantization, max_error, modal_tolerance, npol, compression)
+
+    instr = instrumentation or Instrumentation(enabled=False)
+    with instr.stage('create_db'):
+        return _create_db(fname, model, points, connectivity, npol, dt, npts,
+                          unique_points, tolerance, memory_budget, chunks,
+                          compression, compression_opts, shuffle,
+                          model_parameters, element_order, spatial_index,
+                          jacobian, quantization, error_bound,
+                          modal_tolerance, nthreads, instr)
+
+
+def _write(instr, var, index, values):
+    """
+    write to a slice of a variable and count the bytes
+    """
+    with instr.stage('write'):
+        var[index] = values
+    instr.add_bytes(var.name, np.size(values) * var.dtype.itemsize)
+
 
-    gll = get_gll(npol)[0]
-    gll_x, gll_y = map_spheroid(gll, points[connectivity])
+def _create_db(fname, model, points, connectivity, npol, dt, npts,
+               unique_points, tolerance, memory_budget, chunks, compression,
+               compression_opts, shuffle, model_parameters, element_order,
+               spatial_index, jacobian, quantization, error_bound,
+               modal_tolerance, nthreads, instr):
+    # imported here to keep the command line startup fast
+    import h5netcdf
+
+    if jacobian and unique_points:
+        raise ValueError('jacobian requires unique_points=False, the '
+                         'Jacobian differs between elements sharing a point')
+
+    with instr.stage('quadrature'):
+        gll, _, g2 = get_quadrature('gll', npol)
+        glj = get_quadrature('glj', npol)[0]
+
+    # permuting the connectivity up front, everything else follows
+    order = None
+    if element_order is not None:
+        with instr.stage('element_order'):
+            order = get_element_order(points, connectivity, element_order)
+        connectivity = connectivity[order]
+    lookup_table = RadialLookupTable(model, model_parameters)
 
     nelem = connectivity.shape[0]
     nquad = 4
+    npol2 = npol ** 2
+    if nthreads > 1:
+        # at least one shard per task in flight, each within its share of
+        # the memory budget
+        window = get_window(nthreads)
+        chunk_size = min(get_chunk_size(npol, memory_budget // window),
+                         max(-(-nelem // window), 1))
+    else:
+        chunk_size = get_chunk_size(npol, memory_budget)
+
+    if unique_points:
+        # first pass: hash all points to compute the global numbering
+        with instr.stage('global_numbering'):
+            sem, unique_index = get_unique_numbering(
+                model, points, connectivity, npol, tolerance, chunk_size,
+                nthreads)
+        npoints = unique_index.size
+    else:
+        npoints = nelem * npol2
 
-    with h5netcdf.File(fname, "w") as f:
+    if chunks == 'auto':
+        chunks = get_snapshot_chunks(npol, npts)
+    if chunks is not None:
+        chunks = tuple(min(c, n) for c, n in
+                       zip(chunks, (max(nelem, 1), 5, npol, npol, npts)))
+    elif compression is not None or shuffle:
+        raise ValueError('filters require chunked storage')
+
+    with h5netcdf.File(fname, "w",
+                       invalid_netcdf=compression in NON_NETCDF_FILTERS) as f:
 
         f.dimensions = {
-            'gllpoints_all': gll_x.size,
+            'gllpoints_all': npoints,
             'snapshots': npts,
             'ipol': npol,
             'jpol': npol,
@@ -78,9 +425,29 @@ def create_db(fname, model, points, connectivity, npol=5, dt=0.1,
         # MERGED DATA VARIABLES
         f.create_variable('stf_dump', ('snapshots', ), 'float32')
         f.create_variable('stf_d_dump', ('snapshots', ), 'float32')
-        f.create_variable('MergedSnapshots',
-                          ('elements', 'nvars', 'jpol', 'ipol', 'snapshots'),
-                          'float32')
+        filters = {}
+        if compression is not None:
+            filters['compression'] = compression
+            filters['compression_opts'] = compression_opts
+        if shuffle:
+            filters['shuffle'] = True
+
+        snapshots = f.create_variable(
+            'MergedSnapshots',
+            ('elements', 'nvars', 'jpol', 'ipol', 'snapshots'),
+            QUANTIZATIONS[quantization] if quantization else 'float32',
+            chunks=chunks, **filters)
+        if quantization is not None:
+            snapshots.attrs['quantization'] = quantization
+            for name in [SCALE_VARIABLE, OFFSET_VARIABLE]:
+                f.create_variable(name, ('elements', 'nvars'), 'float32')
+        snapshots.attrs['storage'] = \
+            'nodal' if modal_tolerance is None else 'modal'
+        if modal_tolerance is not None:
+            snapshots.attrs['modal_tolerance'] = modal_tolerance
+            f.create_variable(MODAL_ORDER_VARIABLE, ('elements', ), 'int8')
+        if error_bound is not None:
+            snapshots.attrs['max_error'] = error_bound
 
         # MESH GROUP
         mesh_group = f.create_group("Mesh")
@@ -92,50 +459,121 @@ def create_db(fname, model, points, connectivity, npol=5, dt=0.1,
 
         sem_mesh = mesh_group.create_variable(
             'sem_mesh', ('elements', 'npol', 'npol'), 'int32')
-
-        sem_mesh[...] = \
-            np.arange(nelem * npol ** 2).reshape((nelem, npol, npol))
-
         fem_mesh = mesh_group.create_variable(
             'fem_mesh', ('elements', 'control_points'), 'int32')
-
-        fem_mesh[:, 0] = sem_mesh[:, 0, 0]
-        fem_mesh[:, 1] = sem_mesh[:, 0, -1]
-        fem_mesh[:, 2] = sem_mesh[:, -1, -1]
-        fem_mesh[:, 3] = sem_mesh[:, -1, 0]
-
         mp_mesh_S = mesh_group.create_variable(
             'mp_mesh_S', ('elements', ), 'float32')
         mp_mesh_Z = mesh_group.create_variable(
             'mp_mesh_Z', ('elements', ), 'float32')
 
-        gll = np.zeros(1)
-        mp_mesh_S[:], mp_mesh_Z[:] = [
-            g.ravel() * model.scale
-            for g in map_spheroid(gll, points[connectivity])]
-
         G2 = mesh_group.create_variable('G2', ('npol', 'npol'), float)
-        gll = mesh_group.create_variable('gll', ('npol', ), float)
+        gll_var = mesh_group.create_variable('gll', ('npol', ), float)
+        glj_var = mesh_group.create_variable('glj', ('npol', ), float)
 
-        gll[:] = get_gll(npol)[0]
-        G2[...] = lagrange_basis_derivative_matrix(gll[:])
+        _write(instr, gll_var, slice(None), gll)
+        _write(instr, glj_var, slice(None), glj)
+        _write(instr, G2, Ellipsis, g2)
 
         mesh_S = mesh_group.create_variable(
             'mesh_S', ('gllpoints_all', ), 'float32')
         mesh_Z = mesh_group.create_variable(
             'mesh_Z', ('gllpoints_all', ), 'float32')
+        model_vars = [
+            mesh_group.create_variable(
+                PARAMETER_VARIABLES[p], ('gllpoints_all', ), 'float32')
+            for p in lookup_table.parameters]
+        jacobian_vars = [
+            mesh_group.create_variable(name, ('gllpoints_all', ), 'float32')
+            for name, _ in JACOBIAN_VARIABLES] if jacobian else []
+
+        if spatial_index:
+            with instr.stage('spatial_index'):
+                index = SpatialIndex.build(
+                    points[connectivity] * model.scale)
+            with instr.stage('write'):
+                index.write(mesh_group)
+            for var, v in [('spatial_index_offsets', index.offsets),
+                           ('spatial_index_elements', index.elements)]:
+                instr.add_bytes(mesh_group[var].name, v.nbytes)
+
+        rmin = thetamin = np.inf
+        rmax = thetamax = -np.inf
+
+        def process(chunk):
+            # map and prepare the model evaluation of a chunk, runs in the
+            # worker threads
+            start, stop = chunk
+            nodes = points[connectivity[start:stop]]
+            with instr.stage('map_spheroid'):
+                gll_x, gll_y, mp_x, mp_y, mp = map_chunk(gll, nodes, model)
+
+            if unique_points:
+                _sem = sem[start:stop]
+                # points are numbered by first occurrence, so the points
+                # that are new in this chunk have contiguous ids
+                lo, hi = np.searchsorted(
+                    unique_index, [start * npol2, stop * npol2])
+                idx = unique_index[lo:hi] - start * npol2
+                gll_x = gll_x.ravel()[idx]
+                gll_y = gll_y.ravel()[idx]
+                mp = mp.repeat(npol2)[idx]
+            else:
+                _sem = np.arange(start * npol2, stop * npol2,
+                                 dtype=np.int32).reshape((-1, npol, npol))
+                lo, hi = start * npol2, stop * npol2
+                gll_x = gll_x.ravel()
+                gll_y = gll_y.ravel()
+                mp = mp.repeat(npol2)
+
+            r = np.sqrt(gll_x ** 2 + gll_y ** 2)
+            theta = np.arctan2(gll_x, gll_y)
+
+            prepared = terms = None
+            if hi > lo:
+                with instr.stage('model_evaluation'):
+                    prepared = lookup_table.prepare(r, mp)
+                if jacobian:
+                    with instr.stage('jacobian'):
+                        terms = jacobian_spheroid(gll, nodes, block_size=None)
+
+            return (start, stop, lo, hi, _sem, mp_x, mp_y, gll_x, gll_y, r,
+                    theta, prepared, terms)
+
+        # second pass: map, evaluate the model and write chunk by chunk, the
+        # chunks come back in order
+        for (start, stop, lo, hi, _sem, mp_x, mp_y, gll_x, gll_y, r, theta,
+             prepared, terms) in ordered_map(
+                process, element_chunks(nelem, chunk_size), nthreads):
+
+            _write(instr, sem_mesh, slice(start, stop), _sem)
+            _write(instr, fem_mesh, slice(start, stop), np.stack(
+                [_sem[:, 0, 0], _sem[:, 0, -1], _sem[:, -1, -1],
+                 _sem[:, -1, 0]], axis=1))
+
+            _write(instr, mp_mesh_S, slice(start, stop), mp_x * model.scale)
+            _write(instr, mp_mesh_Z, slice(start, stop), mp_y * model.scale)
+
+            if hi == lo:
+                continue
+
+            _write(instr, mesh_S, slice(lo, hi), gll_x * model.scale)
+            _write(instr, mesh_Z, slice(lo, hi), gll_y * model.scale)
 
-        mesh_S[:] = gll_x.ravel() * model.scale
-        mesh_Z[:] = gll_y.ravel() * model.scale
+            rmin = min(rmin, r.min())
+            rmax = max(rmax, r.max())
+            thetamin = min(thetamin, theta.min())
+            thetamax = max(thetamax, theta.max())
 
-        r = np.sqrt(gll_x.ravel() ** 2 + gll_y.ravel() ** 2)
-        theta = np.arctan2(gll_x.ravel(), gll_y.ravel())
-        mp = np.sqrt(mp_mesh_S[:] ** 2 + mp_mesh_Z[:] ** 2) / model.scale
-        mp = mp.repeat(npol ** 2)
+            with instr.stage('model_evaluation'):
+                values = lookup_table.lookup(prepared)
+            for var, v in zip(model_vars, values.values()):
+                _write(instr, var, slice(lo, hi), v)
 
-        var = mesh_group.create_variable('mesh_mu', ('gllpoints_all', ),
-                                         'float32')
-        var[:] = model.get_elastic_parameter('MU', r, mp)
+            if jacobian:
+                for var, v, (_, power) in zip(jacobian_vars, terms,
+                                              JACOBIAN_VARIABLES):
+                    _write(instr, var, slice(lo, hi),
+                           v.ravel() * model.scale ** power)
 
         # GLOBAL ATTRIBUTES
         # @TODO: replace place holder and meaningless names
@@ -155,14 +593,16 @@ def create_db(fname, model, points, connectivity, npol=5, dt=0.1,
         f.attrs['strain dump sampling rate in sec'] = dt
         f.attrs['source shift factor in sec'] = 0.
         f.attrs['source shift factor for deltat_coarse'] = 0
-        f.attrs['npoints'] = gll_x.size
+        f.attrs['npoints'] = npoints
+        f.attrs['unique points'] = int(unique_points)
+        f.attrs['element order'] = element_order or 'mesh'
         f.attrs['attenuation'] = 1
         f.attrs['planet radius'] = model.scale
         f.attrs['dominant source period'] = 0.
-        f.attrs['kernel wavefield rmin'] = r.min() * model.scale
-        f.attrs['kernel wavefield rmax'] = r.max() * model.scale
-        f.attrs['kernel wavefield colatmin'] = np.rad2deg(theta.min())
-        f.attrs['kernel wavefield colatmax'] = np.rad2deg(theta.max())
+        f.attrs['kernel wavefield rmin'] = rmin * model.scale
+        f.attrs['kernel wavefield rmax'] = rmax * model.scale
+        f.attrs['kernel wavefield colatmin'] = np.rad2deg(thetamin)
+        f.attrs['kernel wavefield colatmax'] = np.rad2deg(thetamax)
         f.attrs['source depth in km'] = 0.
         f.attrs['nelem_kwf_global'] = 0
 
@@ -170,7 +610,10 @@ def create_db(fname, model, points, connectivity, npol=5, dt=0.1,
         f.attrs['compiler version'] = ''
         f.attrs['user name'] = getpass.getuser()
         f.attrs['host name'] = socket.gethostname()
-        f.attrs['rundir'] = os.getcwdu()
+        f.attrs['rundir'] = getattr(os, 'getcwdu', os.getcwd)()
         f.attrs['cmdl'] = 'python -m isig ' + ' '.join(sys.argv[1:])
 
-    return gll_x, gll_y
+    return {'nelem': nelem, 'npoints': npoints, 'snapshot_chunks': chunks,
+            'model_evaluations': lookup_table.nevaluations,
+            'element_order': order, 'quantization': quantization,
+            'max_error': error_bound, 'modal_tolerance': modal_tolerance}
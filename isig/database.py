@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Reader for isig databases.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from collections import OrderedDict
+
+import h5py
+import numpy as np
+
+from .create_db import DEFAULT_MEMORY_BUDGET
+from .interpolation import interpolate
+from .quantization import get_snapshots
+from .spatial_index import SpatialIndex
+
+
+class ElementCache(object):
+    """
+    Size bounded least recently used cache of MergedSnapshots element blocks
+    with hit and miss statistics.
+
+    :param max_size: maximum size of the cached blocks in bytes
+    :type max_size: integer
+    """
+
+    def __init__(self, max_size=DEFAULT_MEMORY_BUDGET):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __contains__(self, element):
+        return element in self._blocks
+
+    def get(self, element):
+        """
+        Cached block of an element, None if not cached.
+        """
+        try:
+            block = self._blocks.pop(element)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._blocks[element] = block
+        self.hits += 1
+        return block
+
+    def put(self, element, block):
+        """
+        Add the block of an element, evicting the least recently used blocks
+        if the cache is full. Blocks larger than the cache are not stored.
+        """
+        if block.nbytes > self.max_size:
+            return
+        if element in self._blocks:
+            self.size -= self._blocks.pop(element).nbytes
+        while self._blocks and self.size + block.nbytes > self.max_size:
+            self.size -= self._blocks.popitem(last=False)[1].nbytes
+        self._blocks[element] = block
+        self.size += block.nbytes
+
+    def clear(self):
+        self._blocks.clear()
+        self.size = 0
+
+    @property
+    def stats(self):
+        """
+        Dictionary with the number of hits and misses, the hit rate and the
+        number and size of the cached blocks.
+        """
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': float(self.hits) / requests if requests else 0.,
+                'elements': len(self._blocks), 'size': self.size}
+
+
+class Database(object):
+    """
+    Read access to an isig database.
+
+    The mesh arrays are read on first access only. Contiguous variables
+    without filters are memory-mapped, chunked or compressed ones are read
+    into memory. Element blocks of MergedSnapshots are served through an
+    LRU cache, quantized databases are decoded to float32 on read.
+
+        with Database('isig_prem_ani_50s_100km.nc') as db:
+            block = db.get_element(42)
+            traces = db.interpolate(s, z)
+
+    :param filename: filename of the database
+    :type filename: string
+    :param cache_size: maximum size of the element cache in bytes
+    :type cache_size: integer
+    """
+
+    def __init__(self, filename, cache_size=DEFAULT_MEMORY_BUDGET):
+        self.filename = filename
+        self._file = h5py.File(filename, 'r')
+        self._snapshots = get_snapshots(self._file)
+        self.cache = ElementCache(cache_size)
+        self._mesh = {}
+        self._spatial_index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._snapshots = None
+        self._mesh.clear()
+        self.cache.clear()
+
+    @property
+    def attrs(self):
+        return self._file.attrs
+
+    @property
+    def snapshots(self):
+        """
+        MergedSnapshots dataset, shape (nelem, nvars, npol, npol, npts), see
+        quantization.get_snapshots, built once when the database is opened
+        """
+        return self._snapshots
+
+    @property
+    def nelem(self):
+        return self.snapshots.shape[0]
+
+    @property
+    def npol(self):
+        return self.snapshots.shape[2]
+
+    @property
+    def npts(self):
+        return self.snapshots.shape[4]
+
+    def _memmap(self, dataset):
+        """
+        memory-map a dataset if it is stored contiguously without filters,
+        None otherwise
+        """
+        offset = dataset.id.get_offset()
+        if (dataset.chunks is not None or dataset.compression is not None
+                or offset is None or dataset.size == 0):
+            return None
+        return np.memmap(self.filename, mode='r', dtype=dataset.dtype,
+                         offset=offset, shape=dataset.shape,
+                         order='C')
+
+    def mesh(self, name):
+        """
+        Array of the Mesh group, read or memory-mapped on first access.
+
+        :param name: variable name, e.g. 'mesh_S' or 'sem_mesh'
+        :type name: string
+        """
+        if name not in self._mesh:
+            dataset = self._file['Mesh'][name]
+            data = self._memmap(dataset)
+            self._mesh[name] = dataset[()] if data is None else data
+        return self._mesh[name]
+
+    @property
+    def spatial_index(self):
+        """
+        spatial index of the mesh, see spatial_index.SpatialIndex
+        """
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex.read(self._file)
+        return self._spatial_index
+
+    def get_element(self, element):
+        """
+        MergedSnapshots block of an element, shape (nvars, npol, npol, npts).
+        The returned array is shared with the cache and read-only.
+        """
+        element = int(element)
+        block = self.cache.get(element)
+        if block is None:
+            block = self.snapshots[element]
+            block.flags.writeable = False
+            self.cache.put(element, block)
+        return block
+
+    def get_elements(self, elements):
+        """
+        MergedSnapshots blocks of several elements, shape
+        (len(elements), nvars, npol, npol, npts). Elements not in the cache
+        are read with one call per run of consecutive elements.
+        """
+        elements = np.asarray(elements, dtype=np.int64).ravel()
+        snapshots = self.snapshots
+        _, nvars, npol, _, npts = snapshots.shape
+        result = np.empty((elements.size, nvars, npol, npol, npts),
+                          dtype=snapshots.dtype)
+
+        missing = []
+        for i, e in enumerate(elements):
+            block = self.cache.get(int(e))
+            if block is None:
+                missing.append(i)
+            else:
+                result[i] = block
+
+        blocks = {}
+        unique = np.unique(elements[missing])
+        if unique.size:
+            breaks = np.where(np.diff(unique) != 1)[0] + 1
+            for run in np.split(unique, breaks):
+                data = snapshots[run[0]:run[-1] + 1]
+                for e, block in zip(run, data):
+                    # copy so that evicted blocks free the memory
+                    block = block.copy()
+                    block.flags.writeable = False
+                    self.cache.put(int(e), block)
+                    blocks[e] = block
+
+        for i in missing:
+            result[i] = blocks[elements[i]]
+        return result
+
+    def interpolate(self, s, z):
+        """
+        Interpolate MergedSnapshots at points given by their physical
+        coordinates, see interpolation.interpolate. Element blocks are read
+        through the cache.
+
+        :returns: numpy array of shape (npoints, nvars, npts), nan for points
+            outside of the mesh
+        """
+        element, xi, eta = self.spatial_index.map_to_reference(s, z)
+        return interpolate(_CachedSnapshots(self), self.mesh('gll'), element,
+                           xi, eta, self.cache.max_size)
+
+
+class _CachedSnapshots(object):
+    """
+    array-like view of MergedSnapshots that reads through the element cache
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.shape = database.snapshots.shape
+
+    def __getitem__(self, index):
+        start, stop, step = index.indices(self.shape[0])
+        return self.database.get_elements(np.arange(start, stop, step))
@@ -51,3 +51,78 @@ def gauss_lobatto_legendre_quadruature_points_weights_fast(n=5, eps=1e-15):
     w = 2. / ((n - 1) * n * P[:, n-1] ** 2)
 
     return x[::-1], w
+
+
+def jacobi_recurrence(n, alpha=0., beta=0.):
+    """
+    Recurrence coefficients of the monic Jacobi polynomials for the weight
+    function (1 - x) ** alpha * (1 + x) ** beta.
+
+    :returns: tuple of the diagonal a_k, k = 0..n-1, and the squared off
+        diagonal b_k, k = 1..n-1, of the Jacobi matrix
+    """
+    k = np.arange(n, dtype=np.float64)
+    ab = alpha + beta
+    a = np.empty(n)
+    a[0] = (beta - alpha) / (ab + 2)
+    s = 2 * k[1:] + ab
+    a[1:] = (beta ** 2 - alpha ** 2) / (s * (s + 2))
+
+    k = k[1:]
+    s = 2 * k + ab
+    b = 4 * k * (k + alpha) * (k + beta) * (k + ab) / (
+        s ** 2 * (s + 1) * (s - 1))
+    return a, b
+
+
+def gauss_lobatto_jacobi_golub_welsch(n=5, alpha=0., beta=0.):
+    """
+    compute Gauss-Lobatto-Jacobi quadrature points and weights for the weight
+    function (1 - x) ** alpha * (1 + x) ** beta on [-1, 1] from the
+    eigenvalues of the Jacobi matrix modified to have eigenvalues at -1 and 1
+    (Golub-Welsch algorithm with Golub's modification for Lobatto rules).
+
+    Stable for large n, as no polynomials are evaluated.
+
+    :param n: number of integration points (order + 1)
+    :type n: integer
+    :param alpha: exponent of (1 - x) in the weight function
+    :type alpha: float
+    :param beta: exponent of (1 + x) in the weight function
+    :type beta: float
+
+    :returns: tuple of two numpy arrays of floats containing the points and
+        weights
+    """
+    from math import gamma
+
+    if n < 2:
+        raise ValueError('Lobatto rules need at least 2 points')
+
+    a, b = jacobi_recurrence(n, alpha, beta)
+
+    # modify the last row such that -1 and 1 are eigenvalues
+    J = np.diag(a[:n - 1]) + np.diag(np.sqrt(b[:n - 2]), 1) + \
+        np.diag(np.sqrt(b[:n - 2]), -1)
+    e = np.zeros(n - 1)
+    e[-1] = 1.
+    d_m = np.linalg.solve(J + np.eye(n - 1), e)[-1]
+    d_p = np.linalg.solve(J - np.eye(n - 1), e)[-1]
+    a_n, b_n = np.linalg.solve([[1., -d_p], [1., -d_m]], [1., -1.])
+
+    a = np.concatenate([a[:n - 1], [a_n]])
+    b = np.concatenate([b[:n - 2], [b_n]])
+    J = np.diag(a) + np.diag(np.sqrt(b), 1) + np.diag(np.sqrt(b), -1)
+
+    x, v = np.linalg.eigh(J)
+    if alpha == beta:
+        x = (x - x[::-1]) / 2
+    x[0], x[-1] = -1., 1.
+
+    mu0 = 2 ** (alpha + beta + 1) * gamma(alpha + 1) * gamma(beta + 1) / \
+        gamma(alpha + beta + 2)
+    w = mu0 * v[0] ** 2
+    if alpha == beta:
+        w = (w + w[::-1]) / 2
+
+    return x, w
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Global numbering of coincident GLL points.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+
+def hash_points(x, y, tolerance=1e-8, layer=None):
+    """
+    Hash points onto a grid with spacing tolerance. Coincident points are
+    in the same or in neighbouring cells, see get_global_numbering_from_keys.
+
+    :param x: x coordinates of the points, arbitrary shape
+    :type x: numpy array
+    :param y: y coordinates of the points, same shape as x
+    :type y: numpy array
+    :param tolerance: distance below which points are considered coincident
+    :type tolerance: float
+    :param layer: optional integer array broadcastable to the shape of x.
+        Points are only merged if they have the same layer, e.g. to keep
+        separate points on both sides of a discontinuity.
+    :type layer: numpy array
+
+    :returns: list of flat integer arrays, the keys of the points
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    keys = [np.round(y.ravel() / tolerance).astype(np.int64),
+            np.round(x.ravel() / tolerance).astype(np.int64)]
+    if layer is not None:
+        keys.append(np.broadcast_to(layer, x.shape).ravel().astype(np.int64))
+
+    return keys
+
+
+def _find_cells(cells, shifted):
+    # index of each shifted cell in the lexicographically sorted unique cells
+    # (last key most significant), -1 if not present
+    extent = [int(k.max()) - int(k.min()) + 3 for k in cells]
+    if np.prod(extent, dtype=object) < 2 ** 62:
+        # mixed radix code, monotonous in the lexicographic order
+        code = np.zeros(cells[0].size, dtype=np.int64)
+        code_shifted = np.zeros(cells[0].size, dtype=np.int64)
+        for k, ks, n in reversed(list(zip(cells, shifted, extent))):
+            kmin = k.min() - 1
+            code = code * n + (k - kmin)
+            code_shifted = code_shifted * n + (ks - kmin)
+        index = np.minimum(np.searchsorted(code, code_shifted), code.size - 1)
+        return np.where(code[index] == code_shifted, index, -1)
+
+    # originals sort before shifted cells with equal keys
+    ncells = cells[0].size
+    flag = np.repeat([0, 1], ncells)
+    source = np.concatenate([np.arange(ncells)] * 2)
+    keys = [np.concatenate(k) for k in zip(cells, shifted)]
+    order = np.lexsort([flag] + keys)
+    match = (flag[order[:-1]] == 0) & (flag[order[1:]] == 1)
+    for k in keys:
+        match &= k[order[:-1]] == k[order[1:]]
+    match = np.flatnonzero(match)
+    index = -np.ones(ncells, dtype=np.int64)
+    index[source[order[match + 1]]] = source[order[match]]
+    return index
+
+
+def _merge_adjacent_cells(cells, ncoords):
+    # labels of the connected components of the sorted unique cells, where
+    # cells are connected if their first ncoords keys differ by at most one
+    # and the other keys are equal
+    a = []
+    b = []
+    for offset in np.ndindex(*(3,) * ncoords):
+        offset = np.array(offset) - 1
+        # each pair of cells once, for the offsets lexicographically after 0
+        nonzero = np.flatnonzero(offset)
+        if not nonzero.size or offset[nonzero[0]] < 0:
+            continue
+        shifted = [k + offset[i] if i < ncoords else k
+                   for i, k in enumerate(cells)]
+        index = _find_cells(cells, shifted)
+        found = np.flatnonzero(index >= 0)
+        a.append(found)
+        b.append(index[found])
+
+    labels = np.arange(cells[0].size)
+    a = np.concatenate(a)
+    b = np.concatenate(b)
+    while a.size:
+        m = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    return labels
+
+
+def get_global_numbering_from_keys(keys, ncoords=2):
+    """
+    Compute a global numbering of points with the same integer keys.
+
+    The keys are sorted lexicographically, the global ids are assigned in
+    order of the first occurrence of each key, so points of consecutive
+    elements get consecutive ids.
+
+    The first ncoords keys are grid cells as computed by hash_points. Two
+    coincident points may fall into neighbouring cells if they straddle a
+    cell boundary, so points in cells differing by at most one in these
+    keys are merged as well, if all other keys are equal.
+
+    :param keys: list of flat integer arrays of equal length, e.g. from
+        hash_points
+    :type keys: list of numpy arrays
+    :param ncoords: number of leading keys that are grid cells, 0 to only
+        merge points with equal keys
+    :type ncoords: integer
+
+    :returns: tuple of the flat global ids and the indices of the first
+        occurrence of each unique point, ordered by global id
+    """
+    # sort lexicographically and find the boundaries of groups of equal keys
+    order = np.lexsort(keys)
+    new = np.zeros(order.size, dtype=bool)
+    new[:1] = True
+    for k in keys:
+        k = k[order]
+        new[1:] |= k[1:] != k[:-1]
+
+    starts = np.flatnonzero(new)
+    group = np.cumsum(new) - 1
+    first = np.minimum.reduceat(order, starts) if order.size else order
+
+    # merge groups in neighbouring cells
+    if ncoords and order.size:
+        cells = [k[order[starts]] for k in keys]
+        labels = _merge_adjacent_cells(cells, ncoords)
+        labels, group_label = np.unique(labels, return_inverse=True)
+        merged = np.full(labels.size, order.size, dtype=first.dtype)
+        np.minimum.at(merged, group_label, first)
+        group = group_label[group]
+        first = merged
+
+    # number the groups by first occurrence
+    rank = np.empty(first.size, dtype=np.int64)
+    rank[np.argsort(first, kind='mergesort')] = np.arange(first.size)
+
+    ids = np.empty(order.size, dtype=np.int64)
+    ids[order] = rank[group]
+
+    return ids, np.sort(first)
+
+
+def get_global_numbering(x, y, tolerance=1e-8, layer=None):
+    """
+    Merge coincident points and compute a global numbering.
+
+    The coordinates are hashed onto a grid with spacing tolerance, points
+    falling into the same or neighbouring grid cells are merged. Points
+    closer than tolerance are always merged, distinct points are assumed to
+    be much further apart than tolerance. The global ids are assigned
+    in order of the first occurrence of each point.
+
+    :param x: x coordinates of the points, arbitrary shape
+    :type x: numpy array
+    :param y: y coordinates of the points, same shape as x
+    :type y: numpy array
+    :param tolerance: distance below which points are considered coincident
+    :type tolerance: float
+    :param layer: optional integer array broadcastable to the shape of x.
+        Points are only merged if they have the same layer.
+    :type layer: numpy array
+
+    :returns: tuple of the global ids with the same shape as x and the
+        indices of the first occurrence of each unique point in the
+        flattened input, ordered by global id
+    """
+    ids, unique_index = get_global_numbering_from_keys(
+        hash_points(x, y, tolerance, layer))
+    return ids.reshape(np.shape(x)), unique_index
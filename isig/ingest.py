@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Fill MergedSnapshots from time-major solver dumps.
+
+Solver output arrives one snapshot at a time with the values of all
+variables at all GLL points, shape (nvars, gllpoints_all), in the point order
+of the database. MergedSnapshots is element-major, so the snapshots are
+transposed in blocks of elements with bounded memory. Reading the next block
+runs on a background thread overlapped with writing the current one.
+
+    python -m isig.ingest isig_prem_ani_50s_100km.nc snapshot_*.npy
+
+Snapshots sampled finer than the database are decimated with an
+anti-aliasing filter, see sampling.decimate.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import argparse
+import functools
+import glob
+import threading
+
+import numpy as np
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+from .create_db import DEFAULT_MEMORY_BUDGET
+from .instrumentation import Instrumentation
+from .modal import MODAL_ORDER_VARIABLE, to_truncated_modal, to_nodal
+from .sampling import decimate, get_decimation_samples
+from .quantization import (SCALE_VARIABLE, OFFSET_VARIABLE, quantize,
+                           dequantize, get_relative_error)
+
+# number of element blocks in memory at once: one being read, one waiting in
+# the queue and one being written
+NBUFFERS = 3
+
+
+def load_snapshot_files(filenames):
+    """
+    Memory-map snapshot files, one .npy file per snapshot with shape
+    (nvars, gllpoints_all), so they can be larger than memory.
+
+    :param filenames: filenames in temporal order
+    :type filenames: list of strings
+
+    :returns: list of memory-mapped arrays
+    """
+    return [np.load(f, mmap_mode='r') for f in filenames]
+
+
+def get_block_size(nvars, npol, npts, chunk_elements=1,
+                   memory_budget=DEFAULT_MEMORY_BUDGET, decimation=1):
+    """
+    Number of elements transposed at once, a multiple of the elements per
+    MergedSnapshots chunk if the memory budget allows, so that each chunk is
+    written once.
+
+    :param npts: number of snapshots read
+    :type npts: integer
+    :param decimation: decimation factor, the reader additionally holds the
+        memory of sampling.decimate for one block
+    :type decimation: integer
+
+    :returns: number of elements per block, at least 1
+    """
+    sample_bytes = nvars * npol ** 2 * 4
+    element_bytes = sample_bytes * (
+        NBUFFERS * npts + get_decimation_samples(npts, decimation))
+    nelem = max(int(memory_budget // element_bytes), 1)
+    if nelem >= chunk_elements:
+        nelem -= nelem % chunk_elements
+    return nelem
+
+
+def _read_block(snapshots, sem, nvars, dtype=np.float32):
+    """
+    Gather the values of a block of elements from all snapshots, reading
+    only the range of points the block refers to.
+
+    :returns: numpy array of shape (nelem, nvars, npol, npol, npts)
+    """
+    nelem, npol, _ = sem.shape
+    npts = len(snapshots)
+    pmin = sem.min()
+    idx = (sem - pmin).ravel()
+    pmax = sem.max() + 1
+
+    block = np.empty((nelem, nvars, npol, npol, npts), dtype=dtype)
+    for it in np.arange(npts):
+        data = np.asarray(snapshots[it][:, pmin:pmax])[:, idx]
+        block[..., it] = data.reshape((nvars, nelem, npol, npol)).transpose(
+            (1, 0, 2, 3))
+    return block
+
+
+def _encode_block(block, quantization=None, gll=None, modal_tolerance=None):
+    """
+    encode a block: truncated Legendre coefficients if modal_tolerance is
+    given, quantized if quantization is given. Returns the arrays in the
+    order MergedSnapshots, scale, offset, modal order (as far as present) and
+    the error relative to the maximum amplitudes.
+    """
+    data = block
+    arrays = []
+    if modal_tolerance is not None:
+        data, order = to_truncated_modal(block, gll, modal_tolerance)
+        data = data.astype(np.float32)
+        arrays.append(order.astype(np.int8))
+
+    decoded = data
+    if quantization is not None:
+        data, scale, offset = quantize(data, quantization)
+        arrays = [scale, offset] + arrays
+        decoded = dequantize(data, scale, offset)
+    if modal_tolerance is not None:
+        decoded = to_nodal(decoded.astype(np.float64), gll)
+
+    return [data] + arrays, get_relative_error(block, decoded)
+
+
+def _reader(snapshots, sem, nvars, ranges, q, stop_event, instr,
+            decimation=1, encode=None):
+    """
+    background thread reading blocks of elements into the queue, decimated
+    and encoded with encode, see _encode_block. Returns without reading
+    further blocks once stop_event is set.
+    """
+    try:
+        for start, stop in ranges:
+            if stop_event.is_set():
+                return
+            with instr.stage('ingest_read'):
+                block = _read_block(snapshots, sem[start:stop], nvars)
+            if decimation > 1:
+                with instr.stage('decimation'):
+                    block = decimate(block, decimation)
+            if encode is None:
+                q.put((start, stop, [block], 0.))
+                continue
+            with instr.stage('encoding'):
+                arrays, error = encode(block)
+            q.put((start, stop, arrays, error))
+    except Exception as e:
+        q.put(e)
+    else:
+        q.put(None)
+
+
+def ingest_snapshots(fname, snapshots, memory_budget=DEFAULT_MEMORY_BUDGET,
+                     stf=None, stf_d=None, decimation=1,
+                     instrumentation=None):
+    """
+    Fill MergedSnapshots of a database created with create_db from time-major
+    snapshots. Quantized and modal databases are encoded per block, see
+    quantization.quantize and modal.to_truncated_modal.
+
+    :param fname: filename of the database
+    :type fname: string
+    :param snapshots: snapshots in temporal order, each indexable as an
+        array of shape (nvars, gllpoints_all), e.g. from load_snapshot_files
+        or an array of shape (npts, nvars, gllpoints_all)
+    :type snapshots: list of arrays or array
+    :param memory_budget: memory for the element blocks in bytes
+    :type memory_budget: integer
+    :param stf: source time function written to stf_dump, sampled as the
+        snapshots
+    :type stf: numpy array
+    :param stf_d: derivative of the source time function written to
+        stf_d_dump, sampled as the snapshots
+    :type stf_d: numpy array
+    :param decimation: ratio of the database sampling interval to the one of
+        the snapshots. Snapshot i * decimation is database sample i, the
+        snapshots are lowpass filtered first to avoid aliasing.
+    :type decimation: integer
+    :param instrumentation: collects timings and bytes written
+    :type instrumentation: instrumentation.Instrumentation
+
+    :returns: dictionary with the number of elements, snapshots and bytes
+        written, the achieved maximum error relative to the maximum
+        amplitude per element and variable (0 without quantization and modal
+        storage), the ratio of float32 bytes to bytes written and for modal
+        storage the mean number of degrees kept per element
+    """
+    import h5netcdf
+
+    instr = instrumentation or Instrumentation(enabled=False)
+
+    with h5netcdf.File(fname, 'r+') as f:
+        var = f['MergedSnapshots']
+        nelem, nvars, npol, _, npts = var.shape
+
+        nin = len(snapshots)
+        if not (npts - 1) * decimation < nin <= npts * decimation:
+            raise ValueError(
+                'got %d snapshots, the database has %d with decimation %d'
+                % (nin, npts, decimation))
+        npoints = f.dimensions['gllpoints_all'].size
+        if tuple(snapshots[0].shape) != (nvars, npoints):
+            raise ValueError('snapshots have shape %s, expected %s' %
+                             (tuple(snapshots[0].shape), (nvars, npoints)))
+
+        for name, data in [('stf_dump', stf), ('stf_d_dump', stf_d)]:
+            if data is not None:
+                f[name][:] = decimate(data, decimation)
+
+        quantization = var.attrs.get('quantization')
+        modal_tolerance = var.attrs.get('modal_tolerance')
+        variables = [var]
+        encode = None
+        if quantization is not None:
+            variables += [f[SCALE_VARIABLE], f[OFFSET_VARIABLE]]
+        if modal_tolerance is not None:
+            variables.append(f[MODAL_ORDER_VARIABLE])
+        if len(variables) > 1:
+            encode = functools.partial(
+                _encode_block, quantization=quantization,
+                gll=f['Mesh/gll'][:], modal_tolerance=modal_tolerance)
+
+        sem = f['Mesh/sem_mesh'][:]
+        chunk_elements = var.chunks[0] if var.chunks else 1
+        block_size = get_block_size(nvars, npol, nin, chunk_elements,
+                                    memory_budget, decimation)
+        ranges = [(start, min(start + block_size, nelem))
+                  for start in np.arange(0, nelem, block_size)]
+
+        q = queue.Queue(maxsize=NBUFFERS - 2)
+        stop_event = threading.Event()
+        reader = threading.Thread(
+            target=_reader,
+            args=(snapshots, sem, nvars, ranges, q, stop_event, instr,
+                  decimation, encode))
+        reader.daemon = True
+        reader.start()
+
+        nbytes = 0
+        max_error = 0.
+        modal_orders = 0
+        try:
+            while True:
+                item = q.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                start, stop, arrays, error = item
+                for v, a in zip(variables, arrays):
+                    with instr.stage('ingest_write'):
+                        v[start:stop] = a
+                    instr.add_bytes(v.name, a.nbytes)
+                    nbytes += a.nbytes
+                max_error = max(max_error, error)
+                if modal_tolerance is not None:
+                    modal_orders += int(arrays[-1].sum())
+        finally:
+            # stop the reader after the current block if writing failed and
+            # unblock it
+            stop_event.set()
+            while reader.is_alive():
+                try:
+                    q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            reader.join()
+
+    info = {'nelem': nelem, 'npts': npts, 'block_size': block_size,
+            'bytes_written': nbytes, 'max_error': max_error,
+            'compression_ratio': nelem * nvars * npol ** 2 * npts * 4. /
+            max(nbytes, 1)}
+    if modal_tolerance is not None:
+        info['mean_modal_order'] = modal_orders / float(max(nelem, 1))
+    return info
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="python -m isig.ingest",
+        description='Fill MergedSnapshots of an isig database from '
+                    'time-major snapshot files.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('database', type=str, help='isig database')
+
+    parser.add_argument(
+        'snapshot_files', type=str, nargs='+',
+        help='.npy files of shape (nvars, gllpoints_all), one per snapshot, '
+             'in temporal order. Glob patterns are expanded and sorted.')
+
+    parser.add_argument(
+        '--memory_budget', type=float, default=256.,
+        help='Memory used for the element blocks in MB.')
+
+    parser.add_argument(
+        '--decimation', type=int, default=1,
+        help='Ratio of the database sampling interval to the one of the '
+             'snapshots, the snapshots are lowpass filtered and decimated.')
+
+    args = parser.parse_args()
+
+    filenames = []
+    for pattern in args.snapshot_files:
+        filenames += sorted(glob.glob(pattern)) or [pattern]
+
+    info = ingest_snapshots(
+        args.database, load_snapshot_files(filenames),
+        memory_budget=int(args.memory_budget * 1024 ** 2),
+        decimation=args.decimation)
+
+    print('wrote %d snapshots of %d elements, %.4f GB' % (
+        info['npts'], info['nelem'], info['bytes_written'] / 1024. ** 3))
+    print('compression ratio %.2f, max. relative error %.2e' % (
+        info['compression_ratio'], info['max_error']))
+    if 'mean_modal_order' in info:
+        print('mean modal order %.2f' % (info['mean_modal_order'],))
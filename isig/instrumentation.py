@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Stage timers, memory and I/O counters for the database generation.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import sys
+import threading
+import timeit
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+
+def get_peak_rss():
+    """
+    Peak resident set size of the process in bytes, None if not available.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+class Instrumentation(object):
+    """
+    Collects the wall time and memory of named stages and the number of
+    bytes written per variable.
+
+    The peak memory of a stage is peak_traced, collected with
+    trace_memory: the peak of the memory allocated by Python and numpy
+    within the stage on top of the memory allocated at its start, including
+    nested stages. Without trace_memory, only the increase of the peak
+    resident set size of the process during the stage is recorded
+    (rss_increase), which is zero if the stage stays below the peak of an
+    earlier one. Both are the maximum over the calls of a stage.
+
+    The memory counters are process-wide, so they are only collected for
+    stages entered from the thread that created the instance. Stages
+    entered from other threads, e.g. the workers of create_db with
+    nthreads > 1, count calls and wall time only. Their wall time is summed
+    over the threads and can exceed the elapsed time, the memory of the
+    workers is included in the enclosing stage of the creating thread.
+
+    A single instance can be passed to several runs of create_db (or the
+    pipeline) and accumulates the metrics. A disabled instance adds no
+    overhead. Use it as a context manager or call close to stop tracing
+    memory.
+
+    :param enabled: collect metrics
+    :type enabled: bool
+    :param trace_memory: additionally trace the memory allocated by Python
+        and numpy using tracemalloc, adds some overhead
+    :type trace_memory: bool
+    """
+
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory and \
+            tracemalloc is not None
+        self.stages = OrderedDict()
+        self.bytes_written = OrderedDict()
+        self.metadata = OrderedDict()
+        self._lock = threading.Lock()
+        # traced memory at the start and peak of the open stages of the
+        # creating thread
+        self._traced = []
+        self._thread = threading.current_thread()
+
+        self._started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Stop tracing memory if this instance started it.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.trace_memory = False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager timing a stage. Stages with the same name are
+        accumulated, e.g. when processing chunks of elements, also when run
+        in several threads, see Instrumentation for the metrics collected.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        memory = threading.current_thread() is self._thread
+        trace = memory and self.trace_memory and \
+            hasattr(tracemalloc, 'reset_peak')
+        if trace:
+            self._push_traced()
+        rss = get_peak_rss() if memory else None
+
+        t = timeit.default_timer()
+        try:
+            yield
+        finally:
+            elapsed = timeit.default_timer() - t
+            if rss is not None:
+                rss = get_peak_rss() - rss
+            peak = self._pop_traced() if trace else None
+
+            with self._lock:
+                s = self.stages.setdefault(name, OrderedDict(
+                    [('calls', 0), ('wall_time', 0.),
+                     ('rss_increase', rss)]))
+                s['calls'] += 1
+                s['wall_time'] += elapsed
+                if rss is not None:
+                    s['rss_increase'] = max(s['rss_increase'] or 0, rss)
+                if peak is not None:
+                    s['peak_traced'] = max(s.get('peak_traced', 0), peak)
+
+    def _push_traced(self):
+        # the peak is reset for the new stage, keep it for the enclosing one
+        current, peak = tracemalloc.get_traced_memory()
+        if self._traced:
+            self._traced[-1][1] = max(self._traced[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._traced.append([current, current])
+
+    def _pop_traced(self):
+        # peak of the stage on top of the memory traced at its start
+        start, peak = self._traced.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._traced:
+            self._traced[-1][1] = max(self._traced[-1][1], peak)
+        return peak - start
+
+    def add_bytes(self, variable, nbytes):
+        """
+        Count bytes written to a variable.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.bytes_written[variable] = \
+                self.bytes_written.get(variable, 0) + int(nbytes)
+
+    def to_dict(self):
+        """
+        Metrics as a dictionary of plain python types.
+        """
+        return OrderedDict([
+            ('metadata', self.metadata),
+            ('stages', self.stages),
+            ('bytes_written', self.bytes_written),
+            ('total_bytes_written', sum(self.bytes_written.values())),
+            ('peak_rss', get_peak_rss())])
+
+    def write_json(self, fname):
+        """
+        Write the metrics to a JSON file.
+        """
+        with open(fname, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def get_report_filename(fname):
+    """
+    filename of the JSON report alongside a database
+    """
+    if fname.endswith('.nc'):
+        fname = fname[:-3]
+    return fname + '.json'
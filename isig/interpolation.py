@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Interpolation of MergedSnapshots at many points at once.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .basis_polynomials import lagrange_basis
+from .create_db import DEFAULT_MEMORY_BUDGET
+from .quantization import get_snapshots
+from .spatial_index import SpatialIndex
+
+
+def get_interpolation_weights(gll, xi, eta):
+    """
+    Tensor product Lagrange basis weights at reference coordinates.
+
+    :param gll: GLL points, shape (npol,)
+    :type gll: numpy array
+    :param xi: reference coordinates along xi, shape (npoints,)
+    :type xi: numpy array
+    :param eta: reference coordinates along eta, shape (npoints,)
+    :type eta: numpy array
+
+    :returns: numpy array of shape (npoints, npol, npol) with the index order
+        (point, eta, xi) matching MergedSnapshots
+    """
+    l_xi = lagrange_basis(gll, np.asarray(xi, dtype=np.float64))
+    l_eta = lagrange_basis(gll, np.asarray(eta, dtype=np.float64))
+    return l_eta[:, :, np.newaxis] * l_xi[:, np.newaxis, :]
+
+
+def _read_elements(snapshots, elements):
+    """
+    Read the blocks of sorted unique elements, one read per run of
+    consecutive elements.
+    """
+    breaks = np.where(np.diff(elements) != 1)[0] + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [elements.size]])
+    return np.concatenate([
+        np.asarray(snapshots[elements[i]:elements[j - 1] + 1])
+        for i, j in zip(starts, stops)])
+
+
+def interpolate(snapshots, gll, element, xi, eta,
+                memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Interpolate MergedSnapshots at many points given by element and
+    reference coordinates.
+
+    The points are grouped by element and the block of each element is read
+    only once. The basis weights are contracted with the element data per
+    point in single precision, for as many points at once as the element
+    data gathered for them fits into memory_budget.
+
+    :param snapshots: MergedSnapshots, shape (nelem, nvars, npol, npol, npts)
+    :type snapshots: h5netcdf.Variable, h5py.Dataset, numpy array or
+        quantization.QuantizedSnapshots
+    :param gll: GLL points, shape (npol,)
+    :type gll: numpy array
+    :param element: element ids of the points, -1 for points outside of the
+        mesh, see spatial_index.SpatialIndex.map_to_reference
+    :type element: numpy array of integers
+    :param xi: reference coordinates along xi
+    :type xi: numpy array
+    :param eta: reference coordinates along eta
+    :type eta: numpy array
+    :param memory_budget: memory for the element blocks read at once and
+        for the element data gathered per point, each, in bytes
+    :type memory_budget: integer
+
+    :returns: numpy array of shape (npoints, nvars, npts), nan for points
+        outside of the mesh
+    """
+    element = np.asarray(element).ravel()
+    xi = np.asarray(xi, dtype=np.float64).ravel()
+    eta = np.asarray(eta, dtype=np.float64).ravel()
+    _, nvars, npol, _, npts = snapshots.shape
+    npol2 = npol ** 2
+
+    result = np.full((element.size, nvars, npts), np.nan, dtype=np.float32)
+    found = np.where(element >= 0)[0]
+    if found.size == 0:
+        return result
+
+    weights = get_interpolation_weights(gll, xi[found], eta[found]).reshape(
+        (-1, npol2)).astype(np.float32)
+
+    # group the points by element
+    order = np.argsort(element[found], kind='mergesort')
+    found = found[order]
+    weights = weights[order]
+    unique, first, count = np.unique(element[found], return_index=True,
+                                     return_counts=True)
+
+    element_bytes = nvars * npol2 * npts * 4
+    block_size = max(int(memory_budget // element_bytes), 1)
+
+    for start in np.arange(0, unique.size, block_size):
+        stop = min(start + block_size, unique.size)
+        data = _read_elements(snapshots, unique[start:stop])
+        # (elements, npol * npol, nvars * npts)
+        data = data.astype(np.float32, copy=False).reshape(
+            (-1, nvars, npol2, npts)).transpose((0, 2, 1, 3)).reshape(
+            (-1, npol2, nvars * npts))
+
+        # the points of the block, grouped by element
+        _count = count[start:stop]
+        points = first[start] + np.arange(_count.sum())
+        group = np.repeat(np.arange(stop - start), _count)
+
+        for p in np.arange(0, points.size, block_size):
+            _points = points[p:p + block_size]
+            values = np.einsum('pk,pkn->pn', weights[_points],
+                               data[group[p:p + block_size]])
+            result[found[_points]] = values.reshape((-1, nvars, npts))
+
+    return result
+
+
+def interpolate_database(f, s, z, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Interpolate MergedSnapshots of a database at points given by their
+    physical coordinates.
+
+    :param f: open database
+    :type f: h5netcdf.File or h5py.File
+    :param s: s coordinates in the units of mesh_S
+    :type s: numpy array
+    :param z: z coordinates in the units of mesh_Z
+    :type z: numpy array
+
+    :returns: numpy array of shape (npoints, nvars, npts), nan for points
+        outside of the mesh
+    """
+    index = SpatialIndex.read(f)
+    element, xi, eta = index.map_to_reference(s, z)
+    return interpolate(get_snapshots(f), f['Mesh/gll'][:], element, xi, eta,
+                       memory_budget)
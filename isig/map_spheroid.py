@@ -10,32 +10,236 @@ Spheroidal mapping.
 '''
 import numpy as np
 
+# number of elements mapped at once, limits the size of the temporaries
+DEFAULT_BLOCK_SIZE = 4096
 
-def map_spheroid(gll_points, nodes):
-    """
-    nodes(nelem, 4, 2)
+
+def map_spheroid(gll_points, nodes, out=None, dtype=np.float64,
+                 block_size=DEFAULT_BLOCK_SIZE):
     """
-    r = np.sqrt((nodes ** 2).sum(axis=-1))
-    theta = np.arctan2(nodes[..., 0], nodes[..., 1])
+    Map a tensorized set of reference points to the physical domain of
+    spheroidal elements.
 
+    The mapping is fully broadcast over blocks of elements, the trigonometric
+    functions are only evaluated once per element and reference point along
+    xi.
+
+    :param gll_points: reference coordinates in [-1, 1], shape (npol,)
+    :type gll_points: numpy array
+    :param nodes: control nodes of the elements, shape (nelem, 4, 2)
+    :type nodes: numpy array
+    :param out: optional tuple of two arrays of shape (nelem, npol, npol) to
+        write the result to
+    :type out: tuple of numpy arrays
+    :param dtype: data type of the output if out is not given
+    :type dtype: numpy dtype
+    :param block_size: number of elements mapped at once, None to map all
+        elements in a single block
+    :type block_size: integer
+
+    :returns: tuple of two numpy arrays of shape (nelem, npol, npol)
+        containing the x and y coordinates with the index order
+        (element, eta, xi)
+    """
+    gll_points = np.asarray(gll_points, dtype=np.float64)
     nelem = nodes.shape[0]
     npol = gll_points.shape[0]
-    points_x = np.zeros((nelem, npol, npol))
-    points_y = np.zeros((nelem, npol, npol))
 
-    eta, xi = np.meshgrid(gll_points, gll_points, indexing='ij')
+    if out is None:
+        points_x = np.empty((nelem, npol, npol), dtype=dtype)
+        points_y = np.empty((nelem, npol, npol), dtype=dtype)
+    else:
+        points_x, points_y = out
+        for p in out:
+            if p.shape != (nelem, npol, npol):
+                raise ValueError('output buffer has shape %s, expected %s' %
+                                 (p.shape, (nelem, npol, npol)))
 
-    for i, (_r, _t) in enumerate(zip(r, theta)):
-        points_x[i] = \
-            (1 + eta) * _r[..., 3] / 2 * np.sin(
-                ((1 - xi) * _t[..., 3] + (1 + xi) * _t[..., 2]) / 2) + \
-            (1 - eta) * _r[..., 0] / 2 * np.sin(
-              ((1 - xi) * _t[..., 0] + (1 + xi) * _t[..., 1]) / 2)
+    if block_size is None:
+        block_size = max(nelem, 1)
 
-        points_y[i] = \
-            (1 + eta) * _r[..., 3] / 2 * np.cos(
-                ((1 - xi) * _t[..., 3] + (1 + xi) * _t[..., 2]) / 2) + \
-            (1 - eta) * _r[..., 0] / 2 * np.cos(
-              ((1 - xi) * _t[..., 0] + (1 + xi) * _t[..., 1]) / 2)
+    # weights along eta (axis 1) and xi (axis 2)
+    eta_p = ((1 + gll_points) / 2)[np.newaxis, :, np.newaxis]
+    eta_m = ((1 - gll_points) / 2)[np.newaxis, :, np.newaxis]
+    xi_p = ((1 + gll_points) / 2)[np.newaxis, :]
+    xi_m = ((1 - gll_points) / 2)[np.newaxis, :]
+
+    for start in np.arange(0, nelem, block_size):
+        stop = min(start + block_size, nelem)
+        _nodes = nodes[start:stop]
+
+        r = np.sqrt((_nodes ** 2).sum(axis=-1))
+        theta = np.arctan2(_nodes[..., 0], _nodes[..., 1])
+
+        # colatitude along the bottom and top edges, shape (nblock, npol)
+        theta_bottom = xi_m * theta[:, 0, np.newaxis] + \
+            xi_p * theta[:, 1, np.newaxis]
+        theta_top = xi_m * theta[:, 3, np.newaxis] + \
+            xi_p * theta[:, 2, np.newaxis]
+
+        # radial weights, shape (nblock, npol, 1)
+        w_bottom = eta_m * r[:, 0, np.newaxis, np.newaxis]
+        w_top = eta_p * r[:, 3, np.newaxis, np.newaxis]
+
+        for p, func in zip((points_x, points_y), (np.sin, np.cos)):
+            p[start:stop] = w_top * func(theta_top)[:, np.newaxis, :] + \
+                w_bottom * func(theta_bottom)[:, np.newaxis, :]
 
     return points_x, points_y
+
+
+def jacobian_spheroid(gll_points, nodes, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Jacobian determinant and inverse Jacobian of the spheroidal mapping at a
+    tensorized set of reference points, computed analytically from the same
+    mapping as map_spheroid.
+
+    :param gll_points: reference coordinates in [-1, 1], shape (npol,)
+    :type gll_points: numpy array
+    :param nodes: control nodes of the elements, shape (nelem, 4, 2)
+    :type nodes: numpy array
+    :param block_size: number of elements processed at once, None to
+        process all elements in a single block
+    :type block_size: integer
+
+    :returns: tuple of five numpy arrays of shape (nelem, npol, npol) with
+        the index order (element, eta, xi): the determinant of the Jacobian
+        and the inverse Jacobian terms dxi/dx, dxi/dy, deta/dx, deta/dy
+    """
+    gll_points = np.asarray(gll_points, dtype=np.float64)
+    nelem = nodes.shape[0]
+    npol = gll_points.shape[0]
+
+    result = tuple(np.empty((nelem, npol, npol)) for _ in range(5))
+    det, dxi_dx, dxi_dy, deta_dx, deta_dy = result
+
+    if block_size is None:
+        block_size = max(nelem, 1)
+
+    eta_p = ((1 + gll_points) / 2)[np.newaxis, :, np.newaxis]
+    eta_m = ((1 - gll_points) / 2)[np.newaxis, :, np.newaxis]
+    xi_p = ((1 + gll_points) / 2)[np.newaxis, :]
+    xi_m = ((1 - gll_points) / 2)[np.newaxis, :]
+
+    for start in np.arange(0, nelem, block_size):
+        stop = min(start + block_size, nelem)
+        _nodes = nodes[start:stop]
+
+        r = np.sqrt((_nodes ** 2).sum(axis=-1))
+        theta = np.arctan2(_nodes[..., 0], _nodes[..., 1])
+
+        theta_bottom = (xi_m * theta[:, 0, np.newaxis] +
+                        xi_p * theta[:, 1, np.newaxis])[:, np.newaxis, :]
+        theta_top = (xi_m * theta[:, 3, np.newaxis] +
+                     xi_p * theta[:, 2, np.newaxis])[:, np.newaxis, :]
+        dtheta_bottom = ((theta[:, 1] - theta[:, 0]) / 2)[
+            :, np.newaxis, np.newaxis]
+        dtheta_top = ((theta[:, 2] - theta[:, 3]) / 2)[
+            :, np.newaxis, np.newaxis]
+
+        r_bottom = r[:, 0, np.newaxis, np.newaxis]
+        r_top = r[:, 3, np.newaxis, np.newaxis]
+        w_bottom = eta_m * r_bottom
+        w_top = eta_p * r_top
+
+        sin_b, cos_b = np.sin(theta_bottom), np.cos(theta_bottom)
+        sin_t, cos_t = np.sin(theta_top), np.cos(theta_top)
+
+        dx_dxi = w_bottom * cos_b * dtheta_bottom + \
+            w_top * cos_t * dtheta_top
+        dy_dxi = -(w_bottom * sin_b * dtheta_bottom +
+                   w_top * sin_t * dtheta_top)
+        dx_deta = (r_top * sin_t - r_bottom * sin_b) / 2
+        dy_deta = (r_top * cos_t - r_bottom * cos_b) / 2
+
+        _det = dx_dxi * dy_deta - dx_deta * dy_dxi
+        det[start:stop] = _det
+        dxi_dx[start:stop] = dy_deta / _det
+        dxi_dy[start:stop] = -dx_deta / _det
+        deta_dx[start:stop] = -dy_dxi / _det
+        deta_dy[start:stop] = dx_dxi / _det
+
+    return result
+
+
+def inverse_map_spheroid(x, y, nodes, tolerance=1e-12, maxiter=20,
+                         return_converged=False):
+    """
+    Reference coordinates of points in the physical domain of spheroidal
+    elements, the inverse of map_spheroid, vectorized over all points.
+
+    The initial guess inverts the mapping in polar coordinates, which is
+    exact for elements with radial sides, followed by batched Newton
+    iterations on the points that have not converged.
+
+    :param x: x coordinates of the points, shape (npoints,)
+    :type x: numpy array
+    :param y: y coordinates of the points, shape (npoints,)
+    :type y: numpy array
+    :param nodes: control nodes of the element containing each point, shape
+        (npoints, 4, 2)
+    :type nodes: numpy array
+    :param tolerance: convergence criterion for the update of the reference
+        coordinates
+    :type tolerance: float
+    :param maxiter: maximum number of Newton iterations
+    :type maxiter: integer
+    :param return_converged: additionally return which points converged
+        within maxiter iterations to finite reference coordinates
+    :type return_converged: bool
+
+    :returns: tuple of two numpy arrays of shape (npoints,) containing xi
+        and eta, and the boolean convergence mask if return_converged
+    """
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    nodes = np.asarray(nodes, dtype=np.float64)
+
+    r_node = np.sqrt((nodes ** 2).sum(axis=-1))
+    theta = np.arctan2(nodes[..., 0], nodes[..., 1])
+    r0, r3 = r_node[:, 0], r_node[:, 3]
+    t0, t1, t2, t3 = theta.T
+
+    # initial guess from the polar coordinates
+    r = np.sqrt(x ** 2 + y ** 2)
+    t = np.arctan2(x, y)
+    dt = (t1 + t2) - (t0 + t3)
+    xi = np.where(dt != 0., (4 * t - (t0 + t3) - (t1 + t2)) /
+                  np.where(dt != 0., dt, 1.), 0.)
+    eta = (2 * r - r0 - r3) / (r3 - r0)
+
+    active = np.arange(x.size)
+    for _ in np.arange(maxiter):
+        if active.size == 0:
+            break
+        a = active
+        _xi, _eta = xi[a], eta[a]
+        tb = ((1 - _xi) * t0[a] + (1 + _xi) * t1[a]) / 2
+        tt = ((1 - _xi) * t3[a] + (1 + _xi) * t2[a]) / 2
+        wb = (1 - _eta) / 2 * r0[a]
+        wt = (1 + _eta) / 2 * r3[a]
+
+        # residual and jacobian of the forward mapping
+        fx = wb * np.sin(tb) + wt * np.sin(tt) - x[a]
+        fy = wb * np.cos(tb) + wt * np.cos(tt) - y[a]
+        dx_dxi = (wb * np.cos(tb) * (t1[a] - t0[a]) +
+                  wt * np.cos(tt) * (t2[a] - t3[a])) / 2
+        dy_dxi = -(wb * np.sin(tb) * (t1[a] - t0[a]) +
+                   wt * np.sin(tt) * (t2[a] - t3[a])) / 2
+        dx_deta = (r3[a] * np.sin(tt) - r0[a] * np.sin(tb)) / 2
+        dy_deta = (r3[a] * np.cos(tt) - r0[a] * np.cos(tb)) / 2
+
+        det = dx_dxi * dy_deta - dx_deta * dy_dxi
+        dxi = (fx * dy_deta - fy * dx_deta) / det
+        deta = (fy * dx_dxi - fx * dy_dxi) / det
+
+        xi[a] -= dxi
+        eta[a] -= deta
+        active = a[np.maximum(np.abs(dxi), np.abs(deta)) > tolerance]
+
+    if not return_converged:
+        return xi, eta
+
+    converged = np.isfinite(xi) & np.isfinite(eta)
+    converged[active] = False
+    return xi, eta, converged
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Skeleton meshes for isig databases.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .mesh_cache import get_mesh_cache_key
+
+
+def create_mesh(mod, period, elements_per_wavelength=2., max_depth=100.,
+                min_dist=0., max_dist=180.):
+    """
+    Create the skeleton mesh of the region between the surface and the
+    maximum source depth. The deep part of the domain is covered with a
+    single coarse layer.
+
+    :param mod: pymesher 1D model
+    :param period: shortest period to resolve in seconds
+    :type period: float
+    :param elements_per_wavelength: number of elements per wavelength
+    :type elements_per_wavelength: float
+    :param max_depth: maximum source depth in km
+    :type max_depth: float
+    :param min_dist: minimum epicentral distance in degrees
+    :type min_dist: float
+    :param max_dist: maximum epicentral distance in degrees
+    :type max_dist: float
+
+    :returns: tuple of the points, shape (npoints, 2), and the connectivity,
+        shape (nelem, 4)
+    """
+    from pymesher.skeleton import Skeleton
+
+    max_depth = 1e3 * max_depth
+
+    discontinuities = mod.discontinuities
+    hmax = mod.get_edgelengths(
+        dominant_period=period,
+        elements_per_wavelength=elements_per_wavelength)
+
+    # adapt discontinuities and hmax for min_radius
+    idx = discontinuities > 1. - max_depth / mod.scale
+    ndisc = idx.sum() + 2
+
+    discontinuities_new = np.zeros(ndisc)
+    discontinuities_new[1] = 1. - max_depth / mod.scale
+    discontinuities_new[-ndisc+2:] = discontinuities[idx]
+    discontinuities = discontinuities_new
+
+    hmax_new = np.ones(ndisc-1)
+    hmax_new[-ndisc+2:] = hmax[-ndisc+2:]
+    hmax = hmax_new
+
+    sk = Skeleton.create_spherical_nonconforming_mesh(
+        discontinuities, hmax, 2,
+        refinement_factor=2,
+        max_colat=max_dist,
+        min_colat=min_dist,
+        full_sphere=False)
+
+    m = sk.get_unstructured_mesh()
+
+    return m.points, m.connectivity
+
+
+def get_mesh(mod, model_file, period, elements_per_wavelength=2.,
+             max_depth=100., min_dist=0., max_dist=180., cache=None):
+    """
+    Create the skeleton mesh or load it from the cache.
+
+    :param mod: pymesher 1D model
+    :param model_file: path to the model file used for the cache key
+    :type model_file: string
+    :param cache: mesh cache, None to always create the mesh
+    :type cache: mesh_cache.MeshCache
+
+    See create_mesh for the other parameters.
+
+    :returns: tuple of the points and the connectivity, memory-mapped
+        arrays if loaded from the cache
+    """
+    if cache is None:
+        return create_mesh(mod, period, elements_per_wavelength, max_depth,
+                           min_dist, max_dist)
+
+    key = get_mesh_cache_key(model_file, period, elements_per_wavelength,
+                             max_depth, min_dist, max_dist)
+    mesh = cache.get(key)
+    if mesh is None:
+        mesh = create_mesh(mod, period, elements_per_wavelength, max_depth,
+                           min_dist, max_dist)
+        if not cache.read_only:
+            cache.put(key, *mesh)
+            mesh = cache.get(key)
+
+    return mesh
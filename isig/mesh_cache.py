@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+On-disk cache of skeleton meshes.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# increase if the meshing changes, invalidates all cached meshes
+MESH_CACHE_VERSION = 1
+
+# default maximum size of the cache in bytes
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+
+
+def get_mesh_cache_key(model_file, period, elements_per_wavelength,
+                       max_depth, min_dist, max_dist):
+    """
+    Content-addressed key of a skeleton mesh: hash of the model file content
+    and the meshing parameters.
+
+    :param model_file: path to the model file
+    :type model_file: string
+
+    See mesh.create_mesh for the other parameters.
+
+    :returns: hex digest string
+    """
+    h = hashlib.sha256()
+    with open(model_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b''):
+            h.update(block)
+
+    params = (MESH_CACHE_VERSION, period, elements_per_wavelength, max_depth,
+              min_dist, max_dist)
+    h.update(repr(tuple(float(p) for p in params)).encode('ascii'))
+
+    return h.hexdigest()
+
+
+class MeshCache(object):
+    """
+    Directory of cached meshes with size bounded least recently used
+    eviction.
+
+    Each mesh is stored in a subdirectory named by its key, containing the
+    points and the connectivity as .npy files that are memory-mapped when
+    loaded. The modification time of the subdirectory marks the last use.
+
+    :param directory: cache directory, created if it does not exist
+    :type directory: string
+    :param max_size: maximum size of the cache in bytes
+    :type max_size: integer
+    :param read_only: only look up meshes, neither create the directory nor
+        add meshes or mark their use
+    :type read_only: bool
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE,
+                 read_only=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.read_only = read_only
+        if not read_only and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _entries(self):
+        """
+        list of (last use, size, key) of all cached meshes
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self._path(key)
+            if key.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f))
+                       for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, key))
+        return entries
+
+    def __contains__(self, key):
+        return os.path.isdir(self._path(key))
+
+    @property
+    def size(self):
+        """
+        total size of the cached meshes in bytes
+        """
+        return sum(e[1] for e in self._entries())
+
+    def get(self, key):
+        """
+        Load a mesh from the cache.
+
+        :returns: tuple of memory-mapped points and connectivity or None if
+            the key is not in the cache
+        """
+        path = self._path(key)
+        if key not in self:
+            return None
+
+        if not self.read_only:
+            os.utime(path, None)
+        return (np.load(os.path.join(path, 'points.npy'), mmap_mode='r'),
+                np.load(os.path.join(path, 'connectivity.npy'),
+                        mmap_mode='r'))
+
+    def put(self, key, points, connectivity):
+        """
+        Add a mesh to the cache and evict least recently used meshes if the
+        cache exceeds its maximum size. The mesh is written to a temporary
+        directory first, so concurrent readers never see partial entries.
+        Does nothing for a read-only cache.
+        """
+        if self.read_only:
+            return
+
+        tmp = tempfile.mkdtemp(prefix='.tmp_', dir=self.directory)
+        np.save(os.path.join(tmp, 'points.npy'), np.asarray(points))
+        np.save(os.path.join(tmp, 'connectivity.npy'),
+                np.asarray(connectivity))
+
+        try:
+            os.rename(tmp, self._path(key))
+        except OSError:
+            # another process added the same mesh in the meantime
+            shutil.rmtree(tmp)
+
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used meshes until the cache fits into its
+        maximum size.
+
+        :param keep: key that is not evicted
+        :type keep: string
+        """
+        entries = sorted(self._entries())
+        size = sum(e[1] for e in entries)
+        for _, s, key in entries:
+            if size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            size -= s
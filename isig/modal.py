@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Modal storage of MergedSnapshots.
+
+The nodal values u(eta_j, xi_i) of each element are transformed to the
+coefficients c(l, k) of the tensor product Legendre basis P_l(eta) P_k(xi).
+Smooth elements have small high degree coefficients, which are set to zero
+down to a tolerance relative to the amplitude of each variable in the
+element, the number of degrees kept per element is stored in modal_order.
+The zeros are only removed from the file by a compression filter, so modal
+storage requires compression.
+
+Readers reconstruct the nodal values with one (npol ** 2, npol ** 2)
+matrix product, see ModalSnapshots.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .basis_polynomials import legendre_vandermonde
+
+MODAL_ORDER_VARIABLE = 'modal_order'
+
+
+def get_modal_matrices(gll):
+    """
+    Matrices transforming the nodal values of an element to the modal
+    coefficients and back, acting on the flattened (jpol, ipol) axes.
+
+    :param gll: GLL points, shape (npol,)
+    :type gll: numpy array
+
+    :returns: tuple of the forward and the inverse matrix, shape
+        (npol ** 2, npol ** 2)
+    """
+    v = legendre_vandermonde(gll)
+    inverse = np.kron(v, v)
+    return np.linalg.inv(inverse), inverse
+
+
+def get_amplification(gll):
+    """
+    Bound of the nodal error relative to the nodal amplitude of a variable
+    per coefficient error relative to the coefficient amplitude, the
+    condition number of the transform in the maximum norm. Errors of the
+    stored coefficients, e.g. from quantization, grow by up to this factor
+    when the nodal values are reconstructed (87 for npol = 5).
+
+    :param gll: GLL points, shape (npol,)
+    :type gll: numpy array
+    """
+    forward, inverse = get_modal_matrices(gll)
+    return float(np.abs(forward).sum(axis=1).max() *
+                 np.abs(inverse).sum(axis=1).max())
+
+
+def _transform(matrix, data):
+    # apply to the (jpol, ipol) axes of (nelem, nvars, jpol, ipol, npts)
+    data = np.asarray(data)
+    shape = data.shape
+    npol2 = matrix.shape[0]
+    dtype = np.result_type(data.dtype, np.float32)
+    out = np.matmul(matrix.astype(dtype),
+                    data.reshape(shape[:-3] + (npol2, shape[-1])))
+    return out.reshape(shape)
+
+
+def to_modal(data, gll):
+    """
+    Legendre coefficients of nodal element data.
+
+    :param data: nodal values, shape (nelem, nvars, npol, npol, npts)
+    :type data: numpy array
+    :param gll: GLL points, shape (npol,)
+    :type gll: numpy array
+
+    :returns: coefficients c(l, k) in place of the nodal values (j, i)
+    """
+    return _transform(get_modal_matrices(gll)[0], data)
+
+
+def to_nodal(coefficients, gll):
+    """
+    Nodal values from Legendre coefficients, inverse of to_modal.
+    """
+    return _transform(get_modal_matrices(gll)[1], coefficients)
+
+
+def _degree(npol):
+    # degree max(l, k) of each tensor product mode
+    return np.maximum.outer(np.arange(npol), np.arange(npol))
+
+
+def get_modal_order(coefficients, tolerance, amplitude=None):
+    """
+    Number of degrees to keep per element. The nodal error of dropping all
+    modes of degree max(l, k) >= order is at most the sum of their absolute
+    coefficients, as the Legendre polynomials are bounded by one. The order
+    is the smallest one keeping this sum below tolerance times the
+    amplitude of each variable in the element for all snapshots, so small
+    variables keep their relative accuracy next to large ones.
+
+    :param coefficients: shape (nelem, nvars, npol, npol, npts)
+    :type coefficients: numpy array
+    :param tolerance: error relative to the variable amplitude
+    :type tolerance: float
+    :param amplitude: maximum absolute nodal value per element and variable,
+        shape (nelem, nvars), defaults to the maximum absolute coefficient
+    :type amplitude: numpy array
+
+    :returns: integer numpy array of shape (nelem,), 0 to npol
+    """
+    nelem, nvars, npol = coefficients.shape[:3]
+    a = np.abs(coefficients)
+    if amplitude is None:
+        amplitude = a.reshape((nelem, nvars, -1)).max(axis=2)
+
+    degree = _degree(npol)
+    # sum over the modes of each degree, (nelem, nvars, npts, npol)
+    per_degree = np.stack([a[:, :, degree == d].sum(axis=2)
+                           for d in np.arange(npol)], axis=-1)
+    # error of truncating at order p, p = 0 .. npol
+    tail = np.cumsum(per_degree[..., ::-1], axis=-1)[..., ::-1]
+    tail = np.concatenate([tail, np.zeros(tail.shape[:-1] + (1, ))],
+                          axis=-1)
+    tail = tail.max(axis=2)
+
+    ok = tail <= tolerance * np.asarray(amplitude)[:, :, np.newaxis]
+    return ok.all(axis=1).argmax(axis=1)
+
+
+def truncate(coefficients, order):
+    """
+    Set the coefficients of degree >= order of each element to zero.
+
+    :returns: truncated copy of the coefficients
+    """
+    npol = coefficients.shape[2]
+    keep = _degree(npol)[np.newaxis] < np.asarray(order)[:, np.newaxis,
+                                                         np.newaxis]
+    return coefficients * keep[:, np.newaxis, :, :, np.newaxis]
+
+
+def to_truncated_modal(data, gll, tolerance):
+    """
+    Transform nodal element data to Legendre coefficients truncated at
+    tolerance relative to the amplitude of each variable in each element,
+    see get_modal_order.
+
+    :returns: tuple of the coefficients and the order of each element
+    """
+    # in double precision to keep the rounding below the error bound
+    data = np.asarray(data, dtype=np.float64)
+    coefficients = to_modal(data, gll)
+    amplitude = np.abs(data).reshape(data.shape[:2] + (-1, )).max(axis=2)
+    order = get_modal_order(coefficients, tolerance, amplitude)
+    return truncate(coefficients, order), order
+
+
+class ModalSnapshots(object):
+    """
+    array-like view of modal MergedSnapshots reconstructing the nodal values
+    on read, in double precision to not add to the error bound. Supports
+    indexing along the elements with an integer or a slice.
+
+    :param snapshots: stored coefficients, shape (nelem, nvars, npol, npol,
+        npts)
+    :type snapshots: array-like
+    :param gll: GLL points, shape (npol,)
+    :type gll: numpy array
+    """
+
+    def __init__(self, snapshots, gll):
+        self.snapshots = snapshots
+        self.shape = snapshots.shape
+        self.dtype = np.dtype(np.float32)
+        self.chunks = getattr(snapshots, 'chunks', None)
+        self.matrix = get_modal_matrices(gll)[1]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        data = np.asarray(self.snapshots[index], dtype=np.float64)
+        return _transform(self.matrix, data).astype(np.float32)
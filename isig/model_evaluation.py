@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Evaluation of 1D models on the GLL points using a radial lookup table.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from collections import OrderedDict
+
+import numpy as np
+
+# model parameters and the corresponding variable names in the Mesh group
+PARAMETER_VARIABLES = OrderedDict([
+    ('VP', 'mesh_vp'),
+    ('VS', 'mesh_vs'),
+    ('RHO', 'mesh_rho'),
+    ('LAMBDA', 'mesh_lambda'),
+    ('MU', 'mesh_mu'),
+    ('XI', 'mesh_xi'),
+    ('PHI', 'mesh_phi'),
+    ('ETA', 'mesh_eta'),
+    ('QMU', 'mesh_Qmu'),
+    ('QKAPPA', 'mesh_Qka')])
+
+# number of bits reserved for the radius in the combined lookup key
+_RADIUS_BITS = 48
+
+
+class RadialLookupTable(object):
+    """
+    Lookup table for 1D models.
+
+    In a 1D model the parameters only depend on the radius and the layer the
+    element is in, which is determined by the radius of the element centroid.
+    The model is evaluated only once for each unique pair of (radius, layer)
+    and the results are kept in a table that grows with each call, so chunks
+    of elements processed one after the other share the evaluations.
+
+    :param model: pymesher 1D model
+    :param parameters: names of the parameters to evaluate, see
+        PARAMETER_VARIABLES
+    :type parameters: list of strings
+    :param tolerance: non-dimensional radius difference below which points
+        share the model values
+    :type tolerance: float
+    """
+
+    def __init__(self, model, parameters=('MU',), tolerance=1e-10):
+        for p in parameters:
+            if p not in PARAMETER_VARIABLES:
+                raise ValueError('unknown model parameter %s, choose from %s'
+                                 % (p, ', '.join(PARAMETER_VARIABLES)))
+
+        self.model = model
+        self.parameters = list(parameters)
+        self.tolerance = tolerance
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros((len(self.parameters), 0))
+        self.nevaluations = 0
+
+    def _get_keys(self, r, element_centroid):
+        layer = np.searchsorted(self.model.discontinuities,
+                                element_centroid).astype(np.int64)
+        rkey = np.round(r / self.tolerance).astype(np.int64)
+        if rkey.size and rkey.max() >= 2 ** _RADIUS_BITS:
+            raise ValueError('tolerance too small for the radius range')
+        return (layer << _RADIUS_BITS) + rkey
+
+    def __call__(self, r, element_centroid):
+        """
+        Evaluate the model parameters.
+
+        :param r: non-dimensional radius of the points
+        :type r: numpy array
+        :param element_centroid: non-dimensional radius of the centroids of
+            the elements the points belong to, same shape as r
+        :type element_centroid: numpy array
+
+        :returns: OrderedDict of the parameter names and numpy arrays with
+            the same shape as r
+        """
+        return self.lookup(self.prepare(r, element_centroid))
+
+    def prepare(self, r, element_centroid):
+        """
+        Compute the unique keys of the points, the part of __call__ that
+        does not depend on the table. Can run concurrently in several
+        threads, the result is passed to lookup.
+        """
+        r = np.asarray(r, dtype=np.float64)
+        element_centroid = np.broadcast_to(element_centroid, r.shape)
+
+        keys = self._get_keys(r.ravel(), element_centroid.ravel())
+        unique_keys, unique_index, inverse = np.unique(
+            keys, return_index=True, return_inverse=True)
+        return (r, element_centroid, unique_keys, unique_index,
+                inverse.ravel())
+
+    def lookup(self, prepared):
+        """
+        Look up the values of points prepared with prepare, evaluating the
+        model for keys that are not in the table yet. Updates the table, so
+        calls must not run concurrently. Calling it in the same order of the
+        points gives the same results independent of how the preparation was
+        scheduled.
+        """
+        r, element_centroid, unique_keys, unique_index, inverse = prepared
+
+        # evaluate the model for keys that are not in the table yet
+        pos = np.searchsorted(self.keys, unique_keys)
+        known = pos < self.keys.size
+        known[known] = self.keys[pos[known]] == unique_keys[known]
+        if not known.all():
+            idx = unique_index[~known]
+            new_values = np.array([
+                self.model.get_elastic_parameter(
+                    p, r.ravel()[idx], element_centroid.ravel()[idx])
+                for p in self.parameters]).reshape((-1, idx.size))
+            self.nevaluations += idx.size
+
+            keys_all = np.concatenate([self.keys, unique_keys[~known]])
+            values_all = np.concatenate([self.values, new_values], axis=1)
+            order = np.argsort(keys_all, kind='mergesort')
+            self.keys = keys_all[order]
+            self.values = values_all[:, order]
+            pos = np.searchsorted(self.keys, unique_keys)
+
+        values = self.values[:, pos[inverse]]
+        return OrderedDict(
+            (p, v.reshape(r.shape)) for p, v in zip(self.parameters, values))
+
+
+def evaluate_model(model, r, element_centroid, parameters=('MU',),
+                   tolerance=1e-10):
+    """
+    Evaluate parameters of a 1D model evaluating the model only once for each
+    unique pair of (radius, layer).
+
+    :param model: pymesher 1D model
+    :param r: non-dimensional radius of the points
+    :type r: numpy array
+    :param element_centroid: non-dimensional radius of the centroids of the
+        elements the points belong to, same shape as r
+    :type element_centroid: numpy array
+    :param parameters: names of the parameters to evaluate, see
+        PARAMETER_VARIABLES
+    :type parameters: list of strings
+    :param tolerance: non-dimensional radius difference below which points
+        share the model values
+    :type tolerance: float
+
+    :returns: OrderedDict of the parameter names and numpy arrays with the
+        same shape as r
+    """
+    return RadialLookupTable(model, parameters, tolerance)(r, element_centroid)
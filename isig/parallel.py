@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Ordered parallel map on a thread pool.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+def get_window(nthreads):
+    """
+    number of tasks in flight for ordered_map, bounds the memory used
+    """
+    return 2 * nthreads if nthreads > 1 else 1
+
+
+def ordered_map(func, iterable, nthreads=1):
+    """
+    Generator applying func to the items of iterable on a pool of threads,
+    yielding the results in the order of the items. At most get_window tasks
+    are in flight, so the memory is bounded even if the consumer is slower
+    than the workers. Runs in the calling thread if nthreads is 1.
+
+    NumPy releases the GIL in most array operations, so threads give a
+    speedup without copying the inputs to other processes.
+
+    :param func: function of one argument
+    :param iterable: arguments
+    :param nthreads: number of threads
+    :type nthreads: integer
+    """
+    if nthreads <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    pool = ThreadPool(nthreads)
+    try:
+        pending = deque()
+        for item in iterable:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= get_window(nthreads):
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
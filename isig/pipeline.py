@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Database generation pipeline shared by the command line tools.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .instrumentation import Instrumentation
+from .mesh import get_mesh
+from .mesh_cache import MeshCache
+from .model_evaluation import PARAMETER_VARIABLES
+from .plan import plan_database
+from .create_db import (create_db, get_snapshot_chunks,
+                        get_read_amplification)
+from .quantization import QUANTIZATIONS, get_storage_ratio
+from .sampling import get_sampling
+from .shards import SHARD_BY, create_sharded_db
+
+
+def fix_negative_arguments(argv):
+    """
+    handle negative digits in the arguments which could be misinterpreted as
+    options otherwise. See http://stackoverflow.com/a/21446783
+    """
+    for i, arg in enumerate(argv):
+        if (arg[0] == '-') and arg[1].isdigit():
+            argv[i] = ' ' + arg
+
+
+def add_database_arguments(parser):
+    """
+    Add the arguments controlling the database content and layout to an
+    argparse parser.
+    """
+    parser.add_argument('-dt', type=float, default=1., help='Sample rate.')
+
+    parser.add_argument('-npts', type=int, default=3600,
+                        help='Number of time samples.')
+
+    parser.add_argument(
+        '--auto_sampling', dest='auto_sampling', action='store_true',
+        default=False,
+        help='Derive dt and npts from the period, the maximum distance and '
+             'the slowest velocity of the model instead of -dt and -npts.')
+
+    parser.add_argument(
+        '-e', '--elements_per_wavelength', type=float, default=2.,
+        help='Number of Elements per Wavelength.')
+
+    parser.add_argument(
+        '-n', '--npol', type=int, default=5,
+        help='Polynomial order used for interpolation + 1.')
+
+    parser.add_argument(
+        '--unique_points', dest='unique_points', action='store_true',
+        default=False,
+        help='Merge coincident GLL points of neighbouring elements.')
+
+    parser.add_argument(
+        '--memory_budget', type=float, default=256.,
+        help='Memory used for processing chunks of elements in MB.')
+
+    parser.add_argument(
+        '--chunk_elements', type=int, default=0,
+        help='Number of elements per MergedSnapshots chunk, 0 for '
+             'automatic.')
+
+    parser.add_argument(
+        '--chunk_snapshots', type=int, default=0,
+        help='Number of snapshots per MergedSnapshots chunk, 0 for all.')
+
+    parser.add_argument(
+        '--compression', type=str, default='none',
+        choices=['none', 'gzip', 'lzf', 'szip'],
+        help='Compression filter for MergedSnapshots.')
+
+    parser.add_argument(
+        '--compression_level', type=int, default=None,
+        help='Parameter of the compression filter, e.g. the gzip level.')
+
+    parser.add_argument(
+        '--shuffle', dest='shuffle', action='store_true', default=False,
+        help='Apply the shuffle filter before compression.')
+
+    parser.add_argument(
+        '--model_parameters', type=str, nargs='+', default=['MU'],
+        choices=list(PARAMETER_VARIABLES),
+        help='Model parameters to store in the mesh group.')
+
+    parser.add_argument(
+        '--element_order', type=str, default='mesh',
+        choices=['mesh', 'hilbert', 'morton'],
+        help='Order of the elements in the database: as created by the '
+             'mesher or along a space filling curve over the midpoints.')
+
+    parser.add_argument(
+        '--spatial_index', dest='spatial_index', action='store_true',
+        default=False,
+        help='Store a spatial index for locating points in the mesh.')
+
+    parser.add_argument(
+        '--jacobian', dest='jacobian', action='store_true', default=False,
+        help='Store the Jacobian and inverse Jacobian of the mapping at each '
+             'GLL point, requires duplicate points.')
+
+    parser.add_argument(
+        '--quantization', type=str, default='none',
+        choices=['none'] + list(QUANTIZATIONS),
+        help='Lossy encoding of MergedSnapshots with a scale and offset per '
+             'element and variable.')
+
+    parser.add_argument(
+        '--max_error', type=float, default=None,
+        help='Bound of the storage error relative to the maximum '
+             'amplitude per element and variable, selects the smallest '
+             'quantization within the bound.')
+
+    parser.add_argument(
+        '--modal_tolerance', type=float, default=None,
+        help='Store MergedSnapshots as Legendre coefficients, dropping high '
+             'degree modes per element up to this error relative to the '
+             'amplitude of each variable. Requires compression.')
+
+    parser.add_argument(
+        '--nthreads', type=int, default=1,
+        help='Number of threads mapping the mesh and evaluating the model, '
+             'the database does not depend on it.')
+
+    parser.add_argument(
+        '--nshards', type=int, default=1,
+        help='Number of shard files, more than one writes the database as '
+             'shards and a master file with virtual datasets.')
+
+    parser.add_argument(
+        '--shard_by', type=str, default='elements', choices=SHARD_BY,
+        help='Split the shards by ranges of elements or colatitude bands.')
+
+    parser.add_argument(
+        '--cache_dir', type=str, default=None,
+        help='Directory to cache skeleton meshes in, no caching if not '
+             'given.')
+
+    parser.add_argument(
+        '--cache_size', type=float, default=10.,
+        help='Maximum size of the mesh cache in GB.')
+
+
+def get_database_kwargs(args):
+    """
+    Keyword arguments for create_db from the parsed database arguments.
+    """
+    return {
+        'npol': args.npol,
+        'dt': args.dt,
+        'npts': args.npts,
+        'auto_sampling': args.auto_sampling,
+        'unique_points': args.unique_points,
+        'memory_budget': int(args.memory_budget * 1024 ** 2),
+        # the chunks follow the number of samples, resolved together with it
+        # in generate_database, see resolve_sampling
+        'chunk_elements': args.chunk_elements,
+        'chunk_snapshots': args.chunk_snapshots,
+        'compression': (None if args.compression == 'none' else
+                        args.compression),
+        'compression_opts': args.compression_level,
+        'shuffle': args.shuffle,
+        'model_parameters': args.model_parameters,
+        'element_order': (None if args.element_order == 'mesh' else
+                          args.element_order),
+        'spatial_index': args.spatial_index,
+        'jacobian': args.jacobian,
+        'quantization': (None if args.quantization == 'none' else
+                         args.quantization),
+        'max_error': args.max_error,
+        'modal_tolerance': args.modal_tolerance,
+        'nthreads': args.nthreads,
+        'nshards': args.nshards,
+        'shard_by': args.shard_by}
+
+
+def get_mesh_cache(args, read_only=False):
+    """
+    Mesh cache from the parsed database arguments, None if not requested.
+
+    :param read_only: only look up cached meshes, e.g. for a plan that must
+        not write any file
+    :type read_only: bool
+    """
+    if args.cache_dir is None:
+        return None
+    return MeshCache(args.cache_dir,
+                     max_size=int(args.cache_size * 1024 ** 3),
+                     read_only=read_only)
+
+
+def validate_parameters(max_depth, min_dist, max_dist):
+    """
+    consistency checks of the meshing parameters
+    """
+    if min_dist < 0:
+        raise ValueError('min_dist < 0')
+    if max_dist < 0:
+        raise ValueError('max_dist < 0')
+    if max_depth < 0:
+        raise ValueError('depth < 0')
+
+
+def resolve_sampling(mod, period, max_dist, kwargs, auto_sampling=False,
+                     chunk_elements=None, chunk_snapshots=None):
+    """
+    Set the sampling and the chunks in the create_db keyword arguments.
+
+    The explicit chunks are computed for the number of samples of the
+    database, so after the sampling is derived from the period.
+
+    :param kwargs: keyword arguments for create_db, updated in place
+    :type kwargs: dict
+    :param auto_sampling: replace dt and npts by the sampling derived from
+        the period, see sampling.get_sampling
+    :type auto_sampling: bool
+    :param chunk_elements: number of elements per chunk, automatic chunks if
+        neither this nor chunk_snapshots is given
+    :type chunk_elements: integer
+    :param chunk_snapshots: number of snapshots per chunk
+    :type chunk_snapshots: integer
+    """
+    if auto_sampling:
+        kwargs['dt'], kwargs['npts'] = get_sampling(mod, period, max_dist)
+    if chunk_elements or chunk_snapshots:
+        kwargs['chunks'] = get_snapshot_chunks(
+            kwargs.get('npol', 5), kwargs.get('npts', 1000),
+            chunk_elements=chunk_elements, chunk_snapshots=chunk_snapshots)
+
+
+def generate_database(mod, model_file, filename, period=50., max_depth=100.,
+                      min_dist=0., max_dist=180., elements_per_wavelength=2.,
+                      cache=None, auto_sampling=False, chunk_elements=None,
+                      chunk_snapshots=None, nshards=1, shard_by='elements',
+                      instrumentation=None, **kwargs):
+    """
+    Create the skeleton mesh (or load it from the cache) and write the
+    database.
+
+    :param mod: pymesher 1D model
+    :param model_file: path to the model file, used for the mesh cache key
+    :type model_file: string
+    :param filename: filename of the database
+    :type filename: string
+    :param cache: mesh cache, None to always create the mesh
+    :type cache: mesh_cache.MeshCache
+    :param auto_sampling: replace dt and npts by the sampling derived from
+        the period, see sampling.get_sampling
+    :type auto_sampling: bool
+    :param chunk_elements: number of elements per MergedSnapshots chunk,
+        see resolve_sampling
+    :type chunk_elements: integer
+    :param chunk_snapshots: number of snapshots per chunk
+    :type chunk_snapshots: integer
+    :param nshards: number of shard files, see shards.create_sharded_db,
+        1 for a single file
+    :type nshards: integer
+    :param shard_by: 'elements' or 'colatitude'
+    :type shard_by: string
+    :param instrumentation: collects stage timings, peak memory and the
+        bytes written per variable
+    :type instrumentation: instrumentation.Instrumentation
+
+    See mesh.create_mesh for the meshing parameters, other keyword arguments
+    are passed to create_db.
+
+    :returns: dictionary with the parameters and the properties of the
+        database, see get_summary
+    """
+    validate_parameters(max_depth, min_dist, max_dist)
+    instr = instrumentation or Instrumentation(enabled=False)
+    resolve_sampling(mod, period, max_dist, kwargs, auto_sampling,
+                     chunk_elements, chunk_snapshots)
+
+    with instr.stage('meshing'):
+        points, connectivity = get_mesh(
+            mod, model_file, period,
+            elements_per_wavelength=elements_per_wavelength,
+            max_depth=max_depth, min_dist=min_dist, max_dist=max_dist,
+            cache=cache)
+
+    info = dict(kwargs)
+    if nshards > 1:
+        info.update(create_sharded_db(
+            filename, mod, points, connectivity, nshards=nshards,
+            shard_by=shard_by, instrumentation=instr, **kwargs))
+    else:
+        info.update(create_db(filename, mod, points, connectivity,
+                              instrumentation=instr, **kwargs))
+    info.update({
+        'filename': filename,
+        'auto_sampling': auto_sampling,
+        'nshards': nshards,
+        'model_name': mod.name,
+        'period': period,
+        'elements_per_wavelength': elements_per_wavelength,
+        'max_depth': max_depth,
+        'min_dist': min_dist,
+        'max_dist': max_dist})
+    info.setdefault('npol', 5)
+    info.setdefault('dt', 0.1)
+    info.setdefault('npts', 1000)
+
+    return info
+
+
+def generate_plan(mod, model_file, period=50., max_depth=100., min_dist=0.,
+                  max_dist=180., elements_per_wavelength=2., cache=None,
+                  auto_sampling=False, chunk_elements=None,
+                  chunk_snapshots=None, nshards=1, shard_by='elements',
+                  **kwargs):
+    """
+    Create the skeleton mesh (or load it from the cache) and estimate the
+    properties of the database without writing it.
+
+    Takes the same arguments as generate_database except the filename, the
+    estimates are for a single file. Pass a read-only cache to not write
+    any file, see mesh_cache.MeshCache.
+
+    :returns: plan, see plan.plan_database
+    """
+    validate_parameters(max_depth, min_dist, max_dist)
+    resolve_sampling(mod, period, max_dist, kwargs, auto_sampling,
+                     chunk_elements, chunk_snapshots)
+
+    points, connectivity = get_mesh(
+        mod, model_file, period,
+        elements_per_wavelength=elements_per_wavelength,
+        max_depth=max_depth, min_dist=min_dist, max_dist=max_dist,
+        cache=cache)
+
+    return plan_database(mod, points, connectivity, period=period, **kwargs)
+
+
+def get_storage(info):
+    """
+    uncompressed size of MergedSnapshots in GB
+    """
+    return (info['nelem'] * info['npol'] ** 2 * info['npts'] * 5 * 4. /
+            1024. ** 3)
+
+
+def get_summary(info):
+    """
+    Human readable summary of a database generated with generate_database.
+    """
+    chunks = info['snapshot_chunks']
+    # bytes per stored value
+    itemsize = np.dtype(QUANTIZATIONS[info['quantization']]).itemsize \
+        if info.get('quantization') else 4
+    shape = (info['nelem'], 5, info['npol'], info['npol'], info['npts'])
+    compression = info.get('compression') or 'none'
+    if info.get('shuffle'):
+        compression += ' +shuffle'
+
+    summary = [
+        '=' * 78,
+        'SUMMARY OF MESH PROPERTIES:',
+        '',
+        '  model name                 | %9s' % (info['model_name'],),
+        '  period                     | %9.2f s' % (info['period'],),
+        '  elements per wavelength    | %9.2f' %
+        (info['elements_per_wavelength'],),
+        '',
+        '  time step dt               | %9.4f s' % (info['dt'],),
+        '  number of time samples     | %9d' % (info['npts'],),
+        '  number of elements         | %9d' % (info['nelem'],),
+        '  number of points           | %9d' % (info['npoints'],),
+        '  number of shards           | %9d' % (info.get('nshards', 1),),
+        '  estimated storage (uncomp) | %9.4f GB' % (get_storage(info),)]
+
+    if info.get('quantization'):
+        summary += [
+            '  quantization               | %9s' % (info['quantization'],),
+            '  quantized storage          | %9.4f GB' % (
+                get_storage(info) * get_storage_ratio(
+                    info['quantization'], info['npol'], info['npts']),)]
+    if info.get('modal_tolerance') is not None:
+        summary.append('  modal storage tolerance    | %9.2e' % (
+            info['modal_tolerance'],))
+    if info.get('max_error') is not None:
+        summary += [
+            '  relative error bound       | %9.2e' % (info['max_error'],),
+            '    (bound of the stored values, the achieved error is reported',
+            '    when the snapshots are ingested)']
+    summary.append('')
+
+    if chunks is None:
+        summary.append('  snapshot chunk shape       | contiguous')
+    else:
+        summary += [
+            '  snapshot chunk shape       | %s' % (
+                'x'.join(map(str, chunks)),),
+            '  snapshot chunk size        | %9.4f MB' % (
+                np.prod(chunks) * itemsize / 1024. ** 2,)]
+
+    summary += [
+        '  compression                | %9s' % (compression,),
+        '  read amplification         | %9.2f' % (
+            get_read_amplification(chunks, shape),),
+        '=' * 78]
+
+    return '\n'.join(summary)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Dry run planning of databases: sizes, memory and time estimates without
+writing any file.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from collections import OrderedDict
+import time
+import uuid
+
+import numpy as np
+
+from .quadrature import get_quadrature
+from .create_db import (DEFAULT_MEMORY_BUDGET, BYTES_PER_POINT,
+                        JACOBIAN_VARIABLES, get_chunk_size,
+                        get_snapshot_chunks,
+                        get_unique_numbering, element_chunks, map_chunk)
+from .model_evaluation import RadialLookupTable, PARAMETER_VARIABLES
+from .modal import MODAL_ORDER_VARIABLE, to_truncated_modal, to_nodal
+from .quantization import (SCALE_VARIABLE, OFFSET_VARIABLE, quantize,
+                           dequantize, get_relative_error, resolve_storage)
+from .spatial_index import SpatialIndex
+
+# approximate number of bytes per GLL point needed to compute the global
+# numbering: three integer keys, the sort order, group ids and the numbering
+NUMBERING_BYTES_PER_POINT = 64
+
+
+def _in_memory_file():
+    """
+    HDF5 file that lives in memory only
+    """
+    import h5py
+    return h5py.File('isig_plan_%s.h5' % uuid.uuid4().hex, 'w', driver='core',
+                     backing_store=False)
+
+
+def synthetic_snapshots(nelem, npol, npts, dt, period, seed=0):
+    """
+    Synthetic band-limited wavefield used to estimate the compression ratio
+    of MergedSnapshots: a sum of plane waves with periods longer than period
+    and random phases, smooth within each element.
+
+    :returns: float32 numpy array, shape (nelem, 5, npol, npol, npts)
+    """
+    rng = np.random.RandomState(seed)
+    gll = get_quadrature('gll', npol)[0]
+    t = np.arange(npts) * dt
+
+    nwave = 8
+    freq = rng.uniform(0.1, 1., nwave) / period
+    wavenumber = rng.uniform(-1., 1., (nwave, 2)) * np.pi / 4
+    amplitude = rng.lognormal(0., 1., (nelem, 5, nwave))
+    phase = rng.uniform(0., 2 * np.pi, (nelem, 5, nwave))
+
+    data = np.zeros((nelem, 5, npol, npol, npts), dtype=np.float32)
+    for k in np.arange(nwave):
+        spatial = (wavenumber[k, 0] * gll[:, np.newaxis] +
+                   wavenumber[k, 1] * gll[np.newaxis, :])
+        data += (amplitude[:, :, k, np.newaxis, np.newaxis, np.newaxis] *
+                 np.cos(2 * np.pi * freq[k] * t +
+                        spatial[..., np.newaxis] +
+                        phase[:, :, k, np.newaxis, np.newaxis, np.newaxis]))
+    return data
+
+
+def estimate_compression_ratio(data, chunks, compression=None,
+                               compression_opts=None, shuffle=False):
+    """
+    Ratio of stored to raw bytes of a sample block written with the given
+    chunks and filters through the HDF5 filter pipeline in memory.
+    """
+    if chunks is None:
+        return 1.
+    chunks = tuple(min(c, n) for c, n in zip(chunks, data.shape))
+    with _in_memory_file() as f:
+        d = f.create_dataset('data', data=data, chunks=chunks,
+                             compression=compression,
+                             compression_opts=compression_opts,
+                             shuffle=shuffle)
+        return float(d.id.get_storage_size()) / data.nbytes
+
+
+def plan_database(model, points, connectivity, npol=5, dt=0.1, npts=1000,
+                  unique_points=False, tolerance=1e-8,
+                  memory_budget=DEFAULT_MEMORY_BUDGET, chunks='auto',
+                  compression=None, compression_opts=None, shuffle=False,
+                  model_parameters=('MU',), element_order=None,
+                  spatial_index=False, jacobian=False, quantization=None,
+                  max_error=None, modal_tolerance=None, nthreads=1,
+                  period=None, nsample=2048, nsample_chunks=4):
+    """
+    Estimate the properties of the database create_db would write with the
+    same arguments, without writing any file.
+
+    The number of unique points is computed exactly. The size of
+    MergedSnapshots is estimated by writing a few chunks of a synthetic
+    band-limited wavefield through the chosen modal truncation,
+    quantization and filter pipeline in memory, which also gives the error
+    and the degrees kept per element.
+    The wall time is extrapolated from a calibration run on a sample of
+    nsample elements.
+
+    :param period: shortest period of the synthetic wavefield, defaults to
+        10 * dt
+    :type period: float
+    :param nsample: number of elements used for the time calibration
+    :type nsample: integer
+    :param nsample_chunks: number of MergedSnapshots chunks used to
+        estimate the compression ratio
+    :type nsample_chunks: integer
+
+    See create_db for the other parameters, the element order does not
+    affect the estimates. The calibration runs in one thread, so the wall
+    time is an upper bound for nthreads > 1.
+
+    :returns: OrderedDict with the plan, see get_plan_summary
+    """
+    gll = get_quadrature('gll', npol)[0]
+    nelem = connectivity.shape[0]
+    npol2 = npol ** 2
+    chunk_size = get_chunk_size(npol, memory_budget)
+    period = 10 * dt if period is None else period
+
+    # point counts and calibration of the global numbering
+    npoints_all = nelem * npol2
+    t_numbering = 0.
+    if unique_points:
+        t = time.time()
+        npoints = get_unique_numbering(
+            model, points, connectivity, npol, tolerance,
+            chunk_size, nthreads)[1].size
+        t_numbering = time.time() - t
+    else:
+        npoints = npoints_all
+
+    # calibration of mapping, model evaluation and writing on a sample
+    sample = np.unique(np.linspace(0, nelem - 1, min(nsample, nelem)).astype(
+        int))
+    lookup_table = RadialLookupTable(model, model_parameters)
+    t = time.time()
+    with _in_memory_file() as f:
+        for start, stop in element_chunks(sample.size, chunk_size):
+            gll_x, gll_y, mp_x, mp_y, mp = map_chunk(
+                gll, points[connectivity[sample[start:stop]]], model)
+            gll_x = gll_x.ravel()
+            gll_y = gll_y.ravel()
+            r = np.sqrt(gll_x ** 2 + gll_y ** 2)
+            values = lookup_table(r, mp.repeat(npol2))
+            for name, v in [('mesh_S', gll_x), ('mesh_Z', gll_y)] + \
+                    list(values.items()):
+                f.create_dataset(name + str(start), data=v.astype('float32'))
+    t_sample = time.time() - t
+    wall_time = t_sample * float(nelem) / max(sample.size, 1) + t_numbering
+
+    # variable sizes
+    if chunks == 'auto':
+        chunks = get_snapshot_chunks(npol, npts)
+    if chunks is not None:
+        chunks = tuple(min(c, n) for c, n in
+                       zip(chunks, (max(nelem, 1), 5, npol, npol, npts)))
+
+    snapshot_shape = (nelem, 5, npol, npol, npts)
+    snapshot_bytes = int(np.prod(snapshot_shape)) * 4
+    quantization = resolve_storage(quantization, max_error, modal_tolerance,
+                                   npol, compression)[0]
+    ratio = 1.
+    error = 0.
+    modal_order = None
+    if chunks is not None or quantization is not None or \
+            modal_tolerance is not None:
+        nsample_elements = min(nelem, nsample_chunks * (
+            chunks or get_snapshot_chunks(npol, npts))[0])
+        nodal = synthetic_snapshots(nsample_elements, npol, npts, dt, period)
+        data = decoded = nodal
+        if modal_tolerance is not None:
+            data, order = to_truncated_modal(nodal, gll, modal_tolerance)
+            data = decoded = data.astype(np.float32)
+            modal_order = float(order.mean())
+        if quantization is not None:
+            data, scale, offset = quantize(data, quantization)
+            decoded = dequantize(data, scale, offset)
+            ratio = data.itemsize / 4.
+        if modal_tolerance is not None:
+            decoded = to_nodal(decoded.astype(np.float64), gll)
+        error = get_relative_error(nodal, decoded)
+        ratio *= estimate_compression_ratio(data, chunks, compression,
+                                            compression_opts, shuffle)
+
+    variables = OrderedDict()
+    variables['MergedSnapshots'] = (snapshot_bytes,
+                                    int(snapshot_bytes * ratio))
+    if quantization is not None:
+        for name in [SCALE_VARIABLE, OFFSET_VARIABLE]:
+            variables[name] = (nelem * 5 * 4, nelem * 5 * 4)
+    if modal_tolerance is not None:
+        variables[MODAL_ORDER_VARIABLE] = (nelem, nelem)
+    for name, nbytes in [
+            ('stf_dump', npts * 4),
+            ('stf_d_dump', npts * 4),
+            ('Mesh/sem_mesh', npoints_all * 4),
+            ('Mesh/fem_mesh', nelem * 4 * 4),
+            ('Mesh/mp_mesh_S', nelem * 4),
+            ('Mesh/mp_mesh_Z', nelem * 4),
+            ('Mesh/G2', npol2 * 8),
+            ('Mesh/gll', npol * 8),
+            ('Mesh/glj', npol * 8),
+            ('Mesh/mesh_S', npoints * 4),
+            ('Mesh/mesh_Z', npoints * 4)] + [
+            ('Mesh/' + PARAMETER_VARIABLES[p], npoints * 4)
+            for p in lookup_table.parameters] + [
+            ('Mesh/' + v, npoints * 4)
+            for v, _ in (JACOBIAN_VARIABLES if jacobian else [])]:
+        variables[name] = (nbytes, nbytes)
+
+    if spatial_index:
+        index = SpatialIndex.build(points[connectivity])
+        for name, v in [('Mesh/spatial_index_offsets', index.offsets),
+                        ('Mesh/spatial_index_elements', index.elements)]:
+            variables[name] = (v.nbytes, v.nbytes)
+
+    # peak memory of create_db
+    mesh_bytes = np.asarray(points).nbytes + np.asarray(connectivity).nbytes
+    peak_memory = mesh_bytes + min(chunk_size, nelem) * npol2 * \
+        BYTES_PER_POINT
+    if unique_points:
+        peak_memory += max(npoints_all * NUMBERING_BYTES_PER_POINT,
+                           npoints_all * 4 + npoints * 8)
+
+    plan = OrderedDict()
+    plan['nelem'] = nelem
+    plan['npoints_all'] = npoints_all
+    plan['npoints'] = npoints
+    plan['duplicate_points'] = npoints_all - npoints
+    plan['snapshot_chunks'] = chunks
+    plan['compression_ratio'] = ratio
+    plan['quantization'] = quantization
+    plan['max_error'] = error
+    plan['modal_order'] = modal_order
+    plan['variables'] = variables
+    plan['peak_memory'] = int(peak_memory)
+    plan['wall_time'] = wall_time
+    return plan
+
+
+def get_plan_summary(plan):
+    """
+    Human readable summary of a plan from plan_database.
+    """
+    mb = 1024. ** 2
+    chunks = plan['snapshot_chunks']
+    summary = [
+        '=' * 78,
+        'DATABASE PLAN (no file written):',
+        '',
+        '  number of elements         | %12d' % (plan['nelem'],),
+        '  GLL points (all)           | %12d' % (plan['npoints_all'],),
+        '  GLL points (unique)        | %12d' % (plan['npoints'],),
+        '  duplicate GLL points       | %12d' % (plan['duplicate_points'],),
+        '  snapshot chunk shape       | %12s' % (
+            'contiguous' if chunks is None else 'x'.join(map(str, chunks)),),
+        '  compression ratio (est.)   | %12.3f' % (plan['compression_ratio'],),
+        '  quantization               | %12s' % (
+            plan['quantization'] or 'none',),
+        '  max. relative error (est.) | %12.2e' % (plan['max_error'],),
+        '  mean modal order (est.)    | %12s' % (
+            'nodal' if plan['modal_order'] is None else
+            '%.2f' % plan['modal_order'],),
+        '',
+        '  %-26s | %12s | %12s' % ('variable', 'raw [MB]', 'stored [MB]')]
+
+    total = [0, 0]
+    for name, (raw, stored) in plan['variables'].items():
+        summary.append('  %-26s | %12.3f | %12.3f' % (name, raw / mb,
+                                                      stored / mb))
+        total[0] += raw
+        total[1] += stored
+
+    summary += [
+        '  %-26s | %12.3f | %12.3f' % ('total', total[0] / mb,
+                                       total[1] / mb),
+        '',
+        '  peak memory (est.)         | %12.3f MB' % (
+            plan['peak_memory'] / mb,),
+        '  wall time (est.)           | %12.3f s' % (plan['wall_time'],),
+        '=' * 78]
+
+    return '\n'.join(summary)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Memoized quadrature tables.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import os
+import tempfile
+
+import numpy as np
+
+from .gll import (gauss_lobatto_legendre_quadruature_points_weights_fast,
+                  gauss_lobatto_jacobi_golub_welsch)
+from .basis_polynomials import lagrange_basis_derivative_matrix
+
+# quadrature rules: GLL for all elements and GLJ(0, 1) along xi of the
+# elements at the axis, with weights for the weight function (1 + x)
+QUADRATURE_RULES = ['gll', 'glj']
+
+# above this number of points GLL tables are computed from the eigenvalues
+# of the Jacobi matrix instead of Newton iterations
+GOLUB_WELSCH_MIN_N = 33
+
+# increase if the computation of the tables changes, invalidates the tables
+# stored on disk
+QUADRATURE_TABLE_VERSION = 1
+
+
+def compute_quadrature(rule, n):
+    """
+    Compute the points, weights and Lagrange derivative matrix of a rule.
+
+    :param rule: 'gll' or 'glj'
+    :type rule: string
+    :param n: number of points (polynomial order + 1)
+    :type n: integer
+
+    :returns: tuple of the points, weights and the derivative matrix
+        D(i, j) = d/dx l_j (x_i)
+    """
+    if rule == 'gll':
+        if n < GOLUB_WELSCH_MIN_N:
+            points, weights = \
+                gauss_lobatto_legendre_quadruature_points_weights_fast(n)
+        else:
+            points, weights = gauss_lobatto_jacobi_golub_welsch(n)
+    elif rule == 'glj':
+        points, weights = gauss_lobatto_jacobi_golub_welsch(n, 0., 1.)
+    else:
+        raise ValueError('unknown quadrature rule %s, use one of %s' % (
+            rule, ', '.join(QUADRATURE_RULES)))
+
+    return points, weights, lagrange_basis_derivative_matrix(points)
+
+
+class QuadratureProvider(object):
+    """
+    Memoizes quadrature tables per rule and number of points, optionally
+    persisting them in a directory shared between runs. The returned arrays
+    are read-only.
+
+    :param directory: directory for the tables, in memory only if None
+    :type directory: string
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._tables = {}
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, rule, n):
+        return os.path.join(self.directory, '%s_%d_v%d.npz' % (
+            rule, n, QUADRATURE_TABLE_VERSION))
+
+    def _load(self, rule, n):
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(rule, n)) as f:
+                return f['points'], f['weights'], f['derivative_matrix']
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+    def _store(self, rule, n, table):
+        # write to a temporary file and rename, so that concurrent runs never
+        # see partial files
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, points=table[0], weights=table[1],
+                         derivative_matrix=table[2])
+            os.rename(tmp, self._path(rule, n))
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get(self, rule, n):
+        """
+        Points, weights and derivative matrix of a rule, see
+        compute_quadrature.
+        """
+        key = (rule, int(n))
+        if key not in self._tables:
+            table = self._load(rule, n)
+            if table is None:
+                table = compute_quadrature(rule, n)
+                if self.directory is not None:
+                    self._store(rule, n, table)
+            for t in table:
+                t.flags.writeable = False
+            self._tables[key] = tuple(table)
+        return self._tables[key]
+
+    def clear(self):
+        self._tables.clear()
+
+
+# provider used by default, in memory only
+_default_provider = QuadratureProvider()
+
+
+def get_quadrature(rule='gll', n=5, provider=None):
+    """
+    Memoized points, weights and derivative matrix of a quadrature rule.
+
+    :param rule: 'gll' or 'glj'
+    :type rule: string
+    :param n: number of points (polynomial order + 1)
+    :type n: integer
+    :param provider: provider to use, defaults to an in memory provider
+        shared by all calls
+    :type provider: QuadratureProvider
+
+    :returns: tuple of read-only numpy arrays containing the points, weights
+        and the derivative matrix D(i, j) = d/dx l_j (x_i)
+    """
+    return (provider or _default_provider).get(rule, n)
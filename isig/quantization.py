@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Lossy quantized storage of MergedSnapshots.
+
+Each variable of each element is encoded with its own scale and offset,
+value = data * scale + offset, stored in MergedSnapshots_scale and
+MergedSnapshots_offset with shape (elements, nvars). The integer encodings
+map the range of the values linearly to the integer range, float16 stores
+the values normalized by their maximum absolute value. The error is bounded
+relative to the maximum absolute value of the variable in the element:
+
+    int8      1 byte   3.9e-3
+    float16   2 bytes  4.9e-4
+    int16     2 bytes  1.5e-5
+
+Modal MergedSnapshots quantize the Legendre coefficients instead, the bounds
+of the reconstructed nodal values are larger by modal.get_amplification and
+add to the truncation tolerance, see resolve_storage.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from collections import OrderedDict
+
+import numpy as np
+
+from .modal import ModalSnapshots, get_amplification
+from .quadrature import get_quadrature
+
+# encodings ordered by increasing accuracy
+QUANTIZATIONS = OrderedDict([('int8', np.int8), ('float16', np.float16),
+                             ('int16', np.int16)])
+
+# error of encoding and decoding in single precision relative to the maximum
+# absolute value, added to the error bounds
+FLOAT32_ROUNDING = 4 * float(np.finfo(np.float32).eps)
+
+SCALE_VARIABLE = 'MergedSnapshots_scale'
+OFFSET_VARIABLE = 'MergedSnapshots_offset'
+
+
+def _check(quantization):
+    if quantization not in QUANTIZATIONS:
+        raise ValueError('unknown quantization %s, use one of %s' % (
+            quantization, ', '.join(QUANTIZATIONS)))
+    return np.dtype(QUANTIZATIONS[quantization])
+
+
+def get_error_bound(quantization, amplification=1.):
+    """
+    Bound of the error of an encoding relative to the maximum absolute value
+    of a variable in an element.
+
+    :param quantization: 'int8', 'float16' or 'int16'
+    :type quantization: string
+    :param amplification: growth of the error from the encoded values to
+        the values read, see modal.get_amplification
+    :type amplification: float
+    """
+    dtype = _check(quantization)
+    if dtype.kind == 'f':
+        bound = float(np.finfo(dtype).eps) / 2
+    else:
+        bound = 1. / (2 * np.iinfo(dtype).max)
+    return (bound + FLOAT32_ROUNDING) * amplification
+
+
+def get_quantization(max_error, amplification=1.):
+    """
+    Smallest encoding with an error bound below max_error, None if float32
+    is needed.
+
+    :param max_error: relative error bound, see get_error_bound
+    :type max_error: float
+    """
+    for quantization in QUANTIZATIONS:
+        if get_error_bound(quantization, amplification) <= max_error:
+            return quantization
+    return None
+
+
+def resolve_quantization(quantization=None, max_error=None,
+                         amplification=1.):
+    """
+    Check the quantization against the error bound, or select the smallest
+    one within the bound if quantization is None.
+
+    :returns: quantization or None for float32
+    """
+    if max_error is not None:
+        if quantization is None:
+            return get_quantization(max_error, amplification)
+        if get_error_bound(quantization, amplification) > max_error:
+            raise ValueError('%s quantization exceeds the error bound %g' % (
+                quantization, max_error))
+    if quantization is not None:
+        _check(quantization)
+    return quantization
+
+
+def resolve_storage(quantization=None, max_error=None, modal_tolerance=None,
+                    npol=5, compression=None):
+    """
+    Resolve the quantization of nodal or modal MergedSnapshots, see
+    resolve_quantization, and the bound of the error of the values read
+    relative to the maximum absolute value of a variable in an element.
+
+    The coefficients of modal storage are quantized, so the error bound of
+    the quantization grows by modal.get_amplification and adds to the
+    truncation tolerance. max_error bounds the sum of both.
+
+    :param modal_tolerance: truncation tolerance of modal storage, None for
+        nodal storage
+    :type modal_tolerance: float
+    :param npol: number of GLL points per dimension
+    :type npol: integer
+    :param compression: compression filter, required for modal storage as
+        the truncated modes are stored as zeros
+    :type compression: string
+
+    :returns: tuple of the quantization or None for float32 and the error
+        bound, None for lossless storage
+    """
+    if modal_tolerance is None:
+        quantization = resolve_quantization(quantization, max_error)
+        return quantization, (get_error_bound(quantization)
+                              if quantization else None)
+
+    if compression is None:
+        raise ValueError('modal storage needs compression to store less '
+                         'than nodal storage')
+    if max_error is not None:
+        if modal_tolerance >= max_error:
+            raise ValueError('modal tolerance %g exceeds the error bound '
+                             '%g' % (modal_tolerance, max_error))
+        max_error = max_error - modal_tolerance
+
+    amplification = get_amplification(get_quadrature('gll', npol)[0])
+    quantization = resolve_quantization(quantization, max_error,
+                                        amplification)
+    if quantization is None:
+        # rounding of the float32 coefficients
+        bound = FLOAT32_ROUNDING * amplification
+    else:
+        bound = get_error_bound(quantization, amplification)
+    return quantization, modal_tolerance + bound
+
+
+def get_storage_ratio(quantization, npol, npts):
+    """
+    Ratio of the bytes of the encoded data including scale and offset to
+    float32 storage, before compression.
+    """
+    if quantization is None:
+        return 1.
+    nvalues = npol ** 2 * npts
+    return float(_check(quantization).itemsize * nvalues + 8) / \
+        (4 * nvalues)
+
+
+def _expand(a, ndim):
+    # (nelem, nvars) to broadcast against (nelem, nvars, ...)
+    return a.reshape(a.shape + (1, ) * (ndim - a.ndim))
+
+
+def quantize(data, quantization):
+    """
+    Encode a block of MergedSnapshots.
+
+    :param data: shape (nelem, nvars, npol, npol, npts)
+    :type data: numpy array
+    :param quantization: 'int8', 'float16' or 'int16'
+    :type quantization: string
+
+    :returns: tuple of the encoded data and the float32 scale and offset of
+        shape (nelem, nvars)
+    """
+    dtype = _check(quantization)
+    data = np.asarray(data, dtype=np.float32)
+    axes = tuple(range(2, data.ndim))
+    vmin = data.min(axis=axes)
+    vmax = data.max(axis=axes)
+
+    if dtype.kind == 'f':
+        offset = np.zeros_like(vmax)
+        scale = np.maximum(vmax, -vmin)
+    else:
+        qmax = np.iinfo(dtype).max
+        offset = vmin / 2 + vmax / 2
+        scale = (vmax - vmin) / (2 * qmax)
+    # constant variables are represented by the offset alone
+    scale[scale == 0.] = 1.
+
+    q = (data - _expand(offset, data.ndim)) / _expand(scale, data.ndim)
+    if dtype.kind != 'f':
+        q = np.clip(np.rint(q), -qmax, qmax)
+    return q.astype(dtype), scale, offset
+
+
+def dequantize(data, scale, offset):
+    """
+    Decode a block encoded with quantize.
+
+    :returns: float32 numpy array of the shape of data
+    """
+    data = np.asarray(data)
+    scale = np.asarray(scale, dtype=np.float32)
+    offset = np.asarray(offset, dtype=np.float32)
+    return data.astype(np.float32) * _expand(scale, data.ndim) + \
+        _expand(offset, data.ndim)
+
+
+def get_relative_error(data, decoded):
+    """
+    Maximum error of the decoded data relative to the maximum absolute value
+    of each variable in each element, as bounded by get_error_bound.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    axes = tuple(range(2, data.ndim))
+    error = np.abs(decoded - data).max(axis=axes)
+    norm = np.abs(data).max(axis=axes)
+    error = error[norm > 0.] / norm[norm > 0.]
+    return float(error.max()) if error.size else 0.
+
+
+class QuantizedSnapshots(object):
+    """
+    array-like view of quantized MergedSnapshots decoding on read. Supports
+    indexing along the elements with an integer or a slice.
+
+    :param f: open database
+    :type f: h5netcdf.File or h5py.File
+    """
+
+    def __init__(self, f):
+        self.data = f['MergedSnapshots']
+        self.scale = f[SCALE_VARIABLE]
+        self.offset = f[OFFSET_VARIABLE]
+        self.shape = self.data.shape
+        self.dtype = np.dtype(np.float32)
+        self.chunks = self.data.chunks
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        return dequantize(self.data[index], self.scale[index],
+                          self.offset[index])
+
+
+def get_snapshots(f):
+    """
+    MergedSnapshots of a database as float32 nodal values, decoded on read
+    if quantized and reconstructed if stored as modal coefficients.
+
+    :param f: open database
+    :type f: h5netcdf.File or h5py.File
+
+    :returns: the variable or a QuantizedSnapshots or modal.ModalSnapshots
+        view
+    """
+    var = f['MergedSnapshots']
+    snapshots = QuantizedSnapshots(f) if 'quantization' in var.attrs else var
+    if var.attrs.get('storage') == 'modal':
+        snapshots = ModalSnapshots(snapshots, f['Mesh/gll'][:])
+    return snapshots
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Locality preserving ordering of the elements along space filling curves.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .map_spheroid import map_spheroid
+
+ELEMENT_ORDERS = ['hilbert', 'morton']
+
+# bits per coordinate, the curve index fits into an int64
+DEFAULT_NBITS = 16
+
+
+def quantize(x, y, nbits=DEFAULT_NBITS):
+    """
+    Map coordinates to integers in [0, 2 ** nbits) on a square grid covering
+    the bounding box, preserving the aspect ratio.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.size == 0:
+        return x.astype(np.int64), y.astype(np.int64)
+
+    n = 2 ** nbits
+    extent = max(np.ptp(x), np.ptp(y))
+    scale = (n - 1) / extent if extent > 0 else 0.
+    ix = np.floor((x - x.min()) * scale).astype(np.int64)
+    iy = np.floor((y - y.min()) * scale).astype(np.int64)
+    return np.clip(ix, 0, n - 1), np.clip(iy, 0, n - 1)
+
+
+def morton_index(ix, iy, nbits=DEFAULT_NBITS):
+    """
+    Position of integer grid points along the Morton (Z-order) curve by
+    interleaving the bits of the coordinates.
+    """
+    ix = np.asarray(ix, dtype=np.int64)
+    iy = np.asarray(iy, dtype=np.int64)
+    d = np.zeros(np.broadcast(ix, iy).shape, dtype=np.int64)
+    for b in np.arange(nbits):
+        d |= ((ix >> b) & 1) << (2 * b + 1)
+        d |= ((iy >> b) & 1) << (2 * b)
+    return d
+
+
+def hilbert_index(ix, iy, nbits=DEFAULT_NBITS):
+    """
+    Position of integer grid points along the Hilbert curve on a grid of
+    2 ** nbits x 2 ** nbits points. Consecutive positions are neighbouring
+    grid points.
+    """
+    n = 2 ** nbits
+    ix, iy = np.broadcast_arrays(np.asarray(ix, dtype=np.int64),
+                                 np.asarray(iy, dtype=np.int64))
+    ix = ix.copy()
+    iy = iy.copy()
+    d = np.zeros(ix.shape, dtype=np.int64)
+
+    s = n // 2
+    while s > 0:
+        rx = (ix & s) > 0
+        ry = (iy & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+
+        # rotate the quadrant
+        flip = rx & ~ry
+        ix[flip] = n - 1 - ix[flip]
+        iy[flip] = n - 1 - iy[flip]
+        swap = ~ry
+        ix[swap], iy[swap] = iy[swap], ix[swap]
+        s //= 2
+    return d
+
+
+def space_filling_curve_index(x, y, method='hilbert', nbits=DEFAULT_NBITS):
+    """
+    Position of points along a space filling curve over their bounding box.
+
+    :param x: x coordinates
+    :type x: numpy array
+    :param y: y coordinates
+    :type y: numpy array
+    :param method: 'hilbert' or 'morton'
+    :type method: string
+    :param nbits: resolution of the curve in bits per coordinate
+    :type nbits: integer
+    """
+    if method not in ELEMENT_ORDERS:
+        raise ValueError('unknown element order %s, use one of %s' % (
+            method, ', '.join(ELEMENT_ORDERS)))
+    ix, iy = quantize(x, y, nbits)
+    if method == 'hilbert':
+        return hilbert_index(ix, iy, nbits)
+    return morton_index(ix, iy, nbits)
+
+
+def get_element_order(points, connectivity, method='hilbert',
+                      nbits=DEFAULT_NBITS):
+    """
+    Permutation of the elements sorting their midpoints along a space
+    filling curve, such that elements close in space are close in the
+    database and nearby queries hit the same or adjacent chunks.
+
+    :param points: mesh points, shape (npoints, 2)
+    :type points: numpy array
+    :param connectivity: mesh connectivity, shape (nelem, 4)
+    :type connectivity: numpy array
+    :param method: 'hilbert' or 'morton'
+    :type method: string
+
+    :returns: element indices in the new order, connectivity[order] is the
+        reordered connectivity
+    """
+    mp_x, mp_y = map_spheroid(np.zeros(1), points[connectivity])
+    index = space_filling_curve_index(mp_x.ravel(), mp_y.ravel(), method,
+                                      nbits)
+    return np.argsort(index, kind='mergesort')
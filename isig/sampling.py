@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Temporal sampling of the databases: sampling interval and number of samples
+from the resolved period, and anti-aliased decimation of snapshots.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .model_evaluation import evaluate_model
+
+# samples per shortest period, i.e. twice the Nyquist rate, leaving room for
+# the transition band of the anti-aliasing filter
+DEFAULT_SAMPLES_PER_PERIOD = 4
+
+# time after the arrival of the slowest wave at the maximum distance in
+# shortest periods, for the source time function and the coda
+DEFAULT_MARGIN_PERIODS = 10
+
+# cutoff of the anti-aliasing filter relative to the Nyquist frequency after
+# decimation
+DEFAULT_CUTOFF = 0.8
+
+# half length of the anti-aliasing filter in output samples and the shape
+# parameter of its Kaiser window, about 80 dB stopband attenuation
+DEFAULT_HALF_WIDTH = 10
+KAISER_BETA = 8.
+
+
+def get_min_velocity(model, parameter='VS', nsamples=100):
+    """
+    Smallest positive velocity of a 1D model, sampled in each layer.
+
+    :param model: pymesher 1D model
+    :param parameter: velocity parameter, see
+        model_evaluation.PARAMETER_VARIABLES
+    :type parameter: string
+    :param nsamples: number of radii per layer
+    :type nsamples: integer
+    """
+    d = model.discontinuities
+    r = np.concatenate([np.linspace(d[i], d[i + 1], nsamples)
+                        for i in np.arange(len(d) - 1)])
+    centroid = np.repeat((d[:-1] + d[1:]) / 2., nsamples)
+    v = evaluate_model(model, r, centroid, parameters=[parameter])[parameter]
+    return float(v[v > 0.].min())
+
+
+def get_sampling(model, period, max_dist=180.,
+                 samples_per_period=DEFAULT_SAMPLES_PER_PERIOD,
+                 margin_periods=DEFAULT_MARGIN_PERIODS, min_velocity=None):
+    """
+    Sampling interval and number of samples of a database resolving period
+    up to the epicentral distance max_dist. The duration covers the slowest
+    waves of the model travelling along the surface to max_dist.
+
+    :param model: pymesher 1D model
+    :param period: shortest period to resolve in seconds
+    :type period: float
+    :param max_dist: maximum epicentral distance in degrees
+    :type max_dist: float
+    :param samples_per_period: samples per shortest period, at least 2
+    :type samples_per_period: float
+    :param margin_periods: time added after the slowest arrival in periods
+    :type margin_periods: float
+    :param min_velocity: slowest velocity in m/s, defaults to the smallest
+        shear velocity of the model, see get_min_velocity
+    :type min_velocity: float
+
+    :returns: tuple of the sampling interval dt and the number of samples
+    """
+    if samples_per_period < 2:
+        raise ValueError('less than 2 samples per period alias')
+    if min_velocity is None:
+        min_velocity = get_min_velocity(model)
+
+    dt = period / float(samples_per_period)
+    duration = np.deg2rad(max_dist) * model.scale / min_velocity + \
+        margin_periods * period
+    return dt, int(np.ceil(duration / dt)) + 1
+
+
+def get_decimation_factor(dt_in, dt):
+    """
+    Integer factor decimating samples at dt_in to dt.
+    """
+    ratio = dt / float(dt_in)
+    factor = int(round(ratio))
+    if factor < 1 or abs(ratio - factor) > 1e-6 * ratio:
+        raise ValueError('dt %g is not an integer multiple of %g' % (
+            dt, dt_in))
+    return factor
+
+
+def get_decimation_filter(factor, cutoff=DEFAULT_CUTOFF,
+                          half_width=DEFAULT_HALF_WIDTH):
+    """
+    Kaiser windowed sinc lowpass filter for decimation with unit gain at
+    zero frequency.
+
+    :param factor: decimation factor
+    :type factor: integer
+    :param cutoff: cutoff relative to the Nyquist frequency after decimation
+    :type cutoff: float
+    :param half_width: half length of the filter in output samples
+    :type half_width: integer
+
+    :returns: symmetric filter coefficients, length 2 * half_width * factor
+        + 1
+    """
+    half = half_width * factor
+    n = np.arange(-half, half + 1)
+    fc = cutoff * 0.5 / factor
+    h = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(2 * half + 1, KAISER_BETA)
+    return h / h.sum()
+
+
+def get_decimation_samples(nsamples, factor, half_width=DEFAULT_HALF_WIDTH):
+    """
+    Number of samples per trace that decimate allocates in addition to its
+    input: the padded copy of the input, the output and a temporary of the
+    size of the output.
+    """
+    if factor == 1:
+        return 0
+    return nsamples + 2 * half_width * factor + \
+        2 * ((nsamples - 1) // factor + 1)
+
+
+def decimate(data, factor, cutoff=DEFAULT_CUTOFF,
+             half_width=DEFAULT_HALF_WIDTH):
+    """
+    Lowpass filter and downsample along the last axis without phase shift,
+    output sample j is input sample j * factor. The signal is extended by
+    its edge values at both ends. The filter is applied in the precision of
+    the data, at least single precision, see get_decimation_samples for the
+    memory used.
+
+    :param data: samples along the last axis
+    :type data: numpy array
+    :param factor: decimation factor
+    :type factor: integer
+
+    See get_decimation_filter for the other parameters.
+
+    :returns: numpy array with (nsamples - 1) // factor + 1 samples along
+        the last axis
+    """
+    data = np.asarray(data)
+    if factor == 1:
+        return data
+
+    dtype = np.result_type(data.dtype, np.float32)
+    h = get_decimation_filter(factor, cutoff, half_width).astype(dtype)
+    half = h.size // 2
+    nout = (data.shape[-1] - 1) // factor + 1
+    x = np.pad(data.astype(dtype, copy=False),
+               [(0, 0)] * (data.ndim - 1) + [(half, half)], mode='edge')
+
+    # the filter is symmetric, so the convolution at the output samples is a
+    # sum of strided slices, accumulated in place
+    out = np.zeros(data.shape[:-1] + (nout, ), dtype=dtype)
+    tmp = np.empty_like(out)
+    stop = (nout - 1) * factor + 1
+    for k in np.arange(h.size):
+        np.multiply(x[..., k:k + stop:factor], h[k], out=tmp)
+        out += tmp
+    return out
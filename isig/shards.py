@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Databases split into several shard files.
+
+Each shard is a complete database of a range of elements, with its own mesh
+group and MergedSnapshots. A small master file maps the shards into one
+logical database with HDF5 virtual datasets, such that readers see the same
+variables as in a single file:
+
+    master.nc
+    master.shard0000.nc
+    master.shard0001.nc
+    ...
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import os
+
+import numpy as np
+
+from .create_db import create_db
+from .instrumentation import Instrumentation
+from .map_spheroid import map_spheroid
+from .parallel import ordered_map
+from .reorder import get_element_order
+from .spatial_index import SpatialIndex
+
+SHARD_BY = ['elements', 'colatitude']
+
+# variables of the mesh group numbering points, offset in the master file
+NUMBERING_VARIABLES = ['sem_mesh', 'fem_mesh']
+
+
+def get_shard_filename(fname, shard):
+    """
+    filename of a shard, next to the master file
+    """
+    base, ext = os.path.splitext(fname)
+    return '%s.shard%04d%s' % (base, shard, ext)
+
+
+def get_shard_ranges(nelem, nshards):
+    """
+    Split the elements into nshards contiguous ranges of about equal size.
+
+    :returns: list of (start, stop) tuples
+    """
+    if not 1 <= nshards <= max(nelem, 1):
+        raise ValueError('number of shards must be between 1 and the number '
+                         'of elements')
+    bounds = np.arange(nshards + 1) * nelem // nshards
+    return [(int(start), int(stop))
+            for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def get_colatitude_bands(points, connectivity, nshards):
+    """
+    Permutation of the elements grouping them into nshards colatitude bands
+    with about equal numbers of elements. The order within each band is
+    kept, e.g. a space filling curve order.
+
+    :returns: element indices in the new order, such that the ranges of
+        get_shard_ranges are the bands
+    """
+    nelem = connectivity.shape[0]
+    mp_x, mp_y = map_spheroid(np.zeros(1), points[connectivity])
+    theta = np.arctan2(mp_x.ravel(), mp_y.ravel())
+
+    index = np.argsort(theta, kind='mergesort')
+    band = np.empty(nelem, dtype=np.int64)
+    for shard, (start, stop) in enumerate(get_shard_ranges(nelem, nshards)):
+        band[index[start:stop]] = shard
+    return np.argsort(band, kind='mergesort')
+
+
+def create_sharded_db(fname, model, points, connectivity, nshards=2,
+                      shard_by='elements', shards=None, write_master=True,
+                      element_order=None, spatial_index=False, nthreads=1,
+                      instrumentation=None, **kwargs):
+    """
+    Create a database split into nshards shard files and a master file, see
+    write_master_file.
+
+    The shards are independent files and can be written in parallel, either
+    by the threads of this call or by separate processes, each passing a
+    subset of shards and write_master=False, followed by one call with
+    shards=[] writing the master file. The order of the elements depends
+    only on the mesh and the arguments, so the calls agree on the shards.
+
+    :param fname: filename of the master file, the shards are written next
+        to it, see get_shard_filename
+    :type fname: string
+    :param nshards: number of shards
+    :type nshards: integer
+    :param shard_by: 'elements' for ranges of elements in database order,
+        'colatitude' for colatitude bands of the element midpoints
+    :type shard_by: string
+    :param shards: indices of the shards to write, all if None
+    :type shards: list of integers
+    :param write_master: write the master file, requires all shard files
+    :type write_master: bool
+    :param nthreads: number of shards written at the same time
+    :type nthreads: integer
+
+    See create_db for the other parameters, the spatial index is stored
+    for the whole mesh in the master file.
+
+    :returns: dictionary as create_db with the number of elements and points
+        of the logical database, the shard filenames and the element ranges
+        of the shards
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError('unknown shard_by %s, use one of %s' % (
+            shard_by, ', '.join(SHARD_BY)))
+
+    instr = instrumentation or Instrumentation(enabled=False)
+    nelem = connectivity.shape[0]
+    ranges = get_shard_ranges(nelem, nshards)
+    filenames = [get_shard_filename(fname, i) for i in range(nshards)]
+
+    order = np.arange(nelem)
+    with instr.stage('element_order'):
+        if element_order is not None:
+            order = get_element_order(points, connectivity, element_order)
+        if shard_by == 'colatitude':
+            order = order[get_colatitude_bands(
+                points, connectivity[order], nshards)]
+    connectivity = connectivity[order]
+
+    def write_shard(shard):
+        start, stop = ranges[shard]
+        return create_db(filenames[shard], model, points,
+                         connectivity[start:stop], instrumentation=instr,
+                         **kwargs)
+
+    shards = range(nshards) if shards is None else shards
+    infos = list(ordered_map(write_shard, shards, nthreads))
+
+    info = {'nelem': nelem, 'npoints': sum(i['npoints'] for i in infos),
+            'shard_files': filenames, 'shard_ranges': ranges,
+            'model_evaluations': sum(i['model_evaluations'] for i in infos),
+            'element_order': None if element_order is None and
+            shard_by == 'elements' else order}
+    if infos:
+        for k in ['snapshot_chunks', 'quantization', 'max_error',
+                  'modal_tolerance']:
+            info[k] = infos[0][k]
+
+    if write_master:
+        with instr.stage('write_master'):
+            info['npoints'] = write_master_file(
+                fname, filenames, spatial_index=spatial_index,
+                attrs={'element order': element_order or 'mesh',
+                       'shard by': shard_by})
+        if not infos:
+            info.update(_read_storage(filenames[0]))
+    return info
+
+
+def _read_storage(filename):
+    """
+    MergedSnapshots chunks, quantization and error bounds of a shard, as
+    returned by create_db
+    """
+    # imported here to keep the command line startup fast
+    import h5netcdf
+
+    with h5netcdf.File(filename, 'r') as f:
+        var = f['MergedSnapshots']
+        attrs = dict(var.attrs)
+        chunks = var.chunks
+
+    def get(name, dtype):
+        return dtype(attrs[name]) if name in attrs else None
+
+    return {'snapshot_chunks': None if chunks is None else tuple(chunks),
+            'quantization': get('quantization', str),
+            'max_error': get('max_error', float),
+            'modal_tolerance': get('modal_tolerance', float)}
+
+
+def _read_shard(filename):
+    """
+    dimensions, attributes and variables of a shard
+    """
+    # imported here to keep the command line startup fast
+    import h5netcdf
+
+    with h5netcdf.File(filename, 'r') as f:
+        mesh = f['Mesh']
+        shard = {
+            'nelem': f.dimensions['elements'].size,
+            'npoints': f.dimensions['gllpoints_all'].size,
+            'dimensions': dict((k, v.size) for k, v in f.dimensions.items()),
+            'mesh_dimensions': dict((k, v.size)
+                                    for k, v in mesh.dimensions.items()
+                                    if not k.startswith('spatial_index')),
+            'attrs': dict(f.attrs),
+            'variables': [
+                (v.name, v.dimensions, v.shape, v.dtype, dict(v.attrs))
+                for g in [f, mesh] for v in g.variables.values()
+                if not v.name.startswith('/Mesh/spatial_index')],
+            'numbering': dict((name, mesh[name][:])
+                              for name in NUMBERING_VARIABLES)}
+        fem_mesh = shard['numbering']['fem_mesh']
+        shard['nodes'] = np.stack([mesh['mesh_S'][:][fem_mesh],
+                                   mesh['mesh_Z'][:][fem_mesh]], axis=-1)
+    return shard
+
+
+def write_master_file(fname, shard_files, spatial_index=False, attrs=None):
+    """
+    Write the master file of a sharded database.
+
+    Variables along the elements or GLL points are HDF5 virtual datasets
+    concatenating the shards, other variables map to the first shard. The
+    shard files are referenced relative to the master file, so the files
+    can be moved together. The point numbering in sem_mesh and fem_mesh
+    is offset to the concatenated points and stored in the master file.
+    Points shared between shards are stored once per shard.
+
+    The group Shards contains the element and point offsets of the shards,
+    the elements of shard i are element_offsets[i]:element_offsets[i + 1],
+    and the shard filenames in the attribute files.
+
+    :param fname: filename of the master file
+    :type fname: string
+    :param shard_files: filenames of the shards in element order
+    :type shard_files: list of strings
+    :param spatial_index: store a spatial index of the whole mesh
+    :type spatial_index: bool
+    :param attrs: global attributes replacing the ones of the first shard
+    :type attrs: dict
+
+    :returns: number of points of the logical database
+    """
+    # imported here to keep the command line startup fast
+    import h5netcdf
+    import h5py
+
+    shards = [_read_shard(s) for s in shard_files]
+    element_offsets = np.cumsum([0] + [s['nelem'] for s in shards])
+    point_offsets = np.cumsum([0] + [s['npoints'] for s in shards])
+    nelem, npoints = int(element_offsets[-1]), int(point_offsets[-1])
+    first = shards[0]
+
+    directory = os.path.dirname(os.path.abspath(fname))
+    sources = [os.path.relpath(os.path.abspath(s), directory)
+               for s in shard_files]
+
+    with h5netcdf.File(fname, 'w') as f:
+        dimensions = dict(first['dimensions'])
+        dimensions['elements'] = nelem
+        dimensions['gllpoints_all'] = npoints
+        f.dimensions = dimensions
+
+        for k, v in first['attrs'].items():
+            f.attrs[k] = v
+        f.attrs['npoints'] = npoints
+        f.attrs['nshards'] = len(shards)
+        for k, op in [('kernel wavefield rmin', min),
+                      ('kernel wavefield rmax', max),
+                      ('kernel wavefield colatmin', min),
+                      ('kernel wavefield colatmax', max)]:
+            f.attrs[k] = op(s['attrs'][k] for s in shards)
+        for k, v in (attrs or {}).items():
+            f.attrs[k] = v
+
+        mesh_group = f.create_group('Mesh')
+        mesh_group.dimensions = first['mesh_dimensions']
+        dims = dict((v[0], v[1]) for v in first['variables'])
+        for name in NUMBERING_VARIABLES:
+            var = mesh_group.create_variable(name, dims['/Mesh/' + name],
+                                             'int32')
+            var[:] = np.concatenate([
+                s['numbering'][name] + offset
+                for s, offset in zip(shards, point_offsets)])
+
+        if spatial_index:
+            SpatialIndex.build(np.concatenate(
+                [s['nodes'] for s in shards])).write(mesh_group)
+
+        shards_group = f.create_group('Shards')
+        shards_group.dimensions = {'shard_offsets': len(shards) + 1}
+        for name, v in [('element_offsets', element_offsets),
+                        ('point_offsets', point_offsets)]:
+            var = shards_group.create_variable(name, ('shard_offsets', ),
+                                               'int64')
+            var[:] = v
+        shards_group.attrs['files'] = sources
+
+    with h5py.File(fname, 'r+') as f:
+        for name, dims, shape, dtype, var_attrs in first['variables']:
+            if name.split('/')[-1] in NUMBERING_VARIABLES:
+                continue
+
+            if dims[0] in ['elements', 'gllpoints_all']:
+                offsets = element_offsets if dims[0] == 'elements' else \
+                    point_offsets
+                layout = h5py.VirtualLayout(
+                    shape=(int(offsets[-1]), ) + shape[1:], dtype=dtype)
+                for source, start, stop in zip(sources, offsets[:-1],
+                                               offsets[1:]):
+                    layout[start:stop] = h5py.VirtualSource(
+                        source, name, shape=(stop - start, ) + shape[1:])
+            else:
+                layout = h5py.VirtualLayout(shape=shape, dtype=dtype)
+                layout[...] = h5py.VirtualSource(sources[0], name,
+                                                 shape=shape)
+
+            dataset = f.create_virtual_dataset(name, layout)
+            for k, v in var_attrs.items():
+                dataset.attrs[k] = v
+            # attach the netCDF dimensions, defined in the group of the
+            # variable or the root group
+            group = name.rsplit('/', 1)[0] or '/'
+            for axis, dim in enumerate(dims):
+                scale = f[group][dim] if dim in f[group] else f['/' + dim]
+                dataset.dims[axis].attach_scale(scale)
+
+    return npoints
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Spatial index for locating the elements containing given points.
+
+The domain is covered with a regular grid of buckets in radius and
+colatitude. Each bucket lists the elements whose polar bounding box
+overlaps with it in compressed sparse row format, which is stored in the
+Mesh group of the database, such that no search structure needs to be
+rebuilt when opening it.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from .map_spheroid import inverse_map_spheroid
+
+# maximum number of buckets per element
+MAX_BUCKETS_PER_ELEMENT = 4
+
+# relative tolerance of the point in element test, accounts for the single
+# precision of the coordinates in the database
+DEFAULT_TOLERANCE = 1e-6
+
+
+def _polar(x, y):
+    return np.sqrt(x ** 2 + y ** 2), np.arctan2(x, y)
+
+
+def _cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+
+class SpatialIndex(object):
+    """
+    Polar grid of buckets mapping to candidate elements, see build for
+    creating it from the control nodes of the elements.
+
+    :param nodes: control nodes of the elements, shape (nelem, 4, 2)
+    :type nodes: numpy array
+    :param offsets: start of the element list of each bucket in elements,
+        shape (nbuckets + 1,)
+    :type offsets: numpy array
+    :param elements: element lists of all buckets
+    :type elements: numpy array
+    :param shape: number of buckets in radius and colatitude
+    :type shape: tuple of two integers
+    :param r_range: radius range covered by the grid
+    :type r_range: tuple of two floats
+    :param theta_range: colatitude range covered by the grid in radians
+    :type theta_range: tuple of two floats
+    """
+
+    def __init__(self, nodes, offsets, elements, shape, r_range,
+                 theta_range):
+        self.nodes = np.asarray(nodes, dtype=np.float64)
+        self.offsets = np.asarray(offsets)
+        self.elements = np.asarray(elements)
+        self.shape = tuple(int(n) for n in shape)
+        self.r_range = tuple(float(r) for r in r_range)
+        self.theta_range = tuple(float(t) for t in theta_range)
+
+    @classmethod
+    def build(cls, nodes, shape=None):
+        """
+        Build the index from the control nodes of the elements.
+
+        :param nodes: control nodes of the elements, shape (nelem, 4, 2)
+        :type nodes: numpy array
+        :param shape: number of buckets in radius and colatitude, by default
+            chosen from the median element size such that an element
+            overlaps with only a few buckets
+        :type shape: tuple of two integers
+        """
+        nodes = np.asarray(nodes, dtype=np.float64)
+        nelem = nodes.shape[0]
+        r, theta = _polar(nodes[..., 0], nodes[..., 1])
+
+        # the sides are straight lines and the bottom and top edges arcs, so
+        # the polar bounding box of the nodes bounds the element
+        r_min, r_max = r.min(axis=1), r.max(axis=1)
+        t_min, t_max = theta.min(axis=1), theta.max(axis=1)
+
+        r_range = (r_min.min(), r_max.max())
+        theta_range = (t_min.min(), t_max.max())
+        r_span = max(r_range[1] - r_range[0], 1e-300)
+        t_span = max(theta_range[1] - theta_range[0], 1e-300)
+
+        if shape is None:
+            dr = max(np.median(r_max - r_min), r_span * 1e-6)
+            dt = max(np.median(t_max - t_min), t_span * 1e-6)
+            nr = int(np.clip(np.ceil(r_span / dr), 1, max(nelem, 1)))
+            nt = int(np.clip(np.ceil(t_span / dt), 1, max(nelem, 1)))
+            # cap the total number of buckets
+            factor = np.sqrt(nr * nt / float(MAX_BUCKETS_PER_ELEMENT *
+                                             max(nelem, 1)))
+            if factor > 1:
+                nr = max(int(nr / factor), 1)
+                nt = max(int(nt / factor), 1)
+            shape = (nr, nt)
+        nr, nt = shape
+
+        # bucket ranges of the elements, padded by the tolerance
+        def bucket(v, vmin, span, n, pad):
+            i = np.floor((v - vmin) / span * n + pad).astype(np.int64)
+            return np.clip(i, 0, n - 1)
+
+        ir0 = bucket(r_min, r_range[0], r_span, nr, -DEFAULT_TOLERANCE * nr)
+        ir1 = bucket(r_max, r_range[0], r_span, nr, DEFAULT_TOLERANCE * nr)
+        it0 = bucket(t_min, theta_range[0], t_span, nt,
+                     -DEFAULT_TOLERANCE * nt)
+        it1 = bucket(t_max, theta_range[0], t_span, nt,
+                     DEFAULT_TOLERANCE * nt)
+
+        # expand the ranges to (bucket, element) pairs
+        nr_e = ir1 - ir0 + 1
+        nt_e = it1 - it0 + 1
+        count = nr_e * nt_e
+        element = np.repeat(np.arange(nelem), count)
+        k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count,
+                                               count)
+        buckets = (ir0[element] + k // nt_e[element]) * nt + \
+            it0[element] + k % nt_e[element]
+
+        order = np.argsort(buckets, kind='mergesort')
+        offsets = np.zeros(nr * nt + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(buckets, minlength=nr * nt))
+
+        return cls(nodes, offsets, element[order].astype(np.int32), shape,
+                   r_range, theta_range)
+
+    @classmethod
+    def read(cls, f):
+        """
+        Read the index from an open database, see write. The control nodes
+        are the corner GLL points of the elements. If the database has no
+        index, it is built.
+
+        :param f: open database
+        :type f: h5netcdf.File or h5py.File
+        """
+        mesh = f['Mesh']
+        fem_mesh = mesh['fem_mesh'][:]
+        nodes = np.stack([mesh['mesh_S'][:][fem_mesh],
+                          mesh['mesh_Z'][:][fem_mesh]], axis=-1)
+        if 'spatial_index_offsets' not in mesh:
+            return cls.build(nodes)
+        attrs = mesh['spatial_index_offsets'].attrs
+        return cls(nodes, mesh['spatial_index_offsets'][:],
+                   mesh['spatial_index_elements'][:], attrs['shape'],
+                   attrs['r_range'], attrs['theta_range'])
+
+    def write(self, mesh_group):
+        """
+        Write the index to the Mesh group of a database.
+
+        :param mesh_group: Mesh group
+        :type mesh_group: h5netcdf.Group
+        """
+        mesh_group.dimensions['spatial_index_buckets'] = self.offsets.size
+        mesh_group.dimensions['spatial_index_entries'] = self.elements.size
+
+        offsets = mesh_group.create_variable(
+            'spatial_index_offsets', ('spatial_index_buckets', ), 'int64')
+        offsets[:] = self.offsets
+        offsets.attrs['shape'] = np.array(self.shape, dtype=np.int64)
+        offsets.attrs['r_range'] = np.array(self.r_range)
+        offsets.attrs['theta_range'] = np.array(self.theta_range)
+
+        elements = mesh_group.create_variable(
+            'spatial_index_elements', ('spatial_index_entries', ), 'int32')
+        elements[:] = self.elements
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.elements.nbytes
+
+    def get_bucket(self, s, z):
+        """
+        Bucket of each point, -1 outside of the grid.
+        """
+        r, theta = _polar(np.asarray(s, dtype=np.float64),
+                          np.asarray(z, dtype=np.float64))
+        nr, nt = self.shape
+        r_span = max(self.r_range[1] - self.r_range[0], 1e-300)
+        t_span = max(self.theta_range[1] - self.theta_range[0], 1e-300)
+
+        fr = (r - self.r_range[0]) / r_span
+        ft = (theta - self.theta_range[0]) / t_span
+        tol = DEFAULT_TOLERANCE
+        inside = (fr >= -tol) & (fr <= 1 + tol) & (ft >= -tol) & \
+            (ft <= 1 + tol)
+
+        ir = np.clip(np.floor(fr * nr).astype(np.int64), 0, nr - 1)
+        it = np.clip(np.floor(ft * nt).astype(np.int64), 0, nt - 1)
+        return np.where(inside, ir * nt + it, -1)
+
+    def contains(self, element, s, z, tolerance=DEFAULT_TOLERANCE):
+        """
+        Exact test whether points lie in elements: between the arcs of the
+        bottom and top edges and on the inner side of the straight side
+        edges.
+
+        :param element: element ids
+        :type element: numpy array of integers
+        :param s: s coordinates of the points, same shape as element
+        :type s: numpy array
+        :param z: z coordinates of the points, same shape as element
+        :type z: numpy array
+        :param tolerance: tolerance relative to the radius of the points
+        :type tolerance: float
+        """
+        s = np.asarray(s, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        nodes = self.nodes[element]
+        r = np.sqrt(s ** 2 + z ** 2)
+        r_node = np.sqrt((nodes ** 2).sum(axis=-1))
+        eps = tolerance * np.maximum(r, r_node.max(axis=-1))
+
+        inside = (r >= r_node[..., 0] - eps) & (r <= r_node[..., 3] + eps)
+
+        mp = nodes.mean(axis=-2)
+        for a, b in [(0, 3), (1, 2)]:
+            ex = nodes[..., b, 0] - nodes[..., a, 0]
+            ey = nodes[..., b, 1] - nodes[..., a, 1]
+            length = np.sqrt(ex ** 2 + ey ** 2)
+            side = _cross(ex, ey, s - nodes[..., a, 0],
+                          z - nodes[..., a, 1])
+            ref = _cross(ex, ey, mp[..., 0] - nodes[..., a, 0],
+                         mp[..., 1] - nodes[..., a, 1])
+            inside &= side * np.sign(ref) >= -eps * length
+        return inside
+
+    def locate(self, s, z, tolerance=DEFAULT_TOLERANCE):
+        """
+        Find the elements containing the points, vectorized over all
+        points. Points on shared edges are assigned to the element with the
+        lowest id.
+
+        :param s: s coordinates in the units of the mesh
+        :type s: numpy array
+        :param z: z coordinates in the units of the mesh
+        :type z: numpy array
+        :param tolerance: tolerance relative to the radius of the points
+        :type tolerance: float
+
+        :returns: element ids, -1 for points outside of the mesh
+        """
+        s = np.asarray(s, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        shape = np.broadcast(s, z).shape
+        s = np.broadcast_to(s, shape).ravel()
+        z = np.broadcast_to(z, shape).ravel()
+
+        bucket = self.get_bucket(s, z)
+        valid = np.where(bucket >= 0)[0]
+        start = self.offsets[bucket[valid]]
+        count = self.offsets[bucket[valid] + 1] - start
+
+        # all (point, candidate) pairs
+        point = np.repeat(valid, count)
+        k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count,
+                                               count)
+        candidate = self.elements[np.repeat(start, count) + k]
+        hit = self.contains(candidate, s[point], z[point], tolerance)
+
+        result = np.full(s.size, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(result, point[hit], candidate[hit])
+        result[result == np.iinfo(np.int64).max] = -1
+        return result.reshape(shape)
+
+    def map_to_reference(self, s, z, tolerance=DEFAULT_TOLERANCE):
+        """
+        Locate the points and compute their reference coordinates in the
+        containing elements in one vectorized pass, see locate and
+        map_spheroid.inverse_map_spheroid.
+
+        :returns: tuple of the element ids, xi and eta, -1 and nan for
+            points outside of the mesh and points where the inverse mapping
+            does not converge
+        """
+        s = np.asarray(s, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        element = self.locate(s, z, tolerance)
+        shape = element.shape
+        element = element.ravel()
+        s = np.broadcast_to(s, shape).ravel()
+        z = np.broadcast_to(z, shape).ravel()
+
+        xi = np.full(element.shape, np.nan)
+        eta = np.full(element.shape, np.nan)
+        found = np.where(element >= 0)[0]
+        xi[found], eta[found], converged = inverse_map_spheroid(
+            s[found], z[found], self.nodes[element[found]],
+            return_converged=True)
+
+        failed = found[~converged]
+        element[failed] = -1
+        xi[failed] = np.nan
+        eta[failed] = np.nan
+
+        return (element.reshape(shape), xi.reshape(shape),
+                eta.reshape(shape))
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Generate databases for a grid of periods, depths and distance ranges in
+parallel.
+
+    python -m isig.sweep -m prem.bm -p 50 25 -d 100 700 -r 0:180 30:90 -j 4
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import argparse
+import itertools
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from .mesh import get_mesh
+from .mesh_cache import MeshCache
+from .pipeline import (fix_negative_arguments, add_database_arguments,
+                       get_database_kwargs, validate_parameters,
+                       generate_database, get_storage)
+
+# the model is read once per worker process
+_worker = {}
+
+
+def _init_worker(model_file, cache_dir, cache_size):
+    from pymesher.models_1D import model
+    _worker['model'] = model.read(model_file)
+    _worker['model_file'] = model_file
+    _worker['cache'] = MeshCache(cache_dir, max_size=cache_size)
+
+
+def _mesh_kwargs(mesh_params):
+    return dict(zip(['period', 'elements_per_wavelength', 'max_depth',
+                     'min_dist', 'max_dist'], mesh_params))
+
+
+def _mesh_job(mesh_params):
+    get_mesh(_worker['model'], _worker['model_file'],
+             cache=_worker['cache'], **_mesh_kwargs(mesh_params))
+
+
+def _database_job(job):
+    filename, mesh_params, kwargs = job
+    kwargs = dict(kwargs, **_mesh_kwargs(mesh_params))
+    t = time.time()
+    info = generate_database(
+        _worker['model'], _worker['model_file'], filename,
+        cache=_worker['cache'], **kwargs)
+    info['wall_time'] = time.time() - t
+    return info
+
+
+def get_sweep_filename(model_name, period, max_depth, min_dist, max_dist):
+    """
+    default filename of a database in a sweep
+    """
+    return 'isig_%s_%gs_%dkm_%g-%gdeg.nc' % (
+        model_name, period, max_depth, min_dist, max_dist)
+
+
+def run_sweep(model_file, periods, max_depths, distance_ranges=((0., 180.),),
+              elements_per_wavelength=2., output_dir='.', nworkers=None,
+              cache_dir=None, cache_size=10 * 1024 ** 3, **kwargs):
+    """
+    Generate databases for all combinations of the periods, maximum depths
+    and distance ranges on a process pool.
+
+    Each worker reads the model once. Jobs that only differ in parameters
+    not affecting the mesh share it: all distinct meshes are created first
+    and put into a mesh cache, the databases are then generated from the
+    memory-mapped cached meshes.
+
+    :param model_file: path to the 1D model file
+    :type model_file: string
+    :param periods: shortest periods to resolve in seconds
+    :type periods: list of floats
+    :param max_depths: maximum source depths in km
+    :type max_depths: list of floats
+    :param distance_ranges: minimum and maximum epicentral distances in
+        degrees
+    :type distance_ranges: list of tuples of two floats
+    :param elements_per_wavelength: number of elements per wavelength
+    :type elements_per_wavelength: float
+    :param output_dir: directory for the databases
+    :type output_dir: string
+    :param nworkers: number of worker processes, defaults to the number of
+        cpus
+    :type nworkers: integer
+    :param cache_dir: mesh cache directory, a temporary directory that is
+        removed afterwards if not given
+    :type cache_dir: string
+    :param cache_size: maximum size of the mesh cache in bytes
+    :type cache_size: integer
+
+    Other keyword arguments are passed to create_db.
+
+    :returns: list of dictionaries with the parameters and properties of the
+        databases in the order of the grid, see pipeline.generate_database
+    """
+    from pymesher.models_1D import model
+    model_name = model.read(model_file).name
+
+    mesh_params = []
+    jobs = []
+    for period, max_depth, (min_dist, max_dist) in itertools.product(
+            periods, max_depths, distance_ranges):
+        validate_parameters(max_depth, min_dist, max_dist)
+        params = (period, elements_per_wavelength, max_depth, min_dist,
+                  max_dist)
+        if params not in mesh_params:
+            mesh_params.append(params)
+        filename = os.path.join(output_dir, get_sweep_filename(
+            model_name, period, max_depth, min_dist, max_dist))
+        jobs.append((filename, params, kwargs))
+
+    # the temporary cache holds all meshes of the sweep at once, meshes
+    # evicted from a size limited cache are recreated by the jobs
+    tmp_cache = cache_dir is None
+    if tmp_cache:
+        cache_dir = tempfile.mkdtemp(prefix='isig_mesh_cache_')
+        cache_size = float('inf')
+
+    pool = multiprocessing.Pool(nworkers, initializer=_init_worker,
+                                initargs=(model_file, cache_dir, cache_size))
+    try:
+        pool.map(_mesh_job, mesh_params, chunksize=1)
+        infos = pool.map(_database_job, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        if tmp_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return infos
+
+
+def get_sweep_summary(infos):
+    """
+    Table summarizing the databases of a sweep.
+    """
+    header = ('%-40s %8s %8s %13s %9s %10s %10s %8s' % (
+        'filename', 'period', 'depth', 'distance', 'elements', 'points',
+        'size [GB]', 'time [s]'))
+    lines = ['=' * len(header), header, '-' * len(header)]
+    for info in infos:
+        lines.append('%-40s %8.2f %8.1f %6.1f-%6.1f %9d %10d %10.4f %8.2f' % (
+            os.path.basename(info['filename']), info['period'],
+            info['max_depth'], info['min_dist'], info['max_dist'],
+            info['nelem'], info['npoints'], get_storage(info),
+            info.get('wall_time', float('nan'))))
+    lines.append('=' * len(header))
+    return '\n'.join(lines)
+
+
+def _distance_range(arg):
+    try:
+        min_dist, max_dist = map(float, arg.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'distance range must be given as min:max, got %s' % (arg,))
+    return min_dist, max_dist
+
+
+if __name__ == "__main__":
+
+    fix_negative_arguments(sys.argv)
+
+    parser = argparse.ArgumentParser(
+        prog="python -m isig.sweep",
+        description='Generate Instaseis inputs for Sismosphere for a grid '
+                    'of parameters.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument(
+        '-m', '--model_file', type=str, required=True,
+        help='path to 1D model in deck file format (or any other format '
+             'compatible with salvus mesher)')
+
+    parser.add_argument(
+        '-p', '--periods', type=float, nargs='+', default=[50.],
+        help='Shortest periods to resolve.')
+
+    parser.add_argument(
+        '-d', '--max_depths', type=float, nargs='+', default=[100.],
+        help='Maximum source depths in km.')
+
+    parser.add_argument(
+        '-r', '--distance_ranges', type=_distance_range, nargs='+',
+        default=[(0., 180.)],
+        help='Epicentral distance ranges in degrees as min:max.')
+
+    parser.add_argument(
+        '-j', '--nworkers', type=int, default=None,
+        help='Number of worker processes, defaults to the number of cpus.')
+
+    parser.add_argument(
+        '--output_dir', type=str, default='.',
+        help='Directory for the databases.')
+
+    add_database_arguments(parser)
+
+    args = parser.parse_args()
+
+    infos = run_sweep(
+        args.model_file, args.periods, args.max_depths,
+        distance_ranges=args.distance_ranges,
+        elements_per_wavelength=args.elements_per_wavelength,
+        output_dir=args.output_dir, nworkers=args.nworkers,
+        cache_dir=args.cache_dir,
+        cache_size=int(args.cache_size * 1024 ** 3),
+        **get_database_kwargs(args))
+
+    print(get_sweep_summary(infos))
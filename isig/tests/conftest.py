@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Shared fixtures of the tests: the model and the small mesh most database
+tests are run on.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def model():
+    """
+    the built-in anisotropic PREM model
+    """
+    # imported here so the tests not needing pymesher run without it
+    from pymesher import models_1D
+    return models_1D.model.built_in('prem_ani')
+
+
+@pytest.fixture
+def mesh(model):
+    """
+    unstructured 2D mesh of the two outermost layers of PREM and a single
+    layer below, between 0 and 45 degrees colatitude
+    """
+    from pymesher import Skeleton
+
+    discontinuities = model.discontinuities[[0, -3, -2, -1]]
+    hmax = np.ones(len(discontinuities) - 1) * 0.5
+
+    sk = Skeleton.create_spherical_nonconforming_mesh(
+        discontinuities, hmax, refinement_factor=2, ndim=2, min_colat=0.,
+        max_colat=45.)
+    return sk.get_unstructured_mesh()
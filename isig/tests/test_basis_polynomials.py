@@ -10,7 +10,9 @@ Tests for interpolating polynomial bases and there derivatives.
 """
 import numpy as np
 
-from ..basis_polynomials import lagrange_basis_derivative_matrix
+from ..basis_polynomials import (lagrange_basis_derivative_matrix,
+                                 lagrange_basis_derivative_matrix_sympy,
+                                 lagrange_basis)
 from ..gll import gauss_lobatto_legendre_quadruature_points_weights_fast
 
 
@@ -32,3 +34,38 @@ def test_lagrange_basis_derivative_matrix():
     points = gauss_lobatto_legendre_quadruature_points_weights_fast(5)[0]
     derivative = lagrange_basis_derivative_matrix(points)
     np.testing.assert_allclose(derivative, ref_derivative, atol=1e-15)
+
+
+def test_lagrange_basis_derivative_matrix_sympy():
+
+    for n in [2, 4, 7]:
+        points = gauss_lobatto_legendre_quadruature_points_weights_fast(n)[0]
+        np.testing.assert_allclose(
+            lagrange_basis_derivative_matrix(points),
+            lagrange_basis_derivative_matrix_sympy(points), atol=1e-12)
+
+
+def test_lagrange_basis():
+
+    n = 6
+    points = gauss_lobatto_legendre_quadruature_points_weights_fast(n)[0]
+
+    # at the interpolation points the basis is the identity and the
+    # derivatives are the derivative matrix
+    basis, dbasis = lagrange_basis(points, points, derivative=True)
+    np.testing.assert_allclose(basis, np.eye(n), atol=1e-15)
+    np.testing.assert_allclose(
+        dbasis, lagrange_basis_derivative_matrix(points), atol=1e-15)
+
+    # polynomials of order n - 1 are interpolated exactly
+    x = np.linspace(-1., 1., 21).reshape((3, 7)) * 0.99
+    basis, dbasis = lagrange_basis(points, x, derivative=True)
+    assert basis.shape == (3, 7, n)
+    assert dbasis.shape == (3, 7, n)
+
+    f = points ** 5 - 2 * points ** 2
+    np.testing.assert_allclose(basis.dot(f), x ** 5 - 2 * x ** 2, atol=1e-14)
+    np.testing.assert_allclose(dbasis.dot(f), 5 * x ** 4 - 4 * x, atol=1e-13)
+
+    np.testing.assert_allclose(lagrange_basis(points, 0.3).sum(), 1.,
+                               atol=1e-15)
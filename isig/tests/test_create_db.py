@@ -8,27 +8,182 @@ A new python script.
 :license:
     None
 '''
+import h5netcdf
 import numpy as np
-from pymesher import Skeleton, models_1D
 import os
+import pytest
 
-from ..create_db import create_db
+from ..instrumentation import Instrumentation
+from ..create_db import (create_db, get_snapshot_chunks,
+                         get_read_amplification)
 
 
-def test_create_db():
+def test_create_db(model, mesh):
 
-    mod = models_1D.model.built_in('prem_ani')
     npol = 5
-    discontinuities = mod.discontinuities
-    discontinuities = discontinuities[[0, -3, -2, -1]]
-    nlayer = len(discontinuities) - 1
-    hmax = np.ones(nlayer) * 0.5
 
-    sk = Skeleton.create_spherical_nonconforming_mesh(
-        discontinuities, hmax, refinement_factor=2, ndim=2, min_colat=0.,
-        max_colat=45.)
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol)
+    os.remove('test.h5')
+
+
+def test_create_db_unique_points(model, mesh):
+
+    npol = 5
+
+    info = create_db('test.h5', model, mesh.points, mesh.connectivity, npol)
+    info_unique = create_db('test_unique.h5', model, mesh.points,
+                            mesh.connectivity, npol, unique_points=True)
+
+    assert info['npoints'] == mesh.nelem * npol ** 2
+    assert info_unique['npoints'] < info['npoints']
+
+    with h5netcdf.File('test.h5', 'r') as f, \
+            h5netcdf.File('test_unique.h5', 'r') as fu:
+        sem = f['Mesh/sem_mesh'][:]
+        sem_unique = fu['Mesh/sem_mesh'][:]
+        assert sem_unique.max() == info_unique['npoints'] - 1
+
+        for var in ['mesh_S', 'mesh_Z', 'mesh_mu']:
+            np.testing.assert_allclose(
+                fu['Mesh'][var][:][sem_unique], f['Mesh'][var][:][sem],
+                rtol=1e-6)
+
+    os.remove('test.h5')
+    os.remove('test_unique.h5')
+
+
+def test_create_db_memory_budget(model, mesh):
+
+    npol = 5
+
+    # a tiny memory budget processes a single element at a time
+    for unique_points in [False, True]:
+        create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+                  unique_points=unique_points)
+        create_db('test_chunked.h5', model, mesh.points, mesh.connectivity,
+                  npol, unique_points=unique_points, memory_budget=1)
+
+        with h5netcdf.File('test.h5', 'r') as f, \
+                h5netcdf.File('test_chunked.h5', 'r') as fc:
+            for var in f['Mesh'].variables:
+                np.testing.assert_array_equal(fc['Mesh'][var][:],
+                                              f['Mesh'][var][:])
+
+    os.remove('test.h5')
+    os.remove('test_chunked.h5')
+
+
+def test_get_snapshot_chunks():
+
+    # large elements are stored one per chunk
+    chunks = get_snapshot_chunks(5, 3600)
+    assert chunks == (1, 5, 5, 5, 3600)
+    assert get_read_amplification(chunks, (100, 5, 5, 5, 3600)) == 1.
+
+    # small elements are grouped
+    chunks = get_snapshot_chunks(5, 100)
+    assert chunks[0] > 1
+    assert chunks[1:] == (5, 5, 5, 100)
+
+    chunks = get_snapshot_chunks(5, 1000, chunk_elements=2,
+                                 chunk_snapshots=300)
+    assert chunks == (2, 5, 5, 5, 300)
+    np.testing.assert_allclose(
+        get_read_amplification(chunks, (100, 5, 5, 5, 1000)), 2.4)
+
+
+def test_create_db_compression(model, mesh):
+
+    npol = 5
+
+    info = create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+                     npts=100, chunks=(2, 5, 5, 5, 50), compression='gzip',
+                     compression_opts=2, shuffle=True)
+    assert info['snapshot_chunks'] == (2, 5, 5, 5, 50)
+
+    with h5netcdf.File('test.h5', 'r') as f:
+        var = f['MergedSnapshots']
+        assert var.chunks == (2, 5, 5, 5, 50)
+        assert var.compression == 'gzip'
+        assert var.compression_opts == 2
+        assert var.shuffle
+
+    os.remove('test.h5')
+
+
+def test_create_db_instrumentation(model, mesh):
+
+    npol = 5
+
+    instr = Instrumentation()
+    info = create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+                     instrumentation=instr)
+    os.remove('test.h5')
+
+    report = instr.to_dict()
+    for stage in ['create_db', 'quadrature', 'map_spheroid',
+                  'model_evaluation', 'write']:
+        assert stage in report['stages']
+    assert report['bytes_written']['/Mesh/mesh_S'] == info['npoints'] * 4
+
+
+def test_create_db_jacobian(model, mesh):
+
+    npol = 5
+
+    with pytest.raises(ValueError):
+        create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+                  unique_points=True, jacobian=True)
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+              jacobian=True)
+
+    with h5netcdf.File('test.h5', 'r') as f:
+        mesh_group = f['Mesh']
+        s = mesh_group['mesh_S'][:].reshape((-1, npol, npol))
+        z = mesh_group['mesh_Z'][:].reshape((-1, npol, npol))
+        g2 = mesh_group['G2'][:]
+        dxi_dS = mesh_group['mesh_dxi_dS'][:].reshape((-1, npol, npol))
+        deta_dS = mesh_group['mesh_deta_dS'][:].reshape((-1, npol, npol))
+        assert np.all(mesh_group['mesh_jacobian'][:] > 0.)
+
+    # the derivative of S with respect to S is one, computed by contraction
+    # with the derivative matrix as in the strain computation
+    ds_dxi = np.einsum('ik,ejk->eji', g2, s.astype(np.float64))
+    ds_deta = np.einsum('jk,eki->eji', g2, s.astype(np.float64))
+    np.testing.assert_allclose(ds_dxi * dxi_dS + ds_deta * deta_dS, 1.,
+                               atol=1e-3)
+    assert z.shape == s.shape
+
+    os.remove('test.h5')
+
+
+def test_create_db_nthreads(model, mesh):
+
+    npol = 5
+
+    # the database does not depend on the number of threads
+    for unique_points in [False, True]:
+        info = create_db('test.h5', model, mesh.points, mesh.connectivity,
+                         npol, unique_points=unique_points,
+                         jacobian=not unique_points)
+        info_threads = create_db(
+            'test_threads.h5', model, mesh.points, mesh.connectivity, npol,
+            unique_points=unique_points, jacobian=not unique_points,
+            nthreads=4)
+        assert info_threads['npoints'] == info['npoints']
+        assert info_threads['model_evaluations'] == \
+            info['model_evaluations']
 
-    m = sk.get_unstructured_mesh()
+        with h5netcdf.File('test.h5', 'r') as f, \
+                h5netcdf.File('test_threads.h5', 'r') as ft:
+            for var in f['Mesh'].variables:
+                np.testing.assert_array_equal(ft['Mesh'][var][:],
+                                              f['Mesh'][var][:])
+            for attr in ['kernel wavefield rmin', 'kernel wavefield rmax',
+                         'kernel wavefield colatmin',
+                         'kernel wavefield colatmax']:
+                assert ft.attrs[attr] == f.attrs[attr]
 
-    create_db('test.h5', mod, m.points, m.connectivity, npol)
     os.remove('test.h5')
+    os.remove('test_threads.h5')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the read-side database access.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import h5py
+import numpy as np
+import os
+
+from ..create_db import create_db
+from ..database import Database, ElementCache
+from ..interpolation import interpolate_database
+
+
+def test_element_cache():
+    cache = ElementCache(max_size=24)
+    for e in np.arange(3):
+        cache.put(e, np.zeros(1) + e)
+    assert cache.get(0)[0] == 0.
+    cache.put(3, np.zeros(1))
+    # 1 was the least recently used
+    assert 1 not in cache
+    assert cache.get(1) is None
+    assert len(cache) == 3 and cache.size == 24
+    cache.put(4, np.zeros(4))
+    assert 4 not in cache
+
+    stats = cache.stats
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+
+def test_database(model, mesh):
+
+    npol = 5
+    npts = 3
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+              npts=npts)
+
+    rng = np.random.RandomState(0)
+    data = rng.randn(mesh.nelem, 5, npol, npol, npts).astype(np.float32)
+    with h5netcdf.File('test.h5', 'r+') as f:
+        f['MergedSnapshots'][:] = data
+        mesh_S = f['Mesh/mesh_S'][:]
+        mp_S = f['Mesh/mp_mesh_S'][:]
+        mp_Z = f['Mesh/mp_mesh_Z'][:]
+        expected = interpolate_database(f, mp_S, mp_Z)
+
+    element_bytes = 5 * npol ** 2 * npts * 4
+    with Database('test.h5', cache_size=4 * element_bytes) as db:
+        assert db.nelem == mesh.nelem and db.npol == npol and db.npts == npts
+
+        # contiguous mesh arrays are memory-mapped
+        assert isinstance(db.mesh('mesh_S'), np.memmap)
+        np.testing.assert_equal(db.mesh('mesh_S'), mesh_S)
+
+        np.testing.assert_equal(db.get_element(3), data[3])
+        np.testing.assert_equal(db.get_element(3), data[3])
+        assert db.cache.stats['hits'] == 1
+        assert db.cache.stats['misses'] == 1
+
+        elements = [5, 3, 6, 5, 1]
+        np.testing.assert_equal(db.get_elements(elements), data[elements])
+        assert len(db.cache) == 4
+
+        np.testing.assert_equal(db.interpolate(mp_S, mp_Z), expected)
+
+    os.remove('test.h5')
+
+
+def test_database_modal_cache(tmpdir, model, mesh, monkeypatch):
+
+    npol = 5
+    fname = str(tmpdir.join('test.h5'))
+    create_db(fname, model, mesh.points, mesh.connectivity, npol, npts=3,
+              compression='gzip', modal_tolerance=1e-3)
+
+    reads = []
+    getitem = h5py.Dataset.__getitem__
+
+    def counting_getitem(self, *args, **kwargs):
+        reads.append(self.name)
+        return getitem(self, *args, **kwargs)
+
+    elements = np.arange(mesh.nelem)
+    with Database(fname) as db:
+        expected = db.get_elements(elements)
+        monkeypatch.setattr(h5py.Dataset, '__getitem__', counting_getitem)
+
+        # fully cached elements are served without any file reads
+        np.testing.assert_equal(db.get_elements(elements), expected)
+        assert db.nelem == mesh.nelem and db.npts == 3
+        assert reads == []
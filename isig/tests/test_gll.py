@@ -11,7 +11,8 @@ Tests for quadrature points and weights.
 """
 import numpy as np
 
-from ..gll import gauss_lobatto_legendre_quadruature_points_weights_fast
+from ..gll import (gauss_lobatto_legendre_quadruature_points_weights_fast,
+                   gauss_lobatto_jacobi_golub_welsch)
 
 
 def test_gauss_lobatto_legendre_quadruature_points_weights_fast():
@@ -28,3 +29,29 @@ def test_gauss_lobatto_legendre_quadruature_points_weights_fast():
     p, w = gauss_lobatto_legendre_quadruature_points_weights_fast(n)
     np.testing.assert_allclose(p, -p[::-1], atol=1e-15)
     np.testing.assert_allclose(w, w[::-1], atol=1e-15)
+
+
+def test_gauss_lobatto_jacobi_golub_welsch():
+
+    for n in [2, 5, 20]:
+        p, w = gauss_lobatto_jacobi_golub_welsch(n)
+        p_ref, w_ref = \
+            gauss_lobatto_legendre_quadruature_points_weights_fast(n)
+        np.testing.assert_allclose(p, p_ref, atol=1e-15)
+        np.testing.assert_allclose(w, w_ref, atol=1e-14)
+
+    # high order: exact integration of polynomials up to degree 2n - 3
+    n = 200
+    p, w = gauss_lobatto_jacobi_golub_welsch(n)
+    np.testing.assert_allclose(p, -p[::-1], atol=1e-15)
+    np.testing.assert_allclose((w * p ** 2).sum(), 2. / 3., rtol=1e-13)
+    np.testing.assert_allclose((w * p ** 396).sum(), 2. / 397., rtol=1e-10)
+
+    # GLJ(0, 1) points as used for the axis elements in AxiSEM
+    p, w = gauss_lobatto_jacobi_golub_welsch(5, 0., 1.)
+    np.testing.assert_allclose(
+        p, [-1., -0.50778762955831, 0.13230082077039, 0.70882014212126, 1.],
+        atol=1e-13)
+    # integrates f(x) (1 + x) exactly
+    np.testing.assert_allclose(w.sum(), 2., rtol=1e-14)
+    np.testing.assert_allclose((w * p ** 3).sum(), 2. / 5., atol=1e-14)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the global numbering of GLL points.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+
+from ..global_numbering import get_global_numbering, hash_points
+
+
+def test_get_global_numbering():
+    x = np.array([[0., 1., 2.], [2., 3., 1. + 1e-12]])
+    y = np.array([[0., 0., 0.], [0., 0., 1e-12]])
+
+    ids, unique_index = get_global_numbering(x, y, tolerance=1e-8)
+
+    np.testing.assert_array_equal(ids, [[0, 1, 2], [2, 3, 1]])
+    np.testing.assert_array_equal(unique_index, [0, 1, 2, 4])
+    np.testing.assert_array_equal(x.ravel()[unique_index], [0., 1., 2., 3.])
+
+    # points in different layers are not merged
+    layer = np.array([[0], [1]])
+    ids, unique_index = get_global_numbering(x, y, tolerance=1e-8,
+                                             layer=layer)
+    np.testing.assert_array_equal(ids, [[0, 1, 2], [3, 4, 5]])
+    np.testing.assert_array_equal(unique_index, np.arange(6))
+
+
+def test_get_global_numbering_cell_boundary():
+    # coincident points on both sides of a grid cell boundary
+    tolerance = 1e-8
+    k = 12345
+    x = np.array([(k + 0.5) * tolerance - 1e-17,
+                  (k + 0.5) * tolerance + 1e-17, 1., 2.])
+    y = np.array([(k - 0.5) * tolerance + 1e-17,
+                  (k - 0.5) * tolerance - 1e-17, 1., 1. + 1e-12])
+    keys = hash_points(x, y, tolerance)
+    assert keys[0][0] != keys[0][1] and keys[1][0] != keys[1][1]
+
+    ids, unique_index = get_global_numbering(x, y, tolerance=tolerance)
+    np.testing.assert_array_equal(ids, [0, 0, 1, 2])
+    np.testing.assert_array_equal(unique_index, [0, 2, 3])
+
+    # grid extents too large for a single integer code
+    ids, _ = get_global_numbering(np.append(x, 1e10), np.append(y, 0.),
+                                  tolerance=tolerance)
+    np.testing.assert_array_equal(ids, [0, 0, 1, 2, 3])
+
+    # unless they are in different layers
+    ids, _ = get_global_numbering(x, y, tolerance=tolerance,
+                                  layer=[0, 1, 0, 0])
+    np.testing.assert_array_equal(ids, [0, 1, 2, 3])
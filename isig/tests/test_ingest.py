@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for filling MergedSnapshots from snapshot files.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+import pytest
+import threading
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+from ..create_db import create_db
+from ..ingest import (ingest_snapshots, load_snapshot_files, get_block_size,
+                      _reader)
+from ..instrumentation import Instrumentation
+from ..sampling import decimate
+
+
+def test_get_block_size():
+    # one element with 3600 samples is 1800000 bytes, 3 buffers
+    assert get_block_size(5, 5, 3600, memory_budget=10 * 1800000) == 3
+    assert get_block_size(5, 5, 3600, chunk_elements=2,
+                          memory_budget=10 * 1800000) == 2
+    assert get_block_size(5, 5, 3600, chunk_elements=4,
+                          memory_budget=10 * 1800000) == 3
+    assert get_block_size(5, 5, 3600, memory_budget=1) == 1
+    # decimation pads the block and allocates the output and a temporary
+    assert get_block_size(5, 5, 3600, memory_budget=10 * 1800000,
+                          decimation=4) == 2
+
+
+def test_reader_stop():
+
+    class Snapshots(object):
+        # counts the snapshots read
+        def __init__(self, data):
+            self.data = data
+            self.nread = 0
+
+        def __len__(self):
+            return len(self.data)
+
+        def __getitem__(self, index):
+            self.nread += 1
+            return self.data[index]
+
+    npol = 2
+    nelem = 20
+    snapshots = Snapshots(np.zeros((3, 5, nelem * npol ** 2),
+                                   dtype=np.float32))
+    sem = np.arange(nelem * npol ** 2).reshape((nelem, npol, npol))
+    ranges = [(i, i + 1) for i in range(nelem)]
+
+    # the consumer fails after the first block, the reader stops with the
+    # blocks in flight instead of reading all of them
+    q = queue.Queue(maxsize=1)
+    stop_event = threading.Event()
+    reader = threading.Thread(
+        target=_reader, args=(snapshots, sem, 5, ranges, q, stop_event,
+                              Instrumentation(enabled=False)))
+    reader.start()
+    q.get()
+    stop_event.set()
+    while reader.is_alive():
+        try:
+            q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    reader.join()
+    assert snapshots.nread <= 3 * 3
+
+
+@pytest.mark.parametrize('unique_points', [False, True])
+def test_ingest_snapshots(tmpdir, unique_points, model, mesh):
+
+    npol = 5
+    npts = 7
+
+    fname = str(tmpdir.join('test.h5'))
+    info = create_db(fname, model, mesh.points, mesh.connectivity, npol,
+                     npts=npts, unique_points=unique_points)
+
+    # time-major snapshots with known values at each point
+    rng = np.random.RandomState(0)
+    data = rng.randn(npts, 5, info['npoints']).astype(np.float32)
+    filenames = []
+    for it in np.arange(npts):
+        filenames.append(str(tmpdir.join('snapshot_%04d.npy' % it)))
+        np.save(filenames[-1], data[it])
+
+    stf = np.arange(npts, dtype=np.float32)
+
+    # small budget to get several blocks of elements
+    result = ingest_snapshots(fname, load_snapshot_files(filenames),
+                              memory_budget=30 * 5 * npol ** 2 * npts * 4,
+                              stf=stf)
+    assert result['block_size'] < mesh.nelem
+    assert result['bytes_written'] == mesh.nelem * 5 * npol ** 2 * npts * 4
+
+    with h5netcdf.File(fname, 'r') as f:
+        sem = f['Mesh/sem_mesh'][:]
+        snapshots = f['MergedSnapshots'][:]
+        np.testing.assert_equal(f['stf_dump'][:], stf)
+
+    expected = data[:, :, sem].transpose((2, 1, 3, 4, 0))
+    np.testing.assert_equal(snapshots, expected)
+
+    with pytest.raises(ValueError):
+        ingest_snapshots(fname, data[:-1])
+
+    os.remove(fname)
+
+
+def test_ingest_snapshots_decimation(tmpdir, model, mesh):
+
+    npol = 5
+    npts = 20
+    decimation = 3
+
+    fname = str(tmpdir.join('test.h5'))
+    info = create_db(fname, model, mesh.points, mesh.connectivity, npol,
+                     npts=npts)
+
+    nin = (npts - 1) * decimation + 1
+    rng = np.random.RandomState(0)
+    data = rng.randn(nin, 5, info['npoints']).astype(np.float32)
+    stf = np.sin(np.arange(nin) * 0.1)
+
+    with pytest.raises(ValueError):
+        ingest_snapshots(fname, data)
+
+    ingest_snapshots(fname, data, stf=stf, decimation=decimation,
+                     memory_budget=30 * 5 * npol ** 2 * nin * 4)
+
+    with h5netcdf.File(fname, 'r') as f:
+        sem = f['Mesh/sem_mesh'][:]
+        snapshots = f['MergedSnapshots'][:]
+        np.testing.assert_allclose(f['stf_dump'][:],
+                                   decimate(stf, decimation), rtol=1e-6)
+
+    expected = decimate(data.transpose((1, 2, 0)), decimation)
+    expected = expected[:, sem].transpose((1, 0, 2, 3, 4))
+    np.testing.assert_allclose(snapshots, expected, rtol=1e-5, atol=1e-6)
+
+    os.remove(fname)
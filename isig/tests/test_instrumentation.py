@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the stage timers and I/O counters.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import json
+import threading
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+from ..instrumentation import Instrumentation, get_report_filename
+
+
+def test_instrumentation(tmpdir):
+    with Instrumentation(trace_memory=True) as instr:
+        for i in range(3):
+            with instr.stage('a'):
+                time.sleep(0.01)
+                x = bytearray(1024 ** 2)
+        del x
+        with instr.stage('b'):
+            pass
+
+        # the peak of a nested stage counts for the enclosing stage, later
+        # stages do not include the peaks of earlier ones
+        with instr.stage('c'):
+            with instr.stage('d'):
+                x = bytearray(4 * 1024 ** 2)
+                del x
+            y = bytearray(1024)
+        del y
+    assert tracemalloc is None or not tracemalloc.is_tracing()
+
+    instr.add_bytes('/Mesh/mesh_S', 100)
+    instr.add_bytes('/Mesh/mesh_S', 50)
+    instr.add_bytes('/Mesh/mesh_Z', 10)
+
+    report = instr.to_dict()
+    assert list(report['stages']) == ['a', 'b', 'd', 'c']
+    assert report['stages']['a']['calls'] == 3
+    assert report['stages']['a']['wall_time'] >= 0.03
+    assert 1024 ** 2 <= report['stages']['a']['peak_traced'] < \
+        2 * 1024 ** 2
+    assert report['stages']['b']['peak_traced'] < 1024 ** 2
+    assert report['stages']['c']['peak_traced'] >= 4 * 1024 ** 2
+    assert report['stages']['d']['peak_traced'] >= 4 * 1024 ** 2
+    assert report['stages']['a']['rss_increase'] >= 0
+    assert report['peak_rss'] > 0
+    assert report['bytes_written'] == {'/Mesh/mesh_S': 150,
+                                       '/Mesh/mesh_Z': 10}
+    assert report['total_bytes_written'] == 160
+
+    fname = str(tmpdir.join('report.json'))
+    instr.write_json(fname)
+    with open(fname) as f:
+        assert json.load(f)['total_bytes_written'] == 160
+
+
+def test_instrumentation_threads():
+    with Instrumentation(trace_memory=True) as instr:
+
+        def worker():
+            with instr.stage('worker'):
+                x = bytearray(1024 ** 2)
+                del x
+
+        with instr.stage('main'):
+            x = bytearray(4 * 1024 ** 2)
+            del x
+            threads = [threading.Thread(target=worker) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+    # workers only count calls and time and leave the peak of the
+    # enclosing stage alone
+    stages = instr.to_dict()['stages']
+    assert stages['worker']['calls'] == 4
+    assert stages['worker']['rss_increase'] is None
+    assert 'peak_traced' not in stages['worker']
+    assert stages['main']['peak_traced'] >= 4 * 1024 ** 2
+
+
+def test_instrumentation_disabled():
+    instr = Instrumentation(enabled=False)
+    with instr.stage('a'):
+        pass
+    instr.add_bytes('/Mesh/mesh_S', 100)
+
+    report = instr.to_dict()
+    assert len(report['stages']) == 0
+    assert report['total_bytes_written'] == 0
+
+
+def test_get_report_filename():
+    assert get_report_filename('db.nc') == 'db.json'
+    assert get_report_filename('db') == 'db.json'
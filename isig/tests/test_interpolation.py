@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for interpolating MergedSnapshots at many points.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+
+from ..create_db import create_db
+from ..gll import gauss_lobatto_legendre_quadruature_points_weights_fast as \
+    get_gll
+from ..interpolation import (interpolate, interpolate_database,
+                             get_interpolation_weights)
+
+
+def test_get_interpolation_weights():
+    gll = get_gll(4)[0]
+    w = get_interpolation_weights(gll, gll[[1, 3]], gll[[2, 0]])
+    assert w.shape == (2, 4, 4)
+    assert w[0, 2, 1] == 1. and w[1, 0, 3] == 1.
+    np.testing.assert_allclose(w.sum(axis=(1, 2)), 1.)
+
+
+def test_interpolate():
+    npol = 5
+    nelem = 6
+    npts = 3
+    gll = get_gll(npol)[0]
+
+    # polynomial of degree npol - 1, different in each element, variable
+    # and snapshot, is interpolated exactly
+    rng = np.random.RandomState(0)
+    c = rng.randn(nelem, 5, npts, 3)
+
+    def field(e, xi, eta):
+        return (c[e, :, :, 0] + c[e, :, :, 1] * xi ** 4 +
+                c[e, :, :, 2] * xi * eta ** 3)
+
+    snapshots = np.zeros((nelem, 5, npol, npol, npts), dtype=np.float32)
+    for e in np.arange(nelem):
+        for j in np.arange(npol):
+            for i in np.arange(npol):
+                snapshots[e, :, j, i] = field(e, gll[i], gll[j])
+
+    element = np.array([3, 0, -1, 3, 5, 3, 1])
+    xi = rng.uniform(-1, 1, element.size)
+    eta = rng.uniform(-1, 1, element.size)
+
+    # many points in one element, in groups of two elements worth of data
+    element = np.concatenate([element, np.full(100, 3)])
+    xi = np.concatenate([xi, rng.uniform(-1, 1, 100)])
+    eta = np.concatenate([eta, rng.uniform(-1, 1, 100)])
+    element_bytes = 5 * npol ** 2 * npts * 4
+
+    for memory_budget in [1, 2 * element_bytes, 2 ** 20]:
+        result = interpolate(snapshots, gll, element, xi, eta,
+                             memory_budget=memory_budget)
+        assert result.shape == (107, 5, npts)
+        assert result.dtype == np.float32
+        assert np.all(np.isnan(result[2]))
+        for p in [0, 1] + list(range(3, 107)):
+            np.testing.assert_allclose(
+                result[p], field(element[p], xi[p], eta[p]), rtol=1e-5,
+                atol=1e-5)
+
+
+def test_interpolate_database(model, mesh):
+
+    npol = 5
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol, npts=2,
+              spatial_index=True)
+
+    # the element midpoints are GLL points for odd npol, so a wavefield
+    # equal to s and z is reproduced there
+    with h5netcdf.File('test.h5', 'r+') as f:
+        s = f['Mesh/mesh_S'][:][f['Mesh/sem_mesh'][:]]
+        z = f['Mesh/mesh_Z'][:][f['Mesh/sem_mesh'][:]]
+        data = np.zeros(f['MergedSnapshots'].shape, dtype=np.float32)
+        data[:, 0, :, :, 0] = s / model.scale
+        data[:, 1, :, :, 1] = z / model.scale
+        f['MergedSnapshots'][:] = data
+
+    with h5netcdf.File('test.h5', 'r') as f:
+        mp_S = f['Mesh/mp_mesh_S'][:]
+        mp_Z = f['Mesh/mp_mesh_Z'][:]
+        result = interpolate_database(f, mp_S, mp_Z)
+
+    np.testing.assert_allclose(result[:, 0, 0], mp_S / model.scale, atol=1e-5)
+    np.testing.assert_allclose(result[:, 1, 1], mp_Z / model.scale, atol=1e-5)
+
+    os.remove('test.h5')
@@ -9,7 +9,8 @@ Tests for spheroidal mapping.
     None
 '''
 import numpy as np
-from ..map_spheroid import map_spheroid
+from ..map_spheroid import (map_spheroid, inverse_map_spheroid,
+                            jacobian_spheroid)
 from pymesher import Skeleton
 
 
@@ -39,3 +40,105 @@ def test_map_spheroid():
 
     np.testing.assert_allclose(px, gll_x.flatten(), atol=1e-15)
     np.testing.assert_allclose(py, gll_y.flatten(), atol=1e-15)
+
+
+def test_map_spheroid_blocks_and_buffers():
+    # two elements of a regular annulus, given as control nodes
+    r = np.array([.5, .5, 1., 1.])
+    nodes = np.zeros((2, 4, 2))
+    for i, t in enumerate([(0., .3), (.3, .6)]):
+        theta = np.array([t[0], t[1], t[1], t[0]])
+        nodes[i, :, 0] = r * np.sin(theta)
+        nodes[i, :, 1] = r * np.cos(theta)
+
+    gll_points = np.array([-1., 0., 1.])
+    gll_x, gll_y = map_spheroid(gll_points, nodes, block_size=None)
+
+    # points on the bottom and top edges lie on the circles
+    np.testing.assert_allclose((gll_x[:, 0] ** 2 + gll_y[:, 0] ** 2) ** 0.5,
+                               .5, atol=1e-15)
+    np.testing.assert_allclose((gll_x[:, -1] ** 2 + gll_y[:, -1] ** 2) ** 0.5,
+                               1., atol=1e-15)
+
+    # block size does not change the result
+    gll_x1, gll_y1 = map_spheroid(gll_points, nodes, block_size=1)
+    np.testing.assert_array_equal(gll_x, gll_x1)
+    np.testing.assert_array_equal(gll_y, gll_y1)
+
+    # writing to single precision buffers
+    out = (np.zeros((2, 3, 3), dtype='float32'),
+           np.zeros((2, 3, 3), dtype='float32'))
+    ret = map_spheroid(gll_points, nodes, out=out)
+    assert ret[0] is out[0]
+    assert ret[1] is out[1]
+    np.testing.assert_allclose(out[0], gll_x, rtol=1e-7)
+    np.testing.assert_allclose(out[1], gll_y, rtol=1e-7)
+
+    gll_x32, _ = map_spheroid(gll_points, nodes, dtype=np.float32)
+    assert gll_x32.dtype == np.float32
+
+
+def test_inverse_map_spheroid():
+    # a radial element and a refinement element with slanted sides
+    nodes = np.zeros((2, 4, 2))
+    for i, (r, t) in enumerate([((.5, .5, 1., 1.), (0., .3, .3, 0.)),
+                                ((.5, .5, 1., 1.), (.3, .6, .5, .4))]):
+        r = np.array(r)
+        t = np.array(t)
+        nodes[i, :, 0] = r * np.sin(t)
+        nodes[i, :, 1] = r * np.cos(t)
+
+    points = np.array([-1., -.3, .2, 1.])
+    x, y = map_spheroid(points, nodes)
+    xi = np.broadcast_to(points[np.newaxis, np.newaxis, :], x.shape)
+    eta = np.broadcast_to(points[np.newaxis, :, np.newaxis], x.shape)
+
+    _nodes = nodes.repeat(16, axis=0)
+    xi_inv, eta_inv = inverse_map_spheroid(x.ravel(), y.ravel(), _nodes)
+    np.testing.assert_allclose(xi_inv, xi.ravel(), atol=1e-12)
+    np.testing.assert_allclose(eta_inv, eta.ravel(), atol=1e-12)
+
+    # without iterations no point is known to have converged
+    converged = inverse_map_spheroid(x.ravel(), y.ravel(), _nodes,
+                                     return_converged=True)[2]
+    assert np.all(converged)
+    converged = inverse_map_spheroid(x.ravel(), y.ravel(), _nodes,
+                                     maxiter=0, return_converged=True)[2]
+    assert not np.any(converged)
+    # degenerate element
+    with np.errstate(divide='ignore', invalid='ignore'):
+        converged = inverse_map_spheroid(
+            x.ravel()[:1], y.ravel()[:1], np.zeros((1, 4, 2)),
+            return_converged=True)[2]
+    assert not np.any(converged)
+
+
+def test_jacobian_spheroid():
+    nodes = np.zeros((2, 4, 2))
+    for i, (r, t) in enumerate([((.5, .5, 1., 1.), (0., .3, .3, 0.)),
+                                ((.5, .5, 1., 1.), (.3, .6, .5, .4))]):
+        r = np.array(r)
+        t = np.array(t)
+        nodes[i, :, 0] = r * np.sin(t)
+        nodes[i, :, 1] = r * np.cos(t)
+
+    points = np.array([-1., -.3, .2, 1.])
+    det, dxi_dx, dxi_dy, deta_dx, deta_dy = jacobian_spheroid(points, nodes)
+
+    # finite differences of the inverse mapping
+    h = 1e-7
+    x, y = map_spheroid(points, nodes)
+    _nodes = nodes.repeat(16, axis=0)
+    xi_x, eta_x = inverse_map_spheroid((x + h).ravel(), y.ravel(), _nodes)
+    xi_y, eta_y = inverse_map_spheroid(x.ravel(), (y + h).ravel(), _nodes)
+    xi = np.broadcast_to(points[np.newaxis, np.newaxis, :], x.shape).ravel()
+    eta = np.broadcast_to(points[np.newaxis, :, np.newaxis], x.shape).ravel()
+
+    np.testing.assert_allclose(dxi_dx.ravel(), (xi_x - xi) / h, atol=1e-5)
+    np.testing.assert_allclose(dxi_dy.ravel(), (xi_y - xi) / h, atol=1e-5)
+    np.testing.assert_allclose(deta_dx.ravel(), (eta_x - eta) / h,
+                               atol=1e-5)
+    np.testing.assert_allclose(deta_dy.ravel(), (eta_y - eta) / h,
+                               atol=1e-5)
+    np.testing.assert_allclose(det, 1. / (dxi_dx * deta_dy -
+                                          dxi_dy * deta_dx))
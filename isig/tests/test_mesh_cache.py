@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the on-disk mesh cache.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+import os
+import time
+
+from ..mesh_cache import MeshCache, get_mesh_cache_key
+
+
+def test_get_mesh_cache_key(tmpdir):
+    model_file = str(tmpdir.join('model.bm'))
+    with open(model_file, 'w') as f:
+        f.write('model')
+
+    key = get_mesh_cache_key(model_file, 50., 2., 100., 0., 180.)
+    assert key == get_mesh_cache_key(model_file, 50, 2, 100, 0, 180)
+    assert key != get_mesh_cache_key(model_file, 25., 2., 100., 0., 180.)
+
+    with open(model_file, 'w') as f:
+        f.write('other model')
+    assert key != get_mesh_cache_key(model_file, 50., 2., 100., 0., 180.)
+
+
+def test_mesh_cache(tmpdir):
+    cache = MeshCache(str(tmpdir.join('cache')))
+
+    points = np.random.rand(10, 2)
+    connectivity = np.arange(16).reshape((4, 4)) % 10
+
+    assert cache.get('a') is None
+    cache.put('a', points, connectivity)
+    assert 'a' in cache
+
+    p, c = cache.get('a')
+    assert isinstance(p, np.memmap)
+    np.testing.assert_array_equal(p, points)
+    np.testing.assert_array_equal(c, connectivity)
+
+    # least recently used entries are evicted first
+    entry_size = cache.size
+    cache.max_size = 2 * entry_size
+    cache.put('b', points, connectivity)
+    os.utime(os.path.join(cache.directory, 'a'),
+             (time.time() + 10, time.time() + 10))
+    cache.put('c', points, connectivity)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.size <= cache.max_size
+
+    # a read-only cache finds meshes but writes nothing
+    read_only = MeshCache(cache.directory, read_only=True)
+    np.testing.assert_array_equal(read_only.get('c')[0], points)
+    read_only.put('d', points, connectivity)
+    assert 'd' not in cache
+
+    directory = str(tmpdir.join('missing'))
+    assert MeshCache(directory, read_only=True).get('a') is None
+    assert not os.path.exists(directory)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the modal storage of MergedSnapshots.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+import pytest
+
+from ..create_db import create_db
+from ..database import Database
+from ..gll import gauss_lobatto_legendre_quadruature_points_weights_fast
+from ..ingest import ingest_snapshots
+from ..modal import (to_modal, to_nodal, get_modal_order, truncate,
+                     to_truncated_modal, get_amplification)
+from ..plan import synthetic_snapshots
+from ..quantization import (QUANTIZATIONS, get_error_bound, quantize,
+                            dequantize, get_relative_error, resolve_storage)
+
+
+def test_to_modal():
+
+    npol = 5
+    gll = gauss_lobatto_legendre_quadruature_points_weights_fast(npol)[0]
+    rng = np.random.RandomState(0)
+    data = rng.randn(3, 5, npol, npol, 4)
+
+    coefficients = to_modal(data, gll)
+    assert coefficients.shape == data.shape
+    np.testing.assert_allclose(to_nodal(coefficients, gll), data, atol=1e-12)
+
+    # a bilinear function has modes of degree < 2 only
+    data = np.ones((1, 1, npol, npol, 1))
+    data *= (1. + 2. * gll[:, None] + 3. * gll[None, :] +
+             4. * np.outer(gll, gll))[None, None, :, :, None]
+    coefficients = to_modal(data, gll)
+    np.testing.assert_allclose(coefficients[0, 0, :2, :2, 0],
+                               [[1., 3.], [2., 4.]], atol=1e-12)
+    assert get_modal_order(coefficients, 1e-10)[0] == 2
+    np.testing.assert_allclose(truncate(coefficients, [2]), coefficients,
+                               atol=1e-12)
+
+    # zero data keeps no modes, random data all of them
+    assert get_modal_order(np.zeros((1, 1, npol, npol, 1)), 1e-3)[0] == 0
+    assert get_modal_order(to_modal(rng.randn(1, 1, npol, npol, 1), gll),
+                           1e-3)[0] == npol
+
+
+def test_to_truncated_modal():
+
+    npol = 5
+    gll = gauss_lobatto_legendre_quadruature_points_weights_fast(npol)[0]
+    data = synthetic_snapshots(8, npol, 50, 1., 10.)
+    # a variable much smaller than the others keeps its relative accuracy
+    data[:, 1] *= 1e-3
+
+    for tolerance in [1e-1, 1e-2, 1e-4]:
+        coefficients, order = to_truncated_modal(data, gll, tolerance)
+        assert order.shape == (8, )
+        assert np.all((order >= 0) & (order <= npol))
+        error = get_relative_error(data, to_nodal(coefficients, gll))
+        assert error <= tolerance * (1 + 1e-5)
+
+    assert to_truncated_modal(data, gll, 1e-1)[1].mean() < npol
+
+
+@pytest.mark.parametrize('quantization', list(QUANTIZATIONS))
+def test_modal_quantization(quantization):
+
+    npol = 5
+    tolerance = 1e-3
+    gll = gauss_lobatto_legendre_quadruature_points_weights_fast(npol)[0]
+    rng = np.random.RandomState(0)
+    smooth = synthetic_snapshots(8, npol, 50, 1., 10.)
+
+    # the coefficient error grows when reconstructing the nodal values
+    quantization, bound = resolve_storage(quantization, None, tolerance,
+                                          npol, 'gzip')
+    np.testing.assert_allclose(
+        bound, tolerance + get_error_bound(quantization,
+                                           get_amplification(gll)))
+    for data in [smooth, rng.randn(*smooth.shape).astype(np.float32)]:
+        coefficients = to_truncated_modal(data, gll, tolerance)[0]
+        encoded, scale, offset = quantize(coefficients, quantization)
+        decoded = to_nodal(dequantize(encoded, scale, offset).astype(
+            np.float64), gll)
+        assert get_relative_error(data, decoded) <= bound
+
+
+def test_resolve_storage():
+
+    assert resolve_storage('int8') == ('int8', get_error_bound('int8'))
+    assert resolve_storage() == (None, None)
+
+    # the quantization error bound is amplified by 87 for npol = 5
+    assert resolve_storage(max_error=1e-2, modal_tolerance=1e-3,
+                           compression='gzip')[0] == 'int16'
+    assert resolve_storage(max_error=1e-3, modal_tolerance=1e-4,
+                           compression='gzip')[0] is None
+    quantization, bound = resolve_storage(modal_tolerance=1e-3,
+                                          compression='gzip')
+    assert quantization is None
+    assert 1e-3 < bound < 1.1e-3
+    with pytest.raises(ValueError):
+        resolve_storage('int8', 1e-2, 1e-3, compression='gzip')
+    with pytest.raises(ValueError):
+        resolve_storage(max_error=1e-3, modal_tolerance=1e-2,
+                        compression='gzip')
+    # truncated modes are stored as zeros, only compression removes them
+    with pytest.raises(ValueError):
+        resolve_storage(modal_tolerance=1e-3)
+
+
+def test_modal_database(tmpdir, model, mesh):
+
+    npol = 5
+    npts = 20
+
+    fname = str(tmpdir.join('test.h5'))
+    with pytest.raises(ValueError):
+        create_db(fname, model, mesh.points, mesh.connectivity, npol,
+                  npts=npts, modal_tolerance=1e-3)
+
+    # smooth snapshots, linear in the coordinates within each element, and
+    # a variable 1e-3 the size of the others
+    tolerance = 1e-3
+    for quantization in [None, 'int16', 'int8']:
+        info = create_db(fname, model, mesh.points, mesh.connectivity, npol,
+                         npts=npts, compression='gzip',
+                         quantization=quantization,
+                         modal_tolerance=tolerance)
+        assert info['modal_tolerance'] == tolerance
+        assert info['max_error'] > tolerance
+
+        with h5netcdf.File(fname, 'r') as f:
+            s = f['Mesh/mesh_S'][:]
+            z = f['Mesh/mesh_Z'][:]
+            sem = f['Mesh/sem_mesh'][:]
+            assert f['MergedSnapshots'].attrs['max_error'] == \
+                info['max_error']
+        t = np.linspace(0., 1., npts)
+        data = np.stack([np.outer(t, s + k * z) for k in range(5)],
+                        axis=1).astype(np.float32)
+        data[:, 2] *= 1e-3
+
+        result = ingest_snapshots(fname, data)
+        assert 0. < result['mean_modal_order'] < npol
+        assert result['max_error'] <= info['max_error']
+
+        with h5netcdf.File(fname, 'r') as f:
+            assert f['MergedSnapshots'].attrs['storage'] == 'modal'
+            order = f['modal_order'][:]
+        assert order.shape == (mesh.nelem, )
+        assert np.all(order <= 2)
+
+        # within the advertised bound for each variable of each element
+        expected = data[:, :, sem].transpose((2, 1, 3, 4, 0))
+        with Database(fname) as db:
+            snapshots = db.get_elements(np.arange(mesh.nelem))
+            assert snapshots.dtype == np.float32
+            assert snapshots.shape == expected.shape
+            assert get_relative_error(expected, snapshots) <= \
+                info['max_error']
+            np.testing.assert_allclose(db.get_element(3), snapshots[3],
+                                       rtol=1e-6)
+
+        os.remove(fname)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the evaluation of 1D models.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+from pymesher import models_1D
+
+from ..model_evaluation import evaluate_model, RadialLookupTable
+
+
+def test_evaluate_model():
+
+    mod = models_1D.model.built_in('prem_ani')
+
+    # points on a few radii, including both sides of a discontinuity
+    d = mod.discontinuities[-2]
+    r = np.array([0.5, d, d, 0.99, 0.5, d, 0.99])
+    centroid = np.array([0.4, d - 0.01, d + 0.01, 0.995, 0.4, d + 0.01,
+                         0.995])
+
+    values = evaluate_model(mod, r, centroid, parameters=['MU', 'RHO'])
+    for p in ['MU', 'RHO']:
+        np.testing.assert_allclose(
+            values[p], mod.get_elastic_parameter(p, r, centroid))
+
+    # the table is shared between calls and only grows for new radii
+    lut = RadialLookupTable(mod, parameters=['VP'])
+    lut(r, centroid)
+    assert lut.nevaluations == 4
+    lut(r[::-1], centroid[::-1])
+    assert lut.nevaluations == 4
+    np.testing.assert_allclose(
+        lut(r[:2], centroid[:2])['VP'],
+        mod.get_elastic_parameter('VP', r[:2], centroid[:2]))
+
+    # prepared in any order, looked up in order
+    lut = RadialLookupTable(mod, parameters=['VP'])
+    prepared = [lut.prepare(r[3:], centroid[3:]), lut.prepare(r, centroid)]
+    first = lut.lookup(prepared[1])
+    second = lut.lookup(prepared[0])
+    assert lut.nevaluations == 4
+    np.testing.assert_equal(first['VP'], RadialLookupTable(
+        mod, parameters=['VP'])(r, centroid)['VP'])
+    np.testing.assert_equal(second['VP'], first['VP'][3:])
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the ordered thread pool map.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import threading
+import time
+
+import pytest
+
+from ..parallel import get_window, ordered_map
+
+
+def test_ordered_map():
+
+    assert get_window(1) == 1
+    assert get_window(4) == 8
+
+    def func(i):
+        # later items finish first
+        time.sleep(0.001 * (10 - i))
+        return i ** 2, threading.current_thread().name
+
+    serial = list(ordered_map(func, range(10)))
+    parallel = list(ordered_map(func, range(10), nthreads=4))
+    assert [v for v, _ in serial] == [i ** 2 for i in range(10)]
+    assert [v for v, _ in parallel] == [i ** 2 for i in range(10)]
+
+    # the serial version runs in the calling thread
+    assert set(t for _, t in serial) == \
+        set([threading.current_thread().name])
+
+    def fail(i):
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    with pytest.raises(ValueError):
+        list(ordered_map(fail, range(10), nthreads=4))
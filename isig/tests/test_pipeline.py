@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the database generation pipeline.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+from ..pipeline import get_summary, resolve_sampling
+from ..sampling import get_sampling
+
+
+def test_get_summary():
+    info = {'model_name': 'prem_ani', 'period': 50.,
+            'elements_per_wavelength': 2., 'dt': 1., 'npts': 100,
+            'nelem': 10, 'npoints': 250, 'npol': 5,
+            'snapshot_chunks': (2, 5, 5, 5, 100), 'quantization': None,
+            'max_error': None}
+
+    def get_line(summary, label):
+        return [line for line in summary.splitlines() if label in line][0]
+
+    summary = get_summary(info)
+    assert 'error bound' not in summary
+    size = float(get_line(summary, 'chunk size').split()[-2])
+    assert abs(size - 2 * 5 * 25 * 100 * 4 / 1024. ** 2) < 1e-4
+
+    # the chunks hold the encoded values
+    info.update(quantization='int8', max_error=1e-2)
+    summary = get_summary(info)
+    size = float(get_line(summary, 'chunk size').split()[-2])
+    assert abs(size - 2 * 5 * 25 * 100 / 1024. ** 2) < 1e-4
+    assert float(get_line(summary, 'error bound').split()[-1]) == 1e-2
+    assert 'achieved error' in summary
+
+
+def test_resolve_sampling(model):
+    kwargs = {'npol': 5, 'npts': 1000}
+    resolve_sampling(model, 50., 180., kwargs)
+    assert 'chunks' not in kwargs
+
+    # explicit chunks follow the automatic number of samples
+    resolve_sampling(model, 50., 180., kwargs, auto_sampling=True,
+                     chunk_elements=2, chunk_snapshots=10 ** 6)
+    dt, npts = get_sampling(model, 50., 180.)
+    assert kwargs['npts'] == npts and kwargs['dt'] == dt
+    assert kwargs['chunks'] == (2, 5, 5, 5, npts)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the database planning.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+import os
+
+from ..create_db import create_db
+from ..plan import (plan_database, synthetic_snapshots,
+                    estimate_compression_ratio)
+
+
+def test_estimate_compression_ratio():
+    data = synthetic_snapshots(4, 5, 100, 1., 10.)
+    assert data.shape == (4, 5, 5, 5, 100)
+    assert data.dtype == np.float32
+
+    chunks = (1, 5, 5, 5, 100)
+    assert estimate_compression_ratio(data, chunks) == 1.
+    assert estimate_compression_ratio(data, chunks, 'gzip') < 1.
+    assert estimate_compression_ratio(np.zeros_like(data), chunks,
+                                      'gzip') < 0.01
+
+
+def test_plan_database(model, mesh):
+
+    npol = 5
+
+    plan = plan_database(model, mesh.points, mesh.connectivity, npol, npts=100,
+                         unique_points=True, compression='gzip')
+    info = create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+                     npts=100, unique_points=True, compression='gzip')
+    os.remove('test.h5')
+
+    assert plan['nelem'] == info['nelem']
+    assert plan['npoints'] == info['npoints']
+    assert plan['npoints_all'] == mesh.nelem * npol ** 2
+    assert plan['duplicate_points'] > 0
+    assert plan['snapshot_chunks'] == info['snapshot_chunks']
+    assert plan['variables']['Mesh/mesh_S'][0] == info['npoints'] * 4
+    assert plan['variables']['MergedSnapshots'][1] < \
+        plan['variables']['MergedSnapshots'][0]
+    assert plan['peak_memory'] > 0
+    assert plan['wall_time'] > 0
+
+    plan = plan_database(model, mesh.points, mesh.connectivity, npol, npts=100,
+                         quantization='int8')
+    assert plan['quantization'] == 'int8'
+    assert 0. < plan['max_error'] <= 1. / 254
+    np.testing.assert_allclose(plan['compression_ratio'], 0.25)
+    assert 'MergedSnapshots_scale' in plan['variables']
+
+    plan = plan_database(model, mesh.points, mesh.connectivity, npol, npts=100,
+                         compression='gzip', modal_tolerance=1e-2)
+    assert 0. < plan['modal_order'] < npol
+    assert 0. < plan['max_error']
+    assert 'modal_order' in plan['variables']
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the cached quadrature rules.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+import pytest
+
+from ..basis_polynomials import lagrange_basis_derivative_matrix
+from ..gll import gauss_lobatto_legendre_quadruature_points_weights_fast
+from ..quadrature import QuadratureProvider, get_quadrature
+
+
+def test_get_quadrature():
+    points, weights, d = get_quadrature('gll', 5)
+    p_ref, w_ref = gauss_lobatto_legendre_quadruature_points_weights_fast(5)
+    np.testing.assert_array_equal(points, p_ref)
+    np.testing.assert_array_equal(weights, w_ref)
+    np.testing.assert_array_equal(d, lagrange_basis_derivative_matrix(p_ref))
+
+    # memoized and read-only
+    assert get_quadrature('gll', 5)[0] is points
+    with pytest.raises(ValueError):
+        points[0] = 0.
+
+    # high order tables are accurate
+    points, weights, _ = get_quadrature('gll', 100)
+    np.testing.assert_allclose(weights.sum(), 2., rtol=1e-14)
+
+    with pytest.raises(ValueError):
+        get_quadrature('gl', 5)
+
+
+def test_quadrature_provider(tmpdir):
+    directory = str(tmpdir.join('quadrature'))
+    provider = QuadratureProvider(directory)
+    table = provider.get('glj', 6)
+    assert len(tmpdir.join('quadrature').listdir()) == 1
+
+    # a new provider loads the table from disk
+    table_loaded = QuadratureProvider(directory).get('glj', 6)
+    for t, t_loaded in zip(table, table_loaded):
+        np.testing.assert_array_equal(t, t_loaded)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the quantized storage of MergedSnapshots.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+import pytest
+
+from ..create_db import create_db
+from ..database import Database
+from ..ingest import ingest_snapshots
+from ..plan import synthetic_snapshots
+from ..quantization import (QUANTIZATIONS, get_error_bound,
+                            get_quantization, resolve_quantization,
+                            get_storage_ratio, quantize, dequantize,
+                            get_relative_error)
+
+
+@pytest.mark.parametrize('quantization', list(QUANTIZATIONS))
+def test_quantize(quantization):
+
+    data = synthetic_snapshots(6, 5, 100, 1., 10.)
+    # amplitudes varying over orders of magnitude and a constant variable
+    data *= np.logspace(-8, 3, 6).astype(np.float32)[:, None, None, None,
+                                                     None]
+    data[2, 3] = 1.5
+
+    encoded, scale, offset = quantize(data, quantization)
+    assert encoded.dtype == QUANTIZATIONS[quantization]
+    assert scale.shape == offset.shape == (6, 5)
+
+    decoded = dequantize(encoded, scale, offset)
+    assert decoded.dtype == np.float32
+    np.testing.assert_equal(decoded[2, 3], 1.5)
+
+    error = get_relative_error(data, decoded)
+    assert 0. < error <= get_error_bound(quantization)
+
+    # a single element decodes the same as in a block
+    np.testing.assert_equal(dequantize(encoded[1], scale[1], offset[1]),
+                            decoded[1])
+
+
+def test_get_quantization():
+
+    assert get_quantization(1e-2) == 'int8'
+    assert get_quantization(1e-3) == 'float16'
+    assert get_quantization(1e-4) == 'int16'
+    assert get_quantization(1e-6) is None
+
+    assert resolve_quantization() is None
+    assert resolve_quantization('int8') == 'int8'
+    assert resolve_quantization(max_error=1e-3) == 'float16'
+    with pytest.raises(ValueError):
+        resolve_quantization('int8', 1e-3)
+    with pytest.raises(ValueError):
+        resolve_quantization('int4')
+
+    assert get_storage_ratio(None, 5, 100) == 1.
+    np.testing.assert_allclose(get_storage_ratio('int8', 5, 100), 0.25,
+                               rtol=1e-2)
+
+
+def test_quantized_database(tmpdir, model, mesh):
+
+    npol = 5
+    npts = 20
+
+    fname = str(tmpdir.join('test.h5'))
+    info = create_db(fname, model, mesh.points, mesh.connectivity, npol,
+                     npts=npts, max_error=1e-4)
+    assert info['quantization'] == 'int16'
+    assert info['max_error'] == get_error_bound('int16')
+
+    rng = np.random.RandomState(0)
+    data = rng.randn(npts, 5, info['npoints']).astype(np.float32)
+    result = ingest_snapshots(fname, data,
+                              memory_budget=10 * 5 * npol ** 2 * npts * 4)
+    assert 0. < result['max_error'] <= info['max_error']
+    assert result['compression_ratio'] > 1.9
+
+    with h5netcdf.File(fname, 'r') as f:
+        assert f['MergedSnapshots'].dtype == np.int16
+        sem = f['Mesh/sem_mesh'][:]
+    expected = data[:, :, sem].transpose((2, 1, 3, 4, 0))
+
+    # decoded transparently on read
+    with Database(fname) as db:
+        snapshots = db.get_elements(np.arange(mesh.nelem))
+        assert snapshots.dtype == np.float32
+        assert get_relative_error(expected, snapshots) <= info['max_error']
+        np.testing.assert_equal(db.get_element(3), snapshots[3])
+
+    os.remove(fname)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for reordering the elements along space filling curves.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+import pytest
+
+from ..create_db import create_db
+from ..reorder import (hilbert_index, morton_index, quantize,
+                       space_filling_curve_index)
+
+
+def test_hilbert_index():
+    nbits = 3
+    n = 2 ** nbits
+    ix, iy = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    d = hilbert_index(ix.ravel(), iy.ravel(), nbits)
+
+    # bijective and consecutive positions are neighbours
+    np.testing.assert_equal(np.sort(d), np.arange(n ** 2))
+    order = np.argsort(d)
+    step = (np.abs(np.diff(ix.ravel()[order])) +
+            np.abs(np.diff(iy.ravel()[order])))
+    np.testing.assert_equal(step, 1)
+
+
+def test_morton_index():
+    ix = np.array([0, 1, 0, 1, 2, 3])
+    iy = np.array([0, 0, 1, 1, 0, 3])
+    np.testing.assert_equal(morton_index(ix, iy, 2), [0, 2, 1, 3, 8, 15])
+
+
+def test_space_filling_curve_index():
+    ix, iy = quantize([0., 1., 0.5], [0., 0.5, 0.25], 4)
+    np.testing.assert_equal(ix, [0, 15, 7])
+    np.testing.assert_equal(iy, [0, 7, 3])
+
+    with pytest.raises(ValueError):
+        space_filling_curve_index([0.], [0.], 'peano')
+
+
+@pytest.mark.parametrize('unique_points', [False, True])
+def test_create_db_element_order(unique_points, model, mesh):
+
+    npol = 5
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+              unique_points=unique_points)
+    info = create_db('test_hilbert.h5', model, mesh.points,
+                     mesh.connectivity, npol, unique_points=unique_points,
+                     element_order='hilbert')
+    order = info['element_order']
+
+    np.testing.assert_equal(np.sort(order), np.arange(mesh.nelem))
+    assert np.any(order != np.arange(mesh.nelem))
+
+    with h5netcdf.File('test.h5', 'r') as f, \
+            h5netcdf.File('test_hilbert.h5', 'r') as fh:
+        assert fh.attrs['element order'] == 'hilbert'
+        for var in ['mp_mesh_S', 'mp_mesh_Z']:
+            np.testing.assert_equal(fh['Mesh'][var][:],
+                                    f['Mesh'][var][:][order])
+
+        sem = f['Mesh/sem_mesh'][:][order]
+        sem_hilbert = fh['Mesh/sem_mesh'][:]
+        for var in ['mesh_S', 'mesh_Z', 'mesh_mu']:
+            np.testing.assert_equal(fh['Mesh'][var][:][sem_hilbert],
+                                    f['Mesh'][var][:][sem])
+
+    os.remove('test.h5')
+    os.remove('test_hilbert.h5')
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the temporal sampling and decimation.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import numpy as np
+from pymesher import models_1D
+import pytest
+
+from ..sampling import (get_min_velocity, get_sampling,
+                        get_decimation_factor, get_decimation_filter,
+                        decimate)
+
+
+def test_get_sampling():
+
+    mod = models_1D.model.built_in('prem_ani')
+    assert get_min_velocity(mod) > 0.
+
+    dt, npts = get_sampling(mod, 50., 90., min_velocity=4000.)
+    assert dt == 12.5
+    duration = np.pi / 2 * mod.scale / 4000. + 500.
+    assert (npts - 2) * dt < duration <= (npts - 1) * dt
+
+    # longer distances need more samples, shorter periods finer sampling
+    assert get_sampling(mod, 50., 180.)[1] > get_sampling(mod, 50., 90.)[1]
+    assert get_sampling(mod, 10.)[0] == 2.5
+
+    with pytest.raises(ValueError):
+        get_sampling(mod, 50., samples_per_period=1.5)
+
+
+def test_get_decimation_factor():
+
+    assert get_decimation_factor(0.1, 1.) == 10
+    assert get_decimation_factor(0.25, 0.25) == 1
+    with pytest.raises(ValueError):
+        get_decimation_factor(0.3, 1.)
+    with pytest.raises(ValueError):
+        get_decimation_factor(1., 0.1)
+
+
+def test_decimate():
+
+    factor = 4
+    h = get_decimation_filter(factor)
+    np.testing.assert_allclose(h.sum(), 1.)
+    np.testing.assert_allclose(h, h[::-1])
+
+    nin = 4001
+    t = np.arange(nin)
+    # output Nyquist is 1 / 8 cycles per input sample
+    low = np.cos(2 * np.pi * 0.02 * t)
+    high = np.cos(2 * np.pi * 0.2 * t)
+
+    data = np.array([low, high, np.ones(nin)]).astype(np.float32)
+    out = decimate(data, factor)
+    assert out.shape == (3, (nin - 1) // factor + 1)
+    assert out.dtype == np.float32
+
+    # the passband is kept without phase shift, aliases are suppressed
+    inner = slice(20, -20)
+    np.testing.assert_allclose(out[0, inner], low[::factor][inner],
+                               atol=1e-3)
+    assert np.abs(out[1, inner]).max() < 1e-3
+    np.testing.assert_allclose(out[2], 1., rtol=1e-5)
+
+    assert decimate(data, 1) is data
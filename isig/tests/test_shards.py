@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for sharded databases with a master file.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+import pytest
+
+from ..create_db import create_db
+from ..database import Database
+from ..shards import (create_sharded_db, get_shard_filename,
+                      get_shard_ranges)
+
+
+def _remove(fname, nshards):
+    os.remove(fname)
+    for i in range(nshards):
+        os.remove(get_shard_filename(fname, i))
+
+
+def test_get_shard_ranges():
+
+    assert get_shard_ranges(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert get_shard_ranges(2, 2) == [(0, 1), (1, 2)]
+    with pytest.raises(ValueError):
+        get_shard_ranges(2, 3)
+    assert get_shard_filename('db.nc', 3) == 'db.shard0003.nc'
+
+
+def test_create_sharded_db(model, mesh):
+
+    npol = 5
+    npts = 3
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+              npts=npts, jacobian=True)
+    info = create_sharded_db('test_sharded.h5', model, mesh.points,
+                             mesh.connectivity, nshards=3, npol=npol,
+                             npts=npts, jacobian=True, spatial_index=True,
+                             nthreads=2)
+    assert info['nelem'] == mesh.nelem
+    assert info['npoints'] == mesh.nelem * npol ** 2
+    assert info['element_order'] is None
+
+    # the master file looks like a single database
+    with h5netcdf.File('test.h5', 'r') as f, \
+            h5netcdf.File('test_sharded.h5', 'r') as fs:
+        assert fs['MergedSnapshots'].shape == f['MergedSnapshots'].shape
+        assert fs['MergedSnapshots'].dimensions == \
+            f['MergedSnapshots'].dimensions
+        for var in f['Mesh'].variables:
+            np.testing.assert_array_equal(fs['Mesh'][var][:],
+                                          f['Mesh'][var][:])
+        for attr in ['npoints', 'kernel wavefield rmin',
+                     'kernel wavefield colatmax']:
+            assert fs.attrs[attr] == f.attrs[attr]
+        assert fs.attrs['nshards'] == 3
+        np.testing.assert_array_equal(
+            fs['Shards/element_offsets'][:],
+            [r[0] for r in info['shard_ranges']] + [mesh.nelem])
+
+    # data written to the shards is read through the master file
+    rng = np.random.RandomState(0)
+    data = rng.randn(mesh.nelem, 5, npol, npol, npts).astype(np.float32)
+    for i, (start, stop) in enumerate(info['shard_ranges']):
+        with h5netcdf.File(info['shard_files'][i], 'r+') as f:
+            f['MergedSnapshots'][:] = data[start:stop]
+
+    with Database('test_sharded.h5') as db:
+        np.testing.assert_equal(db.get_elements(np.arange(mesh.nelem)), data)
+        s, z = db.mesh('mp_mesh_S'), db.mesh('mp_mesh_Z')
+        element = db.spatial_index.map_to_reference(s, z)[0]
+        assert np.all(element >= 0)
+
+    os.remove('test.h5')
+    _remove('test_sharded.h5', 3)
+
+
+def test_create_sharded_db_colatitude(model, mesh):
+
+    npol = 5
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+              unique_points=True)
+
+    # shards written separately, followed by the master file
+    kwargs = dict(nshards=3, shard_by='colatitude', npol=npol,
+                  unique_points=True, quantization='int8',
+                  compression='gzip', modal_tolerance=1e-3)
+    info_shards = create_sharded_db(
+        'test_sharded.h5', model, mesh.points, mesh.connectivity,
+        shards=[0, 2], write_master=False, **kwargs)
+    assert not os.path.exists('test_sharded.h5')
+    create_sharded_db('test_sharded.h5', model, mesh.points, mesh.connectivity,
+                      shards=[1], write_master=False, **kwargs)
+    info = create_sharded_db('test_sharded.h5', model, mesh.points,
+                             mesh.connectivity, shards=[], **kwargs)
+    order = info['element_order']
+
+    # the storage properties are read back from the shards
+    for k in ['snapshot_chunks', 'quantization', 'max_error',
+              'modal_tolerance']:
+        assert info[k] == info_shards[k]
+    assert sorted(order) == list(range(mesh.nelem))
+
+    with h5netcdf.File('test.h5', 'r') as f, \
+            h5netcdf.File('test_sharded.h5', 'r') as fs:
+        sem = f['Mesh/sem_mesh'][:][order]
+        sem_sharded = fs['Mesh/sem_mesh'][:]
+        # points on the shard boundaries are stored once per shard
+        assert sem_sharded.max() == info['npoints'] - 1
+        assert info['npoints'] > f.attrs['npoints']
+        for var in ['mesh_S', 'mesh_Z', 'mesh_mu']:
+            np.testing.assert_array_equal(fs['Mesh'][var][:][sem_sharded],
+                                          f['Mesh'][var][:][sem])
+
+        # the shards are colatitude bands
+        colat = np.arctan2(fs['Mesh/mp_mesh_S'][:], fs['Mesh/mp_mesh_Z'][:])
+        for start, stop in zip(info['shard_ranges'][:-1],
+                               info['shard_ranges'][1:]):
+            assert colat[start[0]:start[1]].max() <= \
+                colat[stop[0]:stop[1]].min()
+
+    os.remove('test.h5')
+    _remove('test_sharded.h5', 3)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for locating points in the mesh.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import numpy as np
+import os
+
+from ..create_db import create_db
+from ..map_spheroid import map_spheroid
+from ..spatial_index import SpatialIndex
+
+
+def test_spatial_index():
+    # regular annulus of 3 x 4 elements
+    r = np.linspace(.5, 1., 4)
+    theta = np.linspace(0., .8, 5)
+    nodes = []
+    for i in np.arange(3):
+        for j in np.arange(4):
+            _r = r[[i, i, i + 1, i + 1]]
+            _t = theta[[j, j + 1, j + 1, j]]
+            nodes.append(np.stack([_r * np.sin(_t), _r * np.cos(_t)], -1))
+    nodes = np.array(nodes)
+
+    index = SpatialIndex.build(nodes)
+    assert index.offsets[-1] == index.elements.size
+
+    # points in the interior of the elements
+    xi = np.array([-.9, 0., .7])
+    x, y = map_spheroid(xi, nodes)
+    element = index.locate(x, y)
+    np.testing.assert_equal(
+        element, np.arange(12)[:, np.newaxis, np.newaxis].repeat(3, 1).repeat(
+            3, 2))
+
+    # outside of the mesh
+    np.testing.assert_equal(index.locate([0., 0., 2.], [.2, 1.5, 0.]),
+                            [-1, -1, -1])
+
+    # on a shared node the lowest element id wins
+    assert index.locate(nodes[5, 0, 0], nodes[5, 0, 1]) == 0
+
+    # reference coordinates
+    element, _xi, _eta = index.map_to_reference(x, y)
+    np.testing.assert_equal(element[:, 0, 0], np.arange(12))
+    np.testing.assert_allclose(_xi, np.broadcast_to(xi, x.shape),
+                               atol=1e-12)
+    np.testing.assert_allclose(_eta, np.broadcast_to(xi[:, np.newaxis],
+                                                     x.shape), atol=1e-12)
+
+    element, _xi, _eta = index.map_to_reference(2., 0.)
+    assert element == -1
+    assert np.isnan(_xi) and np.isnan(_eta)
+
+
+def test_create_db_spatial_index(model, mesh):
+
+    npol = 5
+
+    create_db('test.h5', model, mesh.points, mesh.connectivity, npol,
+              spatial_index=True, element_order='hilbert')
+
+    with h5netcdf.File('test.h5', 'r') as f:
+        index = SpatialIndex.read(f)
+        mp_S = f['Mesh/mp_mesh_S'][:]
+        mp_Z = f['Mesh/mp_mesh_Z'][:]
+
+    np.testing.assert_equal(index.locate(mp_S, mp_Z), np.arange(mesh.nelem))
+
+    os.remove('test.h5')
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests that the command line modules start without heavy imports.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir,
+                                    os.pardir))
+
+
+def test_no_heavy_imports_at_startup():
+    # the command line modules must not import heavy dependencies at module
+    # level, see benchmarks/startup.py
+    code = ('import sys\n'
+            'import isig.pipeline, isig.sweep, isig.ingest, isig.plan\n'
+            'print(" ".join(m for m in ["pymesher", "sympy", "h5netcdf", '
+            '"h5py", "matplotlib"] if m in sys.modules))\n')
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    assert out.decode().split() == []
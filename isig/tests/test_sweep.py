@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Tests for the parameter sweep.
+
+:copyright:
+    Martin van Driel (Martin@vanDriel.de), 2016
+:license:
+    None
+'''
+import h5netcdf
+import os
+
+from ..sweep import get_sweep_filename, get_sweep_summary, run_sweep
+
+# a three layer model in the salvus mesher bm format, radius in m and
+# discontinuities as repeated radii
+MODEL = '''NAME         three_layer
+ANELASTIC       F
+ANISOTROPIC     F
+UNITS        m
+COLUMNS       radius      rho      vp      vs
+        0.0   12000.0  11000.0   3500.0
+  3480000.0   12000.0  11000.0   3500.0
+  3480000.0    5000.0  13000.0   7000.0
+  5701000.0    4000.0  10000.0   5500.0
+  5701000.0    3500.0   8000.0   4500.0
+  6371000.0    3000.0   6000.0   3500.0
+'''
+
+
+def test_get_sweep_filename():
+    assert get_sweep_filename('prem_ani', 25., 700., 30., 90.) == \
+        'isig_prem_ani_25s_700km_30-90deg.nc'
+
+
+def test_get_sweep_summary():
+    infos = [{'filename': 'a/isig_prem_ani_25s_700km_30-90deg.nc',
+              'period': 25., 'max_depth': 700., 'min_dist': 30.,
+              'max_dist': 90., 'nelem': 100, 'npoints': 2500, 'npol': 5,
+              'npts': 1000, 'wall_time': 1.5}]
+    summary = get_sweep_summary(infos).split('\n')
+
+    assert len(summary) == 5
+    assert summary[3].startswith('isig_prem_ani_25s_700km_30-90deg.nc')
+    assert summary[3].split()[-4:] == ['100', '2500', '0.0466', '1.50']
+
+
+def test_run_sweep(tmpdir):
+    model_file = str(tmpdir.join('three_layer.bm'))
+    with open(model_file, 'w') as f:
+        f.write(MODEL)
+
+    output_dir = str(tmpdir.mkdir('output'))
+    cache_dir = str(tmpdir.join('cache'))
+    infos = run_sweep(model_file, [100.], [100., 200.],
+                      distance_ranges=[(0., 30.)], output_dir=output_dir,
+                      nworkers=2, cache_dir=cache_dir, npts=10)
+
+    # one database per job in the order of the grid, each mesh cached
+    assert [(i['period'], i['max_depth']) for i in infos] == \
+        [(100., 100.), (100., 200.)]
+    assert len(os.listdir(cache_dir)) == 2
+    for info in infos:
+        assert os.path.dirname(info['filename']) == output_dir
+        assert info['nelem'] > 0
+        assert info['wall_time'] > 0
+        with h5netcdf.File(info['filename'], 'r') as f:
+            assert f['MergedSnapshots'].shape[0] == info['nelem']
+            assert f.dimensions['snapshots'].size == 10
+
+    summary = get_sweep_summary(infos).split('\n')
+    assert len(summary) == 6
+    for line, info in zip(summary[3:5], infos):
+        assert line.startswith(os.path.basename(info['filename']))
+        assert line.split()[-4] == str(info['nelem'])
@@ -67,6 +67,8 @@ class MyExtension(Extension):
 
 
 INSTALL_REQUIRES = ["numpy",
+                    "h5py",
+                    "h5netcdf",
                     "pymesher",
                     "future",
                     "flake8>=2",